@@ -1,5 +1,8 @@
 import os
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -16,13 +19,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],   # 대화기록 페이지네이션 커서 (브라우저에서 읽을 수 있게)
 )
 
 # 헬스체크 엔드포인트
+# - /api/health, /api/health/live : liveness (프로세스가 떠 있으면 200, 모델 로드와 무관)
+# - /api/health/ready            : readiness (warm-up 대상 모델이 모두 로드되면 200, 아니면 503)
 @app.get("/api/health")
+@app.get("/api/health/live")
 def health():
     return {"ok": True}
 
+@app.get("/api/health/ready")
+def ready():
+    from services.ai_service_global import model_status, warmup_targets
+    models = model_status()
+    ok = all(models[name]["loaded"] for name in warmup_targets())
+    return JSONResponse(status_code=200 if ok else 503, content={"ok": ok, "models": models})
+
+# 프로세스 내 메트릭 (LLM 호출 지연/토큰/재시도/병합 등, 워커별 값)
+@app.get("/api/metrics")
+def get_metrics():
+    from services.metrics import snapshot
+    return snapshot()
+
 # API 라우팅 분리
 from routers.ai import router as ai_router
 from routers.auth import router as auth_router
@@ -33,6 +53,7 @@ from routers.chat import router as chat_router
 from routers.quiz import router as quiz_router
 from routers.analytics import router as analytic_router
 from routers.i18n import router as i18n_router
+from routers.search import router as search_router
 
 app.include_router(ai_router, prefix="/api/ai", tags=["ai"])
 app.include_router(auth_router, prefix="/api", tags=["auth"])
@@ -43,8 +64,59 @@ app.include_router(chat_router, prefix="/api", tags=["chat"])
 app.include_router(quiz_router, prefix="/api/quiz",tags=["quiz"] )
 app.include_router(analytic_router, prefix="/api", tags=["analytic"])
 app.include_router(i18n_router, prefix="/api", tags=["i18n"] )
+app.include_router(search_router, prefix="/api", tags=["search"])
 
+from sqlalchemy import inspect, text
 from routers.auth import Base, engine
+from services.ai_service_global import warmup_models, warmup_targets
+
+# === 모델 warm-up: startup 이후 백그라운드 스레드에서 로드 (요청 처리를 막지 않음) ===
+_warmup_task: asyncio.Task | None = None
+
+@app.on_event("startup")
+async def on_startup_warmup():
+    global _warmup_task
+    targets = warmup_targets()
+    if targets:
+        _warmup_task = asyncio.create_task(asyncio.to_thread(warmup_models, targets))
+
+# create_all 은 이미 있는 테이블을 바꾸지 않는다 (마이그레이션 도구 없음).
+# 기존 테이블에 나중에 추가된 컬럼 중 없으면 모든 조회가 실패하는 것은 시작 시 여기서 보충한다.
+_ADDED_COLUMNS = [
+    ("vector_indexes", "index_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("chat_sessions", "memory_summary", "TEXT NULL"),
+    ("chat_sessions", "memory_turns", "JSON NULL"),
+    ("summaries", "mode", "VARCHAR(16) NULL"),
+    ("summaries", "cache_key", "VARCHAR(64) NULL"),
+    ("summaries", "index_version", "INTEGER NULL"),
+    ("summaries", "ok", "BOOLEAN NULL"),
+    ("summaries", "reason", "TEXT NULL"),
+    ("summary_jobs", "owner", "VARCHAR(64) NULL"),
+    ("summary_jobs", "heartbeat_at", "DATETIME NULL"),
+    ("document_digests", "attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("document_digests", "retry_at", "DATETIME NULL"),
+]
+# 위 컬럼에 걸린 인덱스 (이름은 모델의 index=True 가 만드는 이름과 같게)
+_ADDED_INDEXES = [
+    ("summaries", "ix_summaries_cache_key", "cache_key"),
+]
+
+def _add_missing_columns(sync_conn):
+    insp = inspect(sync_conn)
+    for table, column, ddl in _ADDED_COLUMNS:
+        if not insp.has_table(table):
+            continue
+        if column in {c["name"] for c in insp.get_columns(table)}:
+            continue
+        sync_conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        logging.warning(f"[schema] added missing column {table}.{column}")
+    for table, name, column in _ADDED_INDEXES:
+        if not insp.has_table(table):
+            continue
+        if name in {ix["name"] for ix in insp.get_indexes(table)}:
+            continue
+        sync_conn.execute(text(f"CREATE INDEX {name} ON {table} ({column})"))
+        logging.warning(f"[schema] added missing index {table}.{name}")
 
 # === 통합 Startup: 스키마 생성/초기화 ===
 @app.on_event("startup")
@@ -73,8 +145,21 @@ async def on_startup_schema():
             await conn.execute(text("SET FOREIGN_KEY_CHECKS = 1;"))
 
         else:
-            # 기본: 없는 테이블만 생성
+            # 기본: 없는 테이블만 생성 + 기존 테이블에 빠진 컬럼 보충
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_add_missing_columns)
+
+# === 문서 digest: 재시작 전에 끝나지 못한 생성 작업 재개 (스키마 생성 이후) ===
+@app.on_event("startup")
+async def on_startup_digests():
+    from services.document_digest import resume_pending_digests
+    await resume_pending_digests()
+
+# === 백그라운드 요약 작업: 재시작 전에 끝나지 못한 작업(queued/running) 재실행 ===
+@app.on_event("startup")
+async def on_startup_summary_jobs():
+    from services.summary_jobs import resume_summary_jobs
+    await resume_summary_jobs()
 
 # swagger ui에만 영향가는 코드 (신경쓰지 마세요)
 from fastapi.openapi.utils import get_openapi
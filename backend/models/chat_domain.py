@@ -16,6 +16,11 @@ class ChatSessionTable(Base):
     title: Mapped[str | None] = mapped_column(String(200))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    # 대화 메모리 (후속 질문용) – 오래된 대화는 요약으로 압축, 최근 몇 턴만 원문 유지
+    memory_summary: Mapped[str | None] = mapped_column(Text)
+    # 최근 턴 목록 [{"qa_turn_id": 1, "q": "...", "a": "..."}]
+    memory_turns: Mapped[list[dict] | None] = mapped_column(JSON)
+
     turns: Mapped[list["QATurnTable"]] = relationship(
         back_populates="session", cascade="all, delete-orphan"
     )
@@ -20,3 +20,27 @@ class DocumentTable(Base):
     text_hash:   Mapped[str | None] = mapped_column(String(64), nullable=True)
     status:      Mapped[str] = mapped_column(DocStatus, default="uploaded", nullable=False)
     created_at:  Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
+
+
+DigestStatus = SAEnum("pending", "ready", "failed", name="digest_status")
+
+class DocumentDigestTable(Base):
+    """
+    문서 1개의 요약(digest: 핵심 개념 + 함정) – 업로드 직후 백그라운드에서 생성
+    - 과목 요약(mode="digest")은 청크 대신 이 digest 들을 합쳐 만든다
+    - source_hash: 문서 텍스트 해시 + 프롬프트 버전 → 같으면 다시 만들지 않음
+    - attempts/retry_at: 실패가 이어지면 재시도 간격을 늘려 요청마다 LLM 을 다시 부르지 않게 함
+    """
+    __tablename__ = "document_digests"
+
+    digest_id:   Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    document_id: Mapped[int] = mapped_column(ForeignKey("documents.document_id"), unique=True, nullable=False)
+    subject_id:  Mapped[int] = mapped_column(index=True, nullable=False)
+    user_id:     Mapped[uuid.UUID] = mapped_column(ForeignKey(UserTable.id), index=True, nullable=False)
+    status:      Mapped[str] = mapped_column(DigestStatus, default="pending", nullable=False)
+    source_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    content_md:  Mapped[str | None] = mapped_column(Text, nullable=True)
+    error:       Mapped[str | None] = mapped_column(Text, nullable=True)
+    attempts:    Mapped[int] = mapped_column(default=0, nullable=False)     # 연속 실패 횟수
+    retry_at:    Mapped[datetime | None] = mapped_column(nullable=True)     # 실패 후 이 시각 전에는 다시 만들지 않음
+    updated_at:  Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
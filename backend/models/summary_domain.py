@@ -3,7 +3,7 @@ import uuid
 from datetime import datetime
 import enum
 
-from sqlalchemy import String, Text, ForeignKey
+from sqlalchemy import String, Text, ForeignKey, Integer, Index, Boolean
 from sqlalchemy.orm import Mapped, mapped_column
 
 # Base, UserTable 재사용 (routers/auth.py 에서 정의)
@@ -37,4 +37,66 @@ class SummaryTable(Base):
     content_md: Mapped[str] = mapped_column(Text, nullable=False)  # 마크다운 본문
     model: Mapped[str] = mapped_column(String(100), default="gemini-2.5-flash", nullable=False)
 
+    # 결과 캐시용: (정규화 주제, 유형, 모드) 해시 + 생성 당시 과목 인덱스 버전
+    # → 같은 요청이 바뀌지 않은 과목에 다시 오면 이 행을 그대로 돌려준다
+    mode: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    cache_key: Mapped[str | None] = mapped_column(String(64), index=True, nullable=True)
+    index_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    ok: Mapped[bool | None] = mapped_column(Boolean, nullable=True)        # CRAG 검증 결과
+    reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
+
+
+class SummaryPartialTable(Base):
+    """
+    계층(map-reduce) 요약의 중간 결과
+    - level 0: 청크 묶음 요약, level n: 아래 단계 요약 묶음을 다시 요약
+    - group_key: 입력 텍스트 해시 → 같은 내용의 묶음은 다음 요청에서 그대로 재사용
+      (새 자료가 추가돼도 기존 문서의 묶음은 바뀌지 않으므로 재사용된다)
+    """
+    __tablename__ = "summary_partials"
+
+    partial_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    vector_index_id: Mapped[int] = mapped_column(ForeignKey("vector_indexes.vector_index_id"), nullable=False)
+    level: Mapped[int] = mapped_column(Integer, nullable=False)
+    group_key: Mapped[str] = mapped_column(String(64), nullable=False)   # sha256 hex
+    chunk_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)   # 이 요약이 덮는 청크 수
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_summary_partial_lookup", "vector_index_id", "level", "group_key"),
+    )
+
+
+class SummaryJobTable(Base):
+    """
+    백그라운드 요약 작업 (POST /summaries/jobs)
+    - 요청은 job_id 만 받고 바로 끝나며, 생성은 서버 워커가 진행 → 연결이 끊겨도 결과는 summary_id 로 남는다
+    - status: queued → running → done | failed, stage: 진행 단계(폴링용)
+    - owner/heartbeat_at: 실행 중인 워커와 마지막 생존 신호 (여러 워커가 같은 작업을 중복 실행하지 않게 조건부 UPDATE 로 선점)
+    """
+    __tablename__ = "summary_jobs"
+
+    job_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey(UserTable.id), index=True, nullable=False)
+    subject_id: Mapped[int] = mapped_column(ForeignKey("subjects.subject_id"), nullable=False)
+
+    # 요청 내용 (POST /summaries 와 같은 옵션)
+    topic: Mapped[str] = mapped_column(String(500), nullable=False)
+    type: Mapped[str] = mapped_column(String(32), default="overall", nullable=False)
+    mode: Mapped[str] = mapped_column(String(16), default="rag", nullable=False)
+    force: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    diverse: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True, nullable=False)
+    stage: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    summary_id: Mapped[int | None] = mapped_column(ForeignKey("summaries.summary_id"), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    owner: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
+    started_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(nullable=True)
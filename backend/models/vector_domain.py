@@ -23,6 +23,8 @@ class VectorIndexTable(Base):
 
     chunk_count: Mapped[int] = mapped_column(Integer, default=0)
     doc_count:   Mapped[int] = mapped_column(Integer, default=0)
+    # 인덱스 버전: 자료가 추가될 때마다 +1 → 캐시 키에 포함해 업로드 이후 오래된 결과가 쓰이지 않게 함
+    index_version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     created_at:  Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
     updated_at:  Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
 
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from services.ai_service import summarize_text, load_text_from_url, load_text_from_pdf_bytes, clean_text
 from pydantic import BaseModel
@@ -35,14 +36,14 @@ async def ai_summary(
 
         # 2) 소스 선택
         if url:
-            src = load_text_from_url(url)
+            src = await asyncio.to_thread(load_text_from_url, url)
         elif file:
             src = load_text_from_pdf_bytes(await file.read())
         else:
             src = clean_text(text or "")
 
-        # 3) 실행
-        out = summarize_text(src, question if mode == "qa" else None)
+        # 3) 실행 (동기 SDK 호출 → 스레드에서 실행해 이벤트 루프를 막지 않음)
+        out = await asyncio.to_thread(summarize_text, src, question if mode == "qa" else None)
         return {"mode": mode, "result": out}
 
     except HTTPException:
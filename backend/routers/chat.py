@@ -1,21 +1,29 @@
 # 설명: 스마트 Q&A 라우터 (세션 생성 / 질문 / 기록 조회)
-from typing import List
+from typing import List, Literal
 import uuid
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from fastapi.security import HTTPBearer
 from fastapi import Security
+from fastapi.responses import StreamingResponse
 
 from routers.auth import (
     Base, UserTable, get_session, current_active_user, engine
 )
 from models.chat_domain import ChatSessionTable, QATurnTable
-from services.chat_service import ask_and_store
+from services.chat_service import ask_and_store, ask_stream, export_turns_ndjson
+from services.sse import SSE_HEADERS, sse_stream
 
 router = APIRouter()
 bearer_scheme = HTTPBearer()
 
+TURNS_PAGE_DEFAULT = 50
+TURNS_PAGE_MAX = 200
+LIGHT_ANSWER_CHARS = 200            # view=light 일 때 답변 앞부분 길이
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 # ---------- DTO ----------
 class SessionCreate(BaseModel):
     subject_id: int
@@ -28,12 +36,14 @@ class AskIn(BaseModel):
     chat_session_id: int = Field(..., description="생성된 Q&A 세션 ID")
     subject_id: int
     question: str = Field(..., min_length=1)
+    multi_query: bool = Field(False, description="복합 질문을 하위 질의로 나눠 동시 검색(RRF 병합)")
 
 class TurnOut(BaseModel):
     qa_turn_id: int
     question: str
     answer: str
     citations: list[str] | None
+    cached: bool = False   # 의미 캐시(비슷한 이전 질문)에서 바로 응답했는지
 
 # ---------- 엔드포인트 ----------
 @router.post("/chat/sessions", response_model=SessionOut,  summary="사용자가 QA 세션 생성")
@@ -61,48 +71,121 @@ async def ask(
     if not sess or sess.user_id != user.id:
         raise HTTPException(404, "Chat session not found.")
 
-    turn = await ask_and_store(
+    turn, cached = await ask_and_store(
         db, user_id=user.id,
         chat_session_id=body.chat_session_id,
         subject_id=body.subject_id,
-        question=body.question
+        question=body.question,
+        multi_query=body.multi_query,
     )
     return TurnOut(
         qa_turn_id=turn.qa_turn_id,
         question=turn.question,
         answer=turn.answer,
         citations=turn.citations or [],
+        cached=cached,
+    )
+
+@router.post("/chat/ask/stream", summary="chat_session내에서 ai QA 생성 (SSE 스트리밍)")
+async def ask_streaming(
+    body: AskIn,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    db: AsyncSession = Depends(get_session),
+):
+    """
+    text/event-stream 으로 retrieval → citations → token... → done 이벤트를 보낸다.
+    done 이벤트에 qa_turn_id, ttft_ms(첫 토큰까지), total_ms(전체)가 포함된다.
+    """
+    sess = await db.get(ChatSessionTable, body.chat_session_id)
+    if not sess or sess.user_id != user.id:
+        raise HTTPException(404, "Chat session not found.")
+
+    events = ask_stream(
+        user_id=user.id,
+        chat_session_id=body.chat_session_id,
+        subject_id=body.subject_id,
+        question=body.question,
+        multi_query=body.multi_query,
     )
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.get("/chat/sessions/{chat_session_id}/turns", response_model=list[TurnOut],
-            summary="대화기록 조회")
+            summary="대화기록 조회 (qa_turn_id 커서 페이지네이션)")
 async def list_turns(
     chat_session_id: int,
+    response: Response,
+    cursor: int | None = Query(None, description="이전 페이지의 X-Next-Cursor 값"),
+    limit: int = Query(TURNS_PAGE_DEFAULT, ge=1, le=TURNS_PAGE_MAX),
+    direction: Literal["forward", "backward"] = Query(
+        "forward", description="forward: cursor 이후(더 최근) 턴 / backward: cursor 이전(더 오래된) 턴, cursor 없으면 최신 페이지",
+    ),
+    view: Literal["full", "light"] = Query("full", description="light: 질문 + 잘린 답변만 (인용 제외)"),
     user: UserTable = Depends(current_active_user),
     token: str = Security(bearer_scheme),
     db: AsyncSession = Depends(get_session),
 ):
+    """
+    한 페이지(limit 개)를 항상 오래된 순으로 반환한다. 다음 페이지가 있으면 응답 헤더 X-Next-Cursor 에 커서를 싣는다.
+    - forward  : 처음부터 순서대로 (qa_turn_id > cursor)
+    - backward : 최신 페이지부터 거꾸로 (qa_turn_id < cursor) → 화면은 최근 대화만 먼저 받고 "이전 대화"를 필요할 때 요청
+    (OFFSET 대신 qa_turn_id 범위 조건이라 뒤 페이지도 인덱스 범위 검색으로 끝난다)
+    """
     sess = await db.get(ChatSessionTable, chat_session_id)
     if not sess or sess.user_id != user.id:
         raise HTTPException(404, "Chat session not found.")
 
-    rows = (await db.execute(
-        # 최신 순 말고 오래된 순으로 보여줌
-        QATurnTable.__table__.select()
-        .where(QATurnTable.chat_session_id == chat_session_id)
-        .order_by(QATurnTable.qa_turn_id.asc())
-    )).mappings().all()
+    if view == "light":
+        cols = [
+            QATurnTable.qa_turn_id, QATurnTable.question,
+            func.substr(QATurnTable.answer, 1, LIGHT_ANSWER_CHARS).label("answer"),
+        ]
+    else:
+        cols = [QATurnTable.qa_turn_id, QATurnTable.question, QATurnTable.answer, QATurnTable.citations]
+
+    q = select(*cols).where(QATurnTable.chat_session_id == chat_session_id)
+    backward = direction == "backward"
+    if cursor is not None:
+        q = q.where(QATurnTable.qa_turn_id < cursor if backward else QATurnTable.qa_turn_id > cursor)
+    order = QATurnTable.qa_turn_id.desc() if backward else QATurnTable.qa_turn_id.asc()
+    # 1개 더 읽어서 다음 페이지 존재 여부 확인
+    rows = (await db.execute(q.order_by(order).limit(limit + 1))).mappings().all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        response.headers[NEXT_CURSOR_HEADER] = str(rows[-1]["qa_turn_id"])
+    if backward:
+        rows = rows[::-1]   # 최신 순 말고 오래된 순으로 보여줌
 
     return [
         TurnOut(
             qa_turn_id=r["qa_turn_id"],
             question=r["question"],
             answer=r["answer"],
-            citations=r["citations"] or [],
+            citations=(r["citations"] or []) if view == "full" else None,
         )
         for r in rows
     ]
 
+@router.get("/chat/sessions/{chat_session_id}/turns/export", summary="대화기록 전체 내보내기 (NDJSON 스트리밍)")
+async def export_turns(
+    chat_session_id: int,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    db: AsyncSession = Depends(get_session),
+):
+    """한 줄에 턴 1개(JSON). 서버 측 커서로 읽으며 바로 내보내므로 세션 길이와 무관하게 메모리 사용이 일정하다."""
+    sess = await db.get(ChatSessionTable, chat_session_id)
+    if not sess or sess.user_id != user.id:
+        raise HTTPException(404, "Chat session not found.")
+
+    return StreamingResponse(
+        export_turns_ndjson(chat_session_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="chat_session_{chat_session_id}.ndjson"'},
+    )
+
 # 개발 편의: 테이블 자동 생성
 # @router.on_event("startup")
 # async def on_startup():
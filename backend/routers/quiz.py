@@ -18,6 +18,7 @@ class QuizRequest(BaseModel):
     qtype: list[str]
     difficulty: str
     num_questions: int = 5
+    seed: int | None = None   # 지정하면 같은 자료/설정에서 같은 문제 세트 (캐시 재사용)
     
 class NextRequest(BaseModel):
     quiz_attempt_id: int        # 세트 단위 시도 id
@@ -47,6 +48,7 @@ async def generate_quiz_api(
             qtype=req.qtype,
             difficulty=req.difficulty,
             num_questions=req.num_questions,
+            random_seed=req.seed,
         )
         return quiz
     except ValueError as e:
@@ -0,0 +1,43 @@
+# routers/search.py
+# 설명: 과목 통합 검색 라우터 (내 모든 과목 자료에서 개념 찾기)
+from fastapi import APIRouter, Depends, Query, Security
+from fastapi.security import HTTPBearer
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from routers.auth import UserTable, get_session, current_active_user
+from services.search_service import search_all_subjects
+
+router = APIRouter()
+bearer_scheme = HTTPBearer()
+
+
+# ---------- DTO ----------
+class SearchHit(BaseModel):
+    subject_id: int
+    subject_name: str | None
+    document_id: int | None
+    document_title: str | None
+    page: int | None
+    score: float          # 질의와 청크의 코사인 유사도 (과목 간 비교 가능)
+    snippet: str
+
+class SearchOut(BaseModel):
+    query: str
+    results: list[SearchHit]
+    searched: int                 # 검색한 과목(컬렉션) 수
+    timed_out: list[int]          # 제한 시간 안에 응답하지 못한 subject_id
+    failed: list[int]             # 오류가 난 subject_id
+    took_ms: float
+
+
+# ---------- 엔드포인트 ----------
+@router.get("/search", response_model=SearchOut, summary="모든 과목 자료 통합 검색")
+async def search(
+    q: str = Query(..., min_length=1, description="검색어/질문"),
+    top_n: int = Query(10, ge=1, le=50),
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    db: AsyncSession = Depends(get_session),
+):
+    return await search_all_subjects(db, user_id=user.id, query=q, top_n=top_n)
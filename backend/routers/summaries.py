@@ -1,4 +1,5 @@
 # routers/summaries.py
+from datetime import datetime
 from typing import Optional, Literal
 
 from fastapi import APIRouter, Depends, HTTPException, Response, Security
@@ -8,7 +9,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from routers.auth import (
     Base, UserTable, get_session, current_active_user, engine
 )
-from services.summary_service import create_subject_summary
+from services.summary_service import (
+    create_subject_summary, create_subject_summary_batch, stream_subject_summary,
+)
+from services.summary_jobs import get_job, job_payload, submit_job, subscribe_job
+from services.sse import SSE_HEADERS, sse_stream
+from fastapi.responses import StreamingResponse
 from models.summary_domain import SummaryType
 
 from fastapi.security import HTTPBearer
@@ -27,12 +33,54 @@ class SummaryCreate(BaseModel):
     subject_id: int = Field(..., description="요약할 과목 ID")
     topic: str = Field(..., min_length=1, description="요약 주제(프롬프트)")
     type: Literal["overall", "traps", "concept_areas", "three_lines"] = "overall"
+    # rag: 주제 검색 상위 청크만 사용(기본) / hierarchical: 과목의 모든 청크를 계층 요약 (대용량 과목용)
+    # digest: 업로드 때 만든 문서별 digest 를 합쳐 요약 (새 문서분만 LLM 작업, 문서 수와 무관하게 빠름)
+    mode: Literal["rag", "hierarchical", "digest"] = "rag"
+    # 같은 주제/유형 요약이 과목 자료 변경 없이 이미 있으면 그것을 돌려준다. true 면 새로 생성
+    force: bool = False
+    # (rag 모드) 주제 검색 대신 청크 군집별 대표 청크로 컨텍스트 구성 → 같은 예산으로 과목 전체를 고르게 덮음
+    diverse: bool = False
 
 class SummaryOut(BaseModel):
     summary_id: int
     ok: bool
     reason: str
     summary: str
+    cached: bool = False     # 저장된 요약을 그대로 돌려준 경우 true
+
+class SummaryJobOut(BaseModel):
+    job_id: int
+    status: Literal["queued", "running", "done", "failed"]
+    stage: Optional[str] = None          # 진행 단계 (retrieving / generating / grading:N / resummarizing:N)
+    subject_id: int
+    topic: str
+    type: str
+    mode: str
+    summary_id: Optional[int] = None     # done 이면 저장된 요약 ID (아래 ok/reason/summary 도 채워짐)
+    ok: Optional[bool] = None
+    reason: Optional[str] = None
+    summary: Optional[str] = None
+    error: Optional[str] = None          # failed 인 경우 원인
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class SummaryBatchCreate(BaseModel):
+    subject_id: int = Field(..., description="요약할 과목 ID")
+    topic: str = Field(..., min_length=1, description="요약 주제(프롬프트)")
+    force: bool = False
+    diverse: bool = False
+
+class SummarySection(BaseModel):
+    type: Literal["overall", "traps", "concept_areas", "three_lines"]
+    summary_id: int
+    summary: str
+
+class SummaryBatchOut(BaseModel):
+    ok: bool
+    reason: str
+    cached: bool = False
+    sections: list[SummarySection]
 
 # ======== Controller ========
 @router.post("/summaries", response_model=SummaryOut, summary="과목 단위 RAG 요약 생성")
@@ -48,9 +96,101 @@ async def make_summary(
         subject_id=body.subject_id,
         topic=body.topic,
         type_=SummaryType(body.type),
+        mode=body.mode,
+        force=body.force,
+        diverse=body.diverse,
     )
     return result
 
+@router.post("/summaries/stream", summary="과목 단위 RAG 요약 생성 (SSE 스트리밍)")
+async def make_summary_streaming(
+    body: SummaryCreate,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+):
+    """
+    text/event-stream 으로 retrieval → token... → grade → (resummarize → token.../draft → grade)... → done.
+    done 이벤트에 저장된 summary_id 와 최종 요약이 들어 있다. (mode: rag | digest)
+    """
+    if body.mode == "hierarchical":
+        raise HTTPException(422, "Streaming supports mode 'rag' or 'digest'.")
+    events = stream_subject_summary(
+        user_id=user.id,
+        subject_id=body.subject_id,
+        topic=body.topic,
+        type_=SummaryType(body.type),
+        mode=body.mode,
+        force=body.force,
+        diverse=body.diverse,
+    )
+    return StreamingResponse(sse_stream(events), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/summaries/jobs", response_model=SummaryJobOut, status_code=202, summary="과목 요약 백그라운드 작업 등록")
+async def submit_summary_job(
+    body: SummaryCreate,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    job_id 를 바로 반환하고 요약은 서버 워커가 생성한다 (POST /summaries 와 같은 옵션).
+    진행/결과: GET /summaries/jobs/{job_id} 폴링 또는 GET /summaries/jobs/{job_id}/events 구독
+    """
+    job = await submit_job(
+        session,
+        user_id=user.id,
+        subject_id=body.subject_id,
+        topic=body.topic,
+        type_=body.type,
+        mode=body.mode,
+        force=body.force,
+        diverse=body.diverse,
+    )
+    return await job_payload(session, job)
+
+@router.get("/summaries/jobs/{job_id}", response_model=SummaryJobOut, summary="요약 작업 상태/결과 조회")
+async def read_summary_job(
+    job_id: int,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    session: AsyncSession = Depends(get_session),
+):
+    job = await get_job(session, job_id, user.id)
+    return await job_payload(session, job)
+
+@router.get("/summaries/jobs/{job_id}/events", summary="요약 작업 진행 구독 (SSE)")
+async def stream_summary_job(
+    job_id: int,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    text/event-stream 으로 status → (retrieval / token / grade / resummarize / draft)... → done | failed.
+    끊겼다가 다시 구독해도 되고, 이미 끝난 작업이면 최종 이벤트(done | failed)만 바로 보낸다.
+    """
+    await get_job(session, job_id, user.id)    # 없는/남의 작업은 스트림 시작 전에 404
+    return StreamingResponse(
+        sse_stream(subscribe_job(job_id, user.id)), media_type="text/event-stream", headers=SSE_HEADERS,
+    )
+
+@router.post("/summaries/batch", response_model=SummaryBatchOut, summary="4개 유형 요약 한 번에 생성")
+async def make_summary_batch(
+    body: SummaryBatchCreate,
+    user: UserTable = Depends(current_active_user),
+    token: str = Security(bearer_scheme),
+    session: AsyncSession = Depends(get_session),
+):
+    """overall / traps / concept_areas / three_lines – 검색·생성·검증 각 1회, summaries 4행 저장"""
+    return await create_subject_summary_batch(
+        session,
+        user_id=user.id,
+        subject_id=body.subject_id,
+        topic=body.topic,
+        force=body.force,
+        diverse=body.diverse,
+    )
+
 # PDF 다운로드 엔드포인트 추가
 @router.get("/summaries/{summary_id}/pdf")
 async def download_summary_pdf(
@@ -0,0 +1,92 @@
+# scripts/bench_onnx_backend.py
+# ------------------------------------------------------------
+# ONNX(int8) 백엔드 점검: PyTorch 경로 대비 정확도 드리프트 + 처리량
+#
+# 실행 (backend 폴더에서):
+#   python -m scripts.bench_onnx_backend --texts 256 --queries 32
+#
+# - 임베딩: 같은 텍스트에 대한 행별 코사인 유사도 (평균/최소)
+# - 재정렬: 질문별 후보 8개의 상위 5개 일치율, 점수 최대 절대오차
+# - 처리량: texts/s, pairs/s
+# 임계값을 넘는 드리프트가 있으면 종료코드 1 (배포 전 체크용)
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from services.ai_service_global import EMBEDDING_MODEL_NAME, RERANKER_MODEL_NAME
+from services.onnx_backend import OnnxCrossEncoder, OnnxEmbeddings, embedding_drift, rerank_drift
+
+_SENTENCES = [
+    "관계형 데이터베이스에서 정규화는 중복을 줄이고 이상 현상을 방지한다.",
+    "트랜잭션의 격리 수준이 낮을수록 동시성은 높아지지만 팬텀 리드가 발생할 수 있다.",
+    "Gradient descent updates parameters in the direction of the negative gradient.",
+    "과적합을 줄이기 위해 L2 정규화나 드롭아웃을 사용한다.",
+    "B+ 트리 인덱스는 범위 검색에 유리하며 리프 노드가 연결 리스트로 이어져 있다.",
+    "The bias-variance tradeoff describes the tension between underfitting and overfitting.",
+    "해시 조인은 등가 조인에서 작은 테이블로 해시 테이블을 만들어 큰 테이블을 탐색한다.",
+    "커밋 이전의 변경 사항은 롤백으로 되돌릴 수 있다.",
+]
+
+
+def _texts(n: int, rng: random.Random):
+    return [" ".join(rng.sample(_SENTENCES, 3)) for _ in range(n)]
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--texts", type=int, default=256)
+    ap.add_argument("--queries", type=int, default=32)
+    ap.add_argument("--min-cos", type=float, default=0.98)
+    ap.add_argument("--min-overlap", type=float, default=0.8)
+    args = ap.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from sentence_transformers import CrossEncoder
+
+    rng = random.Random(0)
+    texts = _texts(args.texts, rng)
+    queries = _texts(args.queries, rng)
+    pairs = [(q, d) for q in queries for d in rng.sample(texts, 8)]
+
+    torch_emb = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, model_kwargs={"device": "cpu"})
+    torch_rr = CrossEncoder(RERANKER_MODEL_NAME)
+    onnx_emb = OnnxEmbeddings(EMBEDDING_MODEL_NAME)
+    onnx_rr = OnnxCrossEncoder(RERANKER_MODEL_NAME)
+
+    # warm-up (세션 초기화/스레드풀 생성 비용 제외)
+    torch_emb.embed_documents(texts[:8]); onnx_emb.embed_documents(texts[:8])
+    torch_rr.predict(pairs[:8]); onnx_rr.predict(pairs[:8])
+
+    ref_e, t_te = _timed(torch_emb.embed_documents, texts)
+    cand_e, t_oe = _timed(onnx_emb.embed_documents, texts)
+    ref_r, t_tr = _timed(torch_rr.predict, pairs)
+    cand_r, t_or = _timed(onnx_rr.predict, pairs)
+
+    e_drift = embedding_drift(np.asarray(ref_e), np.asarray(cand_e))
+    r_drift = rerank_drift(np.asarray(ref_r), np.asarray(cand_r), group=8)
+
+    print(f"{'':<12}{'torch':>12}{'onnx':>12}{'speedup':>10}")
+    print(f"{'texts/s':<12}{len(texts)/t_te:>12.1f}{len(texts)/t_oe:>12.1f}{t_te/t_oe:>10.2f}x")
+    print(f"{'pairs/s':<12}{len(pairs)/t_tr:>12.1f}{len(pairs)/t_or:>12.1f}{t_tr/t_or:>10.2f}x")
+    print("embedding drift:", e_drift)
+    print("rerank drift:   ", r_drift)
+
+    ok = e_drift["cos_min"] >= args.min_cos and r_drift["topn_overlap_mean"] >= args.min_overlap
+    print("PASS" if ok else "FAIL: drift above threshold")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# scripts/bench_rerank.py
+# ------------------------------------------------------------
+# 재정렬 부하 벤치마크: 요청별 executor 호출 vs 마이크로 배칭(rerank_service)
+#
+# 실행 (backend 폴더에서):
+#   python -m scripts.bench_rerank --requests 64 --concurrency 1 8 32
+#
+# 각 "질문자"는 chat 과 동일하게 (질문, 청크) 8쌍을 재정렬한다.
+# 동시 질문자 수별로 요청 지연시간 p50/p99 와 처리량(req/s)을 출력한다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from langchain.schema import Document
+
+from services.ai_service_global import get_reranker
+from services.rerank_service import rerank_scores, rerank_stats
+
+_WORDS = (
+    "정규화 트랜잭션 인덱스 해시 조인 락 격리수준 커밋 롤백 스키마 뷰 트리거 "
+    "gradient descent overfitting regularization kernel entropy bias variance"
+).split()
+
+
+def _fake_chunk(rng: random.Random, n_words: int = 90) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n_words))
+
+
+def _workload(n: int, k: int = 8, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        (f"{rng.choice(_WORDS)} 와 {rng.choice(_WORDS)} 의 차이는?",
+         [Document(page_content=_fake_chunk(rng)) for _ in range(k)])
+        for _ in range(n)
+    ]
+
+
+async def _direct(question: str, docs: List[Document]) -> List[float]:
+    """기존 방식: 요청마다 default executor 에서 predict"""
+    loop = asyncio.get_running_loop()
+    pairs = [[question, d.page_content] for d in docs]
+    return list(await loop.run_in_executor(None, get_reranker().predict, pairs))
+
+
+async def _run(fn: Callable[[str, List[Document]], Awaitable], work, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    lat: List[float] = []
+
+    async def one(q, docs):
+        async with sem:
+            t0 = time.perf_counter()
+            await fn(q, docs)
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q, d) for q, d in work))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    p99 = lat[min(len(lat) - 1, int(round(0.99 * (len(lat) - 1))))]
+    return statistics.median(lat), p99, len(work) / wall
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = ap.parse_args()
+
+    get_reranker()  # 모델 로드 시간은 측정에서 제외
+    work = _workload(args.requests)
+    await _direct(*work[0])  # warm-up
+
+    print(f"{'mode':<10}{'conc':>6}{'p50(ms)':>12}{'p99(ms)':>12}{'req/s':>10}")
+    for conc in args.concurrency:
+        for name, fn in (("direct", _direct), ("batched", rerank_scores)):
+            p50, p99, rps = await _run(fn, work, conc)
+            print(f"{name:<10}{conc:>6}{p50:>12.1f}{p99:>12.1f}{rps:>10.1f}")
+    print("batcher:", rerank_stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+# scripts/check_summary_sections.py
+# ------------------------------------------------------------
+# 4개 유형 한 번에 요약(POST /summaries/batch)의 섹션 분리(split_summary_sections) 회귀 검사
+#
+# 실행 (backend 폴더에서):
+#   python -m scripts.check_summary_sections
+#   python -m scripts.check_summary_sections --fixtures my.jsonl -v
+#
+# fixture 형식 (jsonl, 한 줄에 1건):
+#   {"id": "...", "text": "summary_prompt 형식 출력", "expect": {"overall": ["이 섹션에 있어야 할 문자열", ...], ...},
+#    "missing": ["없어야 할 유형", ...]}
+#   expect 의 각 문자열은 해당 섹션에만 있어야 한다 (다른 섹션으로 잘못 나뉘면 실패).
+#
+# 출력: 건별 통과/실패와 실패 사유. 하나라도 실패하면 종료 코드 1.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+from services.summary_service import split_summary_sections
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "summary_sections.jsonl")
+
+
+def _load(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(case: dict) -> list[str]:
+    sections = {t.value: body for t, body in split_summary_sections(case["text"]).items()}
+    errors = []
+    for type_, needles in case.get("expect", {}).items():
+        body = sections.get(type_)
+        if body is None:
+            errors.append(f"{type_}: missing")
+            continue
+        for needle in needles:
+            if needle not in body:
+                errors.append(f"{type_}: {needle!r} not in section")
+            for other, other_body in sections.items():
+                if other != type_ and needle in other_body:
+                    errors.append(f"{type_}: {needle!r} leaked into {other}")
+    for type_ in case.get("missing", []):
+        if type_ in sections:
+            errors.append(f"{type_}: expected missing, got {sections[type_][:40]!r}")
+    return errors
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    failed = 0
+    for case in _load(args.fixtures):
+        errors = check(case)
+        failed += bool(errors)
+        print(f"{case['id']:<32} {'FAIL' if errors else 'ok'}")
+        for e in errors:
+            print(f"    {e}")
+        if args.verbose and not errors:
+            for t, body in split_summary_sections(case["text"]).items():
+                print(f"    [{t.value}] {body!r}")
+    print(f"{failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
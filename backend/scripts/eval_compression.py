@@ -0,0 +1,111 @@
+# scripts/eval_compression.py
+# ------------------------------------------------------------
+# 요약 컨텍스트 추출식 압축(services/context_compressor) 효과 측정
+#
+# 실행 (backend 폴더에서):
+#   python -m scripts.eval_compression                    # 토큰 감소 / 압축 지연 / 핵심 용어 보존율
+#   python -m scripts.eval_compression --llm              # + 압축 전/후 컨텍스트로 실제 요약 생성 후 비교 (API 호출 발생)
+#   python -m scripts.eval_compression --budget 400 -v
+#
+# fixture 형식 (jsonl, 한 줄에 과목 1개):
+#   {"id": "...", "topic": "요약 주제", "chunks": ["청크", ...], "key_terms": ["반드시 남아야 할 용어", ...]}
+#
+# 예산: --budget 을 주면 그 토큰 수, 아니면 과목별 원문 토큰 × --ratio
+# 출력(과목별 + 합계):
+#   tokens      : 프롬프트 컨텍스트 토큰 (원문 → 압축)
+#   compress_ms : 압축 단계 지연 (문장 분리 + 배치 임베딩 + 선택)
+#   terms       : 핵심 용어 보존율 (컨텍스트 기준, 요약 품질의 대리 지표)
+#   --llm 시    : 생성 지연(ms), 요약의 핵심 용어 포함률, LLM 심사(grade_summary, 원문 청크 기준) 통과 여부
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from langchain.schema import Document
+
+from services.ai_service_global import grade_summary, llm_gateway, summary_prompt
+from services.context_compressor import compress_sync
+from services.context_packer import count_tokens
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "compression.jsonl")
+
+
+def _load(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _term_rate(text: str, terms: list[str]) -> float:
+    if not terms:
+        return 1.0
+    low = text.lower()
+    return sum(t.lower() in low for t in terms) / len(terms)
+
+
+async def _summarize(context: str, topic: str, docs: list[Document]) -> tuple[str, float, bool]:
+    t0 = time.perf_counter()
+    text = await llm_gateway.ainvoke(summary_prompt.format(context=context, question=topic), cache=False)
+    gen_ms = (time.perf_counter() - t0) * 1000
+    grade = await grade_summary(llm_gateway, docs, text)
+    return text, gen_ms, bool(grade.ok)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    ap.add_argument("--budget", type=int, default=0, help="압축 후 토큰 상한 (0 이면 --ratio 사용)")
+    ap.add_argument("--ratio", type=float, default=0.5, help="원문 토큰 대비 예산 비율")
+    ap.add_argument("--llm", action="store_true", help="압축 전/후 컨텍스트로 요약을 생성해 비교")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    cases = _load(args.fixtures)
+    tot = {"before": 0, "after": 0, "ms": 0.0, "terms_before": 0.0, "terms_after": 0.0}
+    llm_rows = []
+    for case in cases:
+        docs = [Document(page_content=c) for c in case["chunks"]]
+        full = "\n\n".join(case["chunks"])
+        before = count_tokens(full)
+        budget = args.budget or max(1, int(before * args.ratio))
+
+        t0 = time.perf_counter()
+        packed = compress_sync(docs, case["topic"], budget)
+        compress_ms = (time.perf_counter() - t0) * 1000
+        compressed = "\n\n".join(d.page_content for d in packed.docs) if packed else full
+        after = count_tokens(compressed)
+
+        terms = case.get("key_terms", [])
+        tb, ta = _term_rate(full, terms), _term_rate(compressed, terms)
+        tot["before"] += before
+        tot["after"] += after
+        tot["ms"] += compress_ms
+        tot["terms_before"] += tb
+        tot["terms_after"] += ta
+        print(f"{case['id']:<20} tokens {before:>5} → {after:>5} ({1 - after / max(before, 1):.0%} saved) "
+              f"compress_ms={compress_ms:7.1f} terms {tb:.0%} → {ta:.0%}")
+        if args.verbose:
+            print(f"    {compressed}")
+
+        if args.llm:
+            base = await _summarize(full, case["topic"], docs)
+            comp = await _summarize(compressed, case["topic"], docs)
+            llm_rows.append((case["id"], base, comp, terms))
+
+    n = max(len(cases), 1)
+    print(f"total tokens {tot['before']} → {tot['after']} ({1 - tot['after'] / max(tot['before'], 1):.0%} saved), "
+          f"mean compress_ms={tot['ms'] / n:.1f}, "
+          f"key-term retention {tot['terms_before'] / n:.0%} → {tot['terms_after'] / n:.0%}")
+
+    if llm_rows:
+        print("\nsummary quality (uncompressed vs compressed context):")
+        for cid, (bt, bms, bok), (ct, cms, cok), terms in llm_rows:
+            print(f"{cid:<20} gen_ms {bms:7.1f} → {cms:7.1f}  terms {_term_rate(bt, terms):.0%} → "
+                  f"{_term_rate(ct, terms):.0%}  grader_ok {bok} → {cok}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# scripts/eval_faithfulness.py
+# ------------------------------------------------------------
+# 요약 정합성 로컬 사전 검사(services/faithfulness) vs LLM 심사(grade_summary) 일치율 평가
+#
+# 실행 (backend 폴더에서):
+#   python -m scripts.eval_faithfulness                      # fixture 에 기록된 LLM 판정(llm_ok)과 비교
+#   python -m scripts.eval_faithfulness --llm                # 지금 LLM 심사를 다시 돌려 비교 (API 호출 발생)
+#   python -m scripts.eval_faithfulness --fixtures my.jsonl -v
+#
+# fixture 형식 (jsonl, 한 줄에 1건):
+#   {"id": "...", "context": ["청크", ...], "summary": "요약문", "llm_ok": true/false}
+#
+# 출력: 로컬 판정 분포, LLM 심사 회피율(로컬 pass 로 끝난 비율 – fail 은 LLM 심사로 확정하므로 회피 아님),
+#       로컬 pass/fail 각각의 LLM 심사 일치율, 판정별 오분류 목록
+#       (pass 일치율이 낮으면 잘못된 요약이 심사 없이 통과하므로 FAITH_PASS_FRAC/FAITH_SENT_MIN 을 올린다)
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+from collections import Counter
+
+import numpy as np
+from langchain.schema import Document
+
+from services.ai_service_global import get_embeddings, grade_summary, llm_gateway
+from services.faithfulness import score_summary, split_sentences
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "faithfulness.jsonl")
+
+
+def _load(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def _llm_label(case: dict) -> bool:
+    docs = [Document(page_content=c) for c in case["context"]]
+    grade = await grade_summary(llm_gateway, docs, case["summary"])
+    return bool(grade.ok)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    ap.add_argument("--llm", action="store_true", help="기록된 llm_ok 대신 LLM 심사를 다시 호출")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    cases = _load(args.fixtures)
+    emb = get_embeddings()
+
+    decisions = Counter()
+    agree = Counter()
+    mistakes = []
+    for case in cases:
+        sentences = split_sentences(case["summary"])
+        sent_vecs = np.asarray(emb.embed_documents(sentences), dtype=np.float32) if sentences else np.zeros((0, 1))
+        chunk_vecs = np.asarray(emb.embed_documents(case["context"]), dtype=np.float32)
+        verdict = score_summary(sentences, sent_vecs, case["context"], chunk_vecs)
+        label = await _llm_label(case) if args.llm else bool(case["llm_ok"])
+
+        decisions[verdict.decision] += 1
+        if verdict.decision != "borderline":
+            if (verdict.decision == "pass") == label:
+                agree[verdict.decision] += 1
+            else:
+                mistakes.append((case["id"], verdict.decision, label))
+        if args.verbose:
+            print(f"{case['id']:<28} local={verdict.decision:<10} frac={verdict.supported_frac:.2f} "
+                  f"llm_ok={label} scores={verdict.scores}")
+
+    total = len(cases)
+    print(f"cases={total} pass={decisions['pass']} fail={decisions['fail']} borderline={decisions['borderline']}")
+    print(f"grader calls avoided: {decisions['pass']}/{total} ({decisions['pass'] / max(total, 1):.0%})")
+    for dec in ("pass", "fail"):
+        print(f"agreement with LLM grader on local {dec}: {agree[dec]}/{decisions[dec]} "
+              f"({agree[dec] / max(decisions[dec], 1):.0%})")
+    for cid, dec, label in mistakes:
+        print(f"  mismatch: {cid} local={dec} llm_ok={label}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,13 +2,14 @@
 AI 공용 유틸 (정제/분할/임베딩/LLM/프롬프트/CRAG 검증)
 
 - 이 모듈은 업로드/인덱싱(document_service)과 요약(summary_service)에서 공통 사용됩니다.
-- 임베딩 모델은 최초 import 시 로드(캐시됨). 최초 1회만 다운로드되며 다음부터는 로컬 캐시 사용.
+- 임베딩/재정렬 모델은 최초 사용 시(또는 startup warm-up 시) 1회만 로드(지연 로딩).
+  import 만으로는 모델을 올리지 않으므로 프로세스/워커 기동이 가볍다.
 """
 from __future__ import annotations
 
-import os, re, uuid
+import asyncio, os, re, uuid, time, threading
 from bs4 import BeautifulSoup
-from typing import List, Tuple, Optional
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple, Optional
 import warnings, logging
 from PyPDF2 import PdfReader
 
@@ -18,10 +19,6 @@ from bs4 import BeautifulSoup
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-# ----- Embeddings (HuggingFace) -----
-# sentence-transformers/all-mpnet-base-v2 를 사용 (768차원)
-from langchain_huggingface import HuggingFaceEmbeddings
-
 # ----- Google Generative AI (LLM) -----
 # langchain-google-genai 어댑터로 Gemini를 LangChain LLM처럼 사용
 
@@ -50,21 +47,156 @@ if not GOOGLE_API_KEY:
 else:
     genai.configure(api_key=GOOGLE_API_KEY)
 
-# ---- 임베딩 (전역 1회만 로드) ----
+# ==============================
+#  모델 지연 로딩 (임베딩 / 재정렬)
+# ==============================
+# - 임베딩: sentence-transformers/all-mpnet-base-v2 (768차원)
+# - 재정렬: BAAI/bge-reranker-base (CrossEncoder)
+# import 시점에는 아무것도 로드하지 않고, get_embeddings()/get_reranker() 최초 호출 시 1회 로드한다.
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+RERANKER_MODEL_NAME = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+# 추론 백엔드: torch(기본, eager PyTorch) | onnx (ONNX Runtime + int8, services/onnx_backend.py)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").strip().lower()
 
-_EMBEDDINGS = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2",
-    model_kwargs={'device': 'cpu'}
-)
+class _LazyModel:
+    """
+    최초 get() 호출 시 loader를 1회만 실행하는 스레드 안전 프로바이더.
+    - 여러 요청/스레드가 동시에 get() 해도 로드는 한 번만 일어난다(double-checked locking).
+    - 로드 상태/소요시간/에러를 readiness 체크에서 보여줄 수 있게 보관한다.
+    """
+    def __init__(self, name: str, loader: Callable[[], object]):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._obj: object | None = None
+        self.load_seconds: float | None = None
+        self.error: str | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._obj is not None
+
+    def get(self):
+        obj = self._obj
+        if obj is not None:
+            return obj
+        with self._lock:
+            if self._obj is None:
+                t0 = time.perf_counter()
+                try:
+                    self._obj = self._loader()
+                except Exception as e:
+                    self.error = repr(e)
+                    raise
+                self.error = None
+                self.load_seconds = round(time.perf_counter() - t0, 3)
+                logging.info(f"[models] {self.name} loaded in {self.load_seconds}s")
+            return self._obj
+
+def _model_server_client():
+    """
+    MODEL_SERVER_SOCKET 이 설정되어 있으면 공유 모델 서버(services/model_server.py) 클라이언트를 만든다.
+    (이 경우 워커 프로세스는 모델을 직접 올리지 않는다)
+    """
+    path = os.getenv("MODEL_SERVER_SOCKET", "").strip()
+    if not path:
+        return None
+    from services.model_client import ModelServerClient
+    client = ModelServerClient(path)
+    client.ping()  # 서버가 안 떠 있으면 여기서 실패 → readiness에 error로 노출
+    return client
+
+def _load_embeddings():
+    client = _model_server_client()
+    if client is not None:
+        from services.model_client import RemoteEmbeddings
+        return RemoteEmbeddings(client)
+    if MODEL_BACKEND == "onnx":
+        from services.onnx_backend import OnnxEmbeddings
+        return OnnxEmbeddings(EMBEDDING_MODEL_NAME)
+    # torch/transformers import 자체가 무거우므로 로더 안에서 import
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cpu'}
+    )
+
+def _load_reranker():
+    client = _model_server_client()
+    if client is not None:
+        from services.model_client import RemoteReranker
+        return RemoteReranker(client)
+    if MODEL_BACKEND == "onnx":
+        from services.onnx_backend import OnnxCrossEncoder
+        return OnnxCrossEncoder(RERANKER_MODEL_NAME)
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANKER_MODEL_NAME)
+
+_MODELS: Dict[str, _LazyModel] = {
+    "embeddings": _LazyModel("embeddings", _load_embeddings),
+    "reranker": _LazyModel("reranker", _load_reranker),
+}
+
+def get_embeddings():
+    """전역 임베딩 인스턴스 (최초 호출 시 로드)"""
+    return _MODELS["embeddings"].get()
+
+def get_reranker():
+    """전역 CrossEncoder 재정렬 모델 (최초 호출 시 로드)"""
+    return _MODELS["reranker"].get()
+
+def warmup_targets() -> List[str]:
+    """
+    MODEL_WARMUP 환경변수로 startup 직후 미리 올릴 모델을 정한다.
+      - (없음/기본) "all"  : 임베딩 + 재정렬
+      - "none"             : warm-up 안 함 (첫 요청에서 로드)
+      - "embeddings,reranker" 처럼 콤마 구분 목록
+    """
+    raw = os.getenv("MODEL_WARMUP", "all").strip().lower()
+    if raw in ("", "all"):
+        return list(_MODELS)
+    if raw == "none":
+        return []
+    return [n.strip() for n in raw.split(",") if n.strip() in _MODELS]
+
+def warmup_models(names: Iterable[str] | None = None) -> None:
+    """
+    지정한 모델들을 순서대로 로드한다(동기 함수 → 백그라운드 스레드에서 호출).
+    실패해도 예외를 올리지 않고 로그만 남긴다(readiness에서 error로 노출).
+    """
+    for name in (names if names is not None else warmup_targets()):
+        try:
+            _MODELS[name].get()
+        except Exception as e:
+            logging.warning(f"[models] warm-up failed for {name}: {e!r}")
+
+def model_status() -> Dict[str, dict]:
+    """readiness 응답용: 모델별 로드 여부/소요시간/에러"""
+    return {
+        name: {"loaded": m.loaded, "load_seconds": m.load_seconds, "error": m.error}
+        for name, m in _MODELS.items()
+    }
 
 # ---- LLM 인스턴스 (Gemini) ----
-# 요약/QA 등 생성용.
+# 요약/QA 등 생성용. 재시도/속도 제한은 게이트웨이가 담당하므로 SDK 자체 재시도는 1회로 줄인다.
 llm = ChatGoogleGenerativeAI(
     model="gemini-2.5-flash",
     temperature=0.4,
     google_api_key=GOOGLE_API_KEY,
+    max_retries=1,
 )
 
+# ---- LLM 게이트웨이 ----
+# 서비스 코드는 llm 을 직접 invoke 하지 말고 이 게이트웨이를 거친다.
+# (async + 동시성 상한 + 타임아웃 + 속도 제한/재시도 + 동일 요청 병합 + 메트릭)
+# LLM_FAKE=1 이면 네트워크 없이 동작하는 가짜 모델을 사용 (테스트/부하 실험용)
+from services.llm_gateway import LLMGateway
+if os.getenv("LLM_FAKE", "").strip().lower() in ("1", "true", "yes"):
+    from services.llm_fake import FakeChatModel
+    llm_gateway = LLMGateway(FakeChatModel())
+else:
+    llm_gateway = LLMGateway(llm)
+
 # ---- 텍스트 정리 ----
 def clean_text(t: str) -> str:
     t = BeautifulSoup(t, "html.parser").get_text(" ")
@@ -126,6 +258,30 @@ question_prompt = PromptTemplate(
     """
 )
 
+# 대화 메모리가 있는 세션용 QA 프롬프트 (후속 질문의 지시어를 이전 대화로 해석)
+chat_question_prompt = PromptTemplate(
+    input_variables=["history", "context", "question"],
+    template=
+    """
+    From the given context, answer the question concisely.
+    The conversation so far is given only to understand what the question refers to; do not cite it.
+    Use inline citation markers like [1], , etc., to indicate which context passages support your answer.
+    **Important: Use ONLY the provided citation numbers shown in the context.** Do NOT invent or change citation numbers.
+    If no exact answer exists, reply 'No answer'.
+
+    Conversation so far:
+    {history}
+
+    Context with labels:
+    {context}
+
+    Question:
+    {question}
+
+    Answer (with [n] markers):
+    """
+)
+
 # ==============================
 #  CRAG: 요약 정합성 검증
 # ==============================
@@ -133,12 +289,16 @@ class SummaryGrade(BaseModel):
     ok: bool = Field(description="요약이 컨텍스트에 충실하면 true, 아니면 false")
     reason: str = Field(description="왜 그렇게 판단했는지 1~2문장")
 
-def grade_summary(llm: ChatGoogleGenerativeAI, retrieved_docs: List[Document], summary_text: str) -> SummaryGrade:
+async def grade_summary(
+    gateway: LLMGateway, retrieved_docs: List[Document], summary_text: str,
+    *, user_id=None, cache_scope: Optional[str] = None,
+) -> SummaryGrade:
     """
     요약문이 컨텍스트에 충실한지 LLM이 판정.
     LangChain의 structured output으로 JSON을 안정적으로 파싱.
+    (컨텍스트+요약이 같으면 판정도 같으므로 디스크 캐시 사용. cache_scope=과목 인덱스 버전)
     """
-    ctx = "\n\n".join(d.page_content for d in retrieved_docs[:6])
+    ctx = "\n\n".join(d.page_content for d in retrieved_docs)
     grader_prompt = f"""
     당신은 요약의 정합성을 평가하는 심사위원입니다.
     아래 컨텍스트와 요약이 사실적으로 일치하는지 평가하세요.
@@ -151,30 +311,103 @@ def grade_summary(llm: ChatGoogleGenerativeAI, retrieved_docs: List[Document], s
 
     JSON 형식으로만 답변하세요: {{ "ok": true/false, "reason": "<간단 사유>" }}
     """
-    structured = llm.with_structured_output(SummaryGrade)
-    return structured.invoke(grader_prompt)
+    return await gateway.ainvoke(
+        grader_prompt, schema=SummaryGrade, user_id=user_id, cache=True, cache_scope=cache_scope
+    )
 
-def refine_with_crag(summary_chain, llm: ChatGoogleGenerativeAI, retriever, topic: str, max_iters: int = 2, verbose: bool = True) -> Tuple[str, bool, str]:
+CRAG_SPECULATIVE = os.getenv("CRAG_SPECULATIVE", "1") != "0"
+
+def _fix_instruction(summary_text: str, reason: str) -> str:
+    return f"{summary_text}\n\n위 요약의 문제: {reason}\n→ 문제를 반영하여 다시 요약하세요."
+
+async def refine_with_crag(
+    generate: Callable[..., Awaitable[str]],
+    gateway: LLMGateway,
+    docs: List[Document],
+    topic: str,
+    max_iters: int = 2,
+    verbose: bool = True,
+    *,
+    user_id=None,
+    cache_scope: Optional[str] = None,
+    vectorstore=None,
+    on_event: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+) -> Tuple[str, bool, str]:
     """
+    검색은 호출자가 요청당 1회만 하고, 같은 컨텍스트(docs)로 생성과 검증을 모두 한다.
+      generate(instruction, speculative=False) → 요약문 (docs 와 같은 컨텍스트로 생성)
     1) 요약 생성
-    2) grade_summary로 정합성 검사
+    2) 로컬 사전 검사(임베딩 유사도 + 용어 겹침): 확실한 통과(pass)만 LLM 심사 생략,
+       실패(fail)/애매(borderline)는 grade_summary로 정합성 검사 (로컬 실패만으로 요약을 떨어뜨리지 않음)
+       – 이때 로컬 검사가 찾은 근거 부족 문장으로 다음 초안을 미리(투기적으로) 생성해 심사와 겹친다.
+         불합격이면 그 초안을 바로 쓰고, 합격이면 취소한다.
     3) 불합격이면 사유를 포함해 재요약 (max_iters 회)
     4) (summary_text, ok, reason) 반환
+    on_event(event, data) 가 있으면 진행 상황을 알린다 (스트리밍 요약용):
+      grade       : {"round", "ok", "reason", "by": "local" | "llm"}
+      resummarize : {"round", "reason", "speculative"}  – 다음 초안 생성 시작
+      draft       : {"round", "text"}                    – 미리 만들어 둔(투기적) 초안을 채택한 경우
     """
-    summary_out = summary_chain.run(topic)
+    # faithfulness 가 이 모듈을 import 하므로 함수 안에서 import
+    from services import metrics
+    from services.faithfulness import FAITH_PRECHECK, local_precheck, record_grader_call
+
+    async def _cancel(task: Optional[asyncio.Task]) -> None:
+        """쓰지 않게 된 투기적 초안 정리 (아직 진행 중이면 취소, 이미 끝났으면 낭비로 집계)"""
+        if task is None:
+            return
+        if task.done():
+            metrics.inc("crag.speculative.wasted")
+            if not task.cancelled():
+                task.exception()   # 결과/예외 소비 (미처리 예외 경고 방지)
+        else:
+            task.cancel()
+            metrics.inc("crag.speculative.cancelled")
+
+    async def _emit(event: str, data: dict) -> None:
+        if on_event is not None:
+            await on_event(event, data)
+
+    summary_out = await generate(topic)
     for it in range(max_iters + 1):
-        docs_for_grade = retriever.get_relevant_documents(topic)
-        grade = grade_summary(llm, docs_for_grade, summary_out)
+        local = await local_precheck(vectorstore, docs, summary_out) if FAITH_PRECHECK else None
+        speculative: Optional[asyncio.Task] = None
+        by_local = local is not None and local.decision == "pass"
+        if by_local:
+            record_grader_call(avoided=True)
+            grade = SummaryGrade(ok=True, reason=local.reason)
+        else:
+            record_grader_call(avoided=False)
+            if CRAG_SPECULATIVE and it < max_iters and local is not None and local.unsupported:
+                speculative = asyncio.create_task(
+                    generate(_fix_instruction(summary_out, local.reason), speculative=True)
+                )
+                metrics.inc("crag.speculative.started")
+            try:
+                grade = await grade_summary(gateway, docs, summary_out, user_id=user_id, cache_scope=cache_scope)
+            except BaseException:
+                await _cancel(speculative)
+                raise
+        await _emit("grade", {
+            "round": it, "ok": grade.ok, "reason": grade.reason,
+            "by": "local" if by_local else "llm",
+        })
         if grade.ok:
+            await _cancel(speculative)
             if verbose:
                 logging.info(f"[CRAG] ✅ 통과(iter {it}): {grade.reason}")
             return summary_out, True, grade.reason
         if it == max_iters:
+            await _cancel(speculative)
             if verbose:
                 logging.warning(f"[CRAG] ⚠️ 최대 재시도 도달. 마지막 사유: {grade.reason}")
             return summary_out, False, grade.reason
         if verbose:
             logging.info(f"[CRAG] ❌ 실패(iter {it}): {grade.reason} → 재요약")
-        fix_prompt = f"{summary_out}\n\n위 요약의 문제: {grade.reason}\n→ 문제를 반영하여 다시 요약하세요."
-        summary_out = summary_chain.run(fix_prompt)
-
+        await _emit("resummarize", {"round": it + 1, "reason": grade.reason, "speculative": speculative is not None})
+        if speculative is not None:
+            metrics.inc("crag.speculative.used")
+            summary_out = await speculative
+            await _emit("draft", {"round": it + 1, "text": summary_out})
+        else:
+            summary_out = await generate(_fix_instruction(summary_out, grade.reason))
@@ -0,0 +1,102 @@
+# services/answer_cache.py
+# ------------------------------------------------------------
+# 스마트 Q&A 의미 기반 답변 캐시 (과목 인덱스 버전 단위)
+# - 같은 과목에서 표현만 다른 비슷한 질문이 오면, 질문 임베딩 코사인 유사도가
+#   QA_CACHE_SIMILARITY 이상인 기존 답변/인용을 그대로 돌려준다 (검색·재정렬·LLM 생략).
+# - 캐시는 (vector_index_id, index_version) 에 묶여 있어 새 자료가 업로드되면 통째로 버려진다.
+# - 대화 메모리가 없는 질문만 조회/저장한다 (메모리가 있는 답변은 세션 대화 맥락에 의존하므로).
+# - 프로세스(워커) 메모리에 보관. 인덱스 수/인덱스당 항목 수 모두 상한이 있다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+QA_CACHE_SIMILARITY = float(os.getenv("QA_CACHE_SIMILARITY", "0.92"))
+QA_CACHE_MAX_ENTRIES = int(os.getenv("QA_CACHE_MAX_ENTRIES", "256"))   # 인덱스(과목)당
+QA_CACHE_MAX_INDEXES = int(os.getenv("QA_CACHE_MAX_INDEXES", "512"))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    citations: List[str]
+    similarity: float = 1.0
+
+
+@dataclass
+class _IndexEntries:
+    version: int
+    vecs: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+    items: List[CachedAnswer] = field(default_factory=list)
+
+
+def _normalize(vec: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = QA_CACHE_SIMILARITY,
+        max_entries: int = QA_CACHE_MAX_ENTRIES,
+        max_indexes: int = QA_CACHE_MAX_INDEXES,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_indexes = max_indexes
+        self._lock = threading.Lock()
+        self._by_index: "OrderedDict[int, _IndexEntries]" = OrderedDict()
+
+    def _entries(self, index_row, create: bool) -> Optional[_IndexEntries]:
+        key, version = index_row.vector_index_id, index_row.index_version or 0
+        entries = self._by_index.get(key)
+        if entries is not None and entries.version != version:
+            # 인덱스가 바뀜(새 업로드) → 이전 답변 전부 무효
+            del self._by_index[key]
+            entries = None
+        if entries is None and create:
+            entries = self._by_index[key] = _IndexEntries(version=version)
+            while len(self._by_index) > self.max_indexes:
+                self._by_index.popitem(last=False)
+        if entries is not None:
+            self._by_index.move_to_end(key)
+        return entries
+
+    def lookup(self, index_row, query_vec: Sequence[float]) -> Optional[CachedAnswer]:
+        q = _normalize(query_vec)
+        with self._lock:
+            entries = self._entries(index_row, create=False)
+            if entries is None or not entries.items:
+                return None
+            sims = entries.vecs @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            hit = entries.items[best]
+            # 최근 사용한 항목을 뒤로 (오래된 항목부터 밀려나게)
+            entries.items.append(entries.items.pop(best))
+            entries.vecs = np.vstack([np.delete(entries.vecs, best, axis=0), entries.vecs[best]])
+        return CachedAnswer(hit.question, hit.answer, list(hit.citations), float(sims[best]))
+
+    def store(self, index_row, query_vec: Sequence[float], question: str, answer: str, citations: List[str]) -> None:
+        q = _normalize(query_vec)
+        with self._lock:
+            entries = self._entries(index_row, create=True)
+            entries.vecs = q[None, :] if not entries.items else np.vstack([entries.vecs, q])
+            entries.items.append(CachedAnswer(question, answer, list(citations)))
+            if len(entries.items) > self.max_entries:
+                drop = len(entries.items) - self.max_entries
+                entries.items = entries.items[drop:]
+                entries.vecs = entries.vecs[drop:]
+
+
+answer_cache = SemanticAnswerCache()
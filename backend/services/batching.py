@@ -0,0 +1,132 @@
+# services/batching.py
+# ------------------------------------------------------------
+# 동적 마이크로 배칭 (dynamic micro-batching)
+# - 여러 요청(코루틴)이 submit()한 아이템을 몇 ms 동안 모아 한 번의 배치 호출로 처리하고,
+#   결과를 요청별로 다시 나눠 돌려준다.
+# - 임베딩/CrossEncoder처럼 "한 번에 많이" 돌릴수록 효율적인 모델 호출에 사용.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Sequence, Tuple
+
+
+class MicroBatcher:
+    """
+    submit(items) → 같은 순서의 결과 리스트.
+
+    동작:
+      1) 첫 요청이 들어오면 max_wait_ms 동안(또는 max_batch 개가 찰 때까지) 다른 요청을 더 기다린다.
+      2) 모인 아이템을 이어붙여 batch_fn(flat_items)을 전용 스레드 1개에서 실행한다.
+         (모델 호출을 직렬화 → torch 내부 스레드끼리 코어를 두고 경쟁하지 않음)
+      3) 결과를 요청 단위로 잘라 각 future에 돌려준다.
+    한 요청이 max_batch보다 크면 쪼개지 않고 단독 배치로 처리한다.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        *,
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        name: str = "batch",
+    ):
+        self._fn = batch_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: Deque[Tuple[List[Any], asyncio.Future]] = deque()
+        self._pending = 0
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"batch-{name}")
+        # 통계 (모니터링/벤치마크용)
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        """아직 처리되지 않은(대기 중인) 아이템 수"""
+        return self._pending
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "depth": self._pending,
+        }
+
+    async def submit(self, items: Sequence[Any]) -> list:
+        items = list(items)
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        fut: asyncio.Future = loop.create_future()
+        self._queue.append((items, fut))
+        self._pending += len(items)
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        self._wakeup.set()
+        return await fut
+
+    async def _collect(self) -> List[Tuple[List[Any], asyncio.Future]]:
+        """대기 큐에서 max_wait 동안 모은 뒤 max_batch 한도 내에서 꺼낸다."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while self._pending < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        batch: List[Tuple[List[Any], asyncio.Future]] = []
+        n = 0
+        while self._queue and (not batch or n + len(self._queue[0][0]) <= self.max_batch):
+            items, fut = self._queue.popleft()
+            self._pending -= len(items)
+            if fut.done():  # 요청 쪽이 이미 취소됨 → 계산하지 않음
+                continue
+            batch.append((items, fut))
+            n += len(items)
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            batch = await self._collect()
+            if not batch:
+                continue
+            flat = [x for items, _ in batch for x in items]
+            t0 = time.perf_counter()
+            try:
+                out = await loop.run_in_executor(self._executor, self._fn, flat)
+            except Exception as e:
+                logging.warning(f"[batch:{self.name}] batch of {len(flat)} failed: {e!r}")
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - t0
+            self.batches += 1
+            self.items += len(flat)
+
+            i = 0
+            for items, fut in batch:
+                part = list(out[i:i + len(items)])
+                i += len(items)
+                if not fut.done():
+                    fut.set_result(part)
@@ -0,0 +1,170 @@
+# services/chat_memory.py
+# ------------------------------------------------------------
+# 스마트 Q&A 세션 대화 메모리 (토큰 상한이 있는 rolling 압축)
+# - chat_sessions.memory_turns   : 최근 턴 원문(질문/답변은 각각 토큰 상한으로 잘라 저장)
+# - chat_sessions.memory_summary : 그보다 오래된 대화의 누적 요약
+# - 최근 턴이 CHAT_MEMORY_COMPACT_AT 개를 넘으면 최근 CHAT_MEMORY_TURNS 개만 남기고 나머지를 요약에 접어 넣는다 (백그라운드)
+#   → 압축 LLM 호출이 매 턴 응답 지연에 들어가지 않고, 몇 턴에 한 번만 일어난다
+# - 메모리는 두 곳에 쓰인다
+#   1) 검색 질의 재작성: "두 번째 건?" 같은 후속 질문 → 독립적인 질문
+#   2) 답변 프롬프트의 'Conversation so far'
+# 렌더링 결과는 항상 CHAT_MEMORY_MAX_TOKENS 이내다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import weakref
+
+from pydantic import BaseModel, Field
+
+from models.chat_domain import ChatSessionTable
+from services.ai_service_global import llm_gateway
+from services.context_packer import count_tokens, trim_to_tokens
+from routers.auth import async_session
+
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "3"))                  # 압축 후 남길 최근 턴 수
+CHAT_MEMORY_COMPACT_AT = int(os.getenv("CHAT_MEMORY_COMPACT_AT", "6"))        # 최근 턴이 이보다 많으면 압축
+CHAT_MEMORY_MAX_TOKENS = int(os.getenv("CHAT_MEMORY_MAX_TOKENS", "800"))      # 렌더링된 메모리 상한
+CHAT_MEMORY_SUMMARY_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", "300"))
+CHAT_MEMORY_TURN_TOKENS = int(os.getenv("CHAT_MEMORY_TURN_TOKENS", "120"))    # 턴당 질문/답변 각각 상한
+CHAT_MEMORY_REWRITE_TIMEOUT_S = float(os.getenv("CHAT_MEMORY_REWRITE_TIMEOUT_S", "8"))
+
+# 세션별 read-modify-write 직렬화 (같은 워커 안에서 턴 추가와 압축이 겹치지 않게)
+_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+_compacting: set[int] = set()
+_tasks: set[asyncio.Task] = set()   # 백그라운드 압축 태스크 참조 유지
+
+
+def _lock(chat_session_id: int) -> asyncio.Lock:
+    lock = _locks.get(chat_session_id)
+    if lock is None:
+        lock = _locks[chat_session_id] = asyncio.Lock()
+    return lock
+
+
+def has_memory(sess: ChatSessionTable) -> bool:
+    return bool(sess.memory_summary or sess.memory_turns)
+
+
+def render_memory(sess: ChatSessionTable, max_tokens: int = CHAT_MEMORY_MAX_TOKENS) -> str:
+    """요약 + 최근 턴을 프롬프트용 텍스트로. 상한을 넘으면 오래된 턴부터 뺀다."""
+    summary = (sess.memory_summary or "").strip()
+    turns = [f"Q: {t.get('q', '')}\nA: {t.get('a', '')}" for t in (sess.memory_turns or [])]
+    head = f"(이전 대화 요약) {summary}" if summary else ""
+    while True:
+        text = "\n\n".join(p for p in [head, *turns] if p)
+        if count_tokens(text) <= max_tokens or not turns:
+            break
+        turns.pop(0)
+    return trim_to_tokens(text, max_tokens)
+
+
+# ---------- 1) 검색 질의 재작성 ----------
+class StandaloneQuestion(BaseModel):
+    question: str = Field(description="이전 대화 없이도 이해되는 독립적인 질문")
+
+
+async def contextualize_question(sess: ChatSessionTable, question: str, *, user_id=None) -> str:
+    """후속 질문을 이전 대화를 반영한 독립 질문으로 바꾼다. 메모리가 없거나 실패하면 원래 질문."""
+    if not has_memory(sess):
+        return question
+    prompt = f"""
+    아래 대화에 이어지는 마지막 질문을, 이전 대화를 보지 않아도 이해되는 하나의 검색용 질문으로 다시 쓰세요.
+    - 지시어("그거", "두 번째 것" 등)는 대화에 나온 구체적인 대상으로 바꾸세요.
+    - 이미 독립적인 질문이면 그대로 반환하세요. 답변은 하지 마세요.
+
+    대화:
+    {render_memory(sess)}
+
+    마지막 질문: {question}
+
+    JSON 형식으로만 답변하세요: {{ "question": "..." }}
+    """
+    try:
+        out: StandaloneQuestion = await llm_gateway.ainvoke(
+            prompt, schema=StandaloneQuestion, user_id=user_id,
+            timeout=CHAT_MEMORY_REWRITE_TIMEOUT_S, cache=True,
+        )
+    except Exception as e:
+        logging.warning(f"[chat-memory] rewrite failed, using original question: {e!r}")
+        return question
+    return (out.question or "").strip() or question
+
+
+# ---------- 2) 턴 추가 + 압축 ----------
+async def remember_turn(
+    chat_session_id: int, *, qa_turn_id: int, question: str, answer: str, user_id=None
+) -> None:
+    """
+    방금 저장한 턴을 세션 메모리에 추가한다 (자체 DB 세션 사용).
+    최근 턴이 많아지면 압축을 백그라운드로 띄운다.
+    """
+    async with _lock(chat_session_id):
+        async with async_session() as db:
+            sess = await db.get(ChatSessionTable, chat_session_id)
+            if sess is None:
+                return
+            turns = list(sess.memory_turns or [])
+            turns.append({
+                "qa_turn_id": qa_turn_id,
+                "q": trim_to_tokens(question, CHAT_MEMORY_TURN_TOKENS),
+                "a": trim_to_tokens(answer, CHAT_MEMORY_TURN_TOKENS),
+            })
+            sess.memory_turns = turns
+            await db.commit()
+            need_compact = len(turns) > CHAT_MEMORY_COMPACT_AT
+
+    if need_compact and chat_session_id not in _compacting:
+        _compacting.add(chat_session_id)
+        task = asyncio.create_task(_compact(chat_session_id, user_id=user_id))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        task.add_done_callback(lambda _t: _compacting.discard(chat_session_id))
+
+
+async def _compact(chat_session_id: int, *, user_id=None) -> None:
+    """오래된 턴들을 기존 요약에 접어 넣고, 최근 CHAT_MEMORY_TURNS 개만 남긴다."""
+    try:
+        async with async_session() as db:
+            sess = await db.get(ChatSessionTable, chat_session_id)
+            if sess is None:
+                return
+            turns = list(sess.memory_turns or [])
+            old, prev_summary = turns[:-CHAT_MEMORY_TURNS], sess.memory_summary or ""
+        if not old:
+            return
+
+        dialog = "\n\n".join(f"Q: {t['q']}\nA: {t['a']}" for t in old)
+        prompt = f"""
+        학습자와의 Q&A 대화 기록을 이후 질문 해석에 쓸 수 있게 요약하세요.
+        - 기존 요약과 새 대화를 합쳐 하나의 요약으로 작성
+        - 다룬 개념/대상 이름과 핵심 결론 위주, 한국어로 5문장 이내
+
+        기존 요약:
+        {prev_summary or "(없음)"}
+
+        새 대화:
+        {dialog}
+        """
+        summary = await llm_gateway.ainvoke(prompt, user_id=user_id)
+        summary = trim_to_tokens(summary.strip(), CHAT_MEMORY_SUMMARY_TOKENS)
+
+        folded = {t.get("qa_turn_id") for t in old}
+        async with _lock(chat_session_id):
+            async with async_session() as db:
+                sess = await db.get(ChatSessionTable, chat_session_id)
+                if sess is None:
+                    return
+                # 요약하는 동안 추가된 턴은 유지하고, 요약에 접힌 턴만 뺀다
+                sess.memory_turns = [t for t in (sess.memory_turns or []) if t.get("qa_turn_id") not in folded]
+                sess.memory_summary = summary
+                await db.commit()
+        logging.info(
+            f"[chat-memory] session={chat_session_id} folded={len(old)} "
+            f"summary_tokens={count_tokens(summary)}"
+        )
+    except Exception as e:
+        # 압축 실패는 다음 턴에서 다시 시도 (render_memory 가 상한은 계속 지킨다)
+        logging.warning(f"[chat-memory] compaction failed for session={chat_session_id}: {e!r}")
@@ -1,25 +1,27 @@
 # 설명: 스마트 Q&A 도메인 로직(벡터 검색 → 재정렬 → LLM 답변 생성 → [n] 인라인 인용 → ERD 저장용 citation 텍스트 구성)
 from __future__ import annotations
-from typing import List, Tuple
-import uuid, re
+from typing import AsyncIterator, List, Tuple
+import uuid, re, time, logging, json
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from fastapi import HTTPException
 
-from langchain_community.vectorstores import Chroma
-from sentence_transformers import CrossEncoder
-
 from models.chat_domain import ChatSessionTable, QATurnTable
 from models.vector_domain import VectorIndexTable
-from services.ai_service_global import _EMBEDDINGS, llm, question_prompt  # 이미 있는 공용 모듈
+from services.ai_service_global import get_embeddings, llm_gateway, question_prompt, chat_question_prompt  # 이미 있는 공용 모듈
+from services.rerank_policy import adaptive_rerank, choose_fetch_k
+from services.answer_cache import answer_cache
+from services.chroma_pool import chroma_pool
+from services.multi_query import multi_query_search
+from services.context_packer import CONTEXT_BUDGET_CHAT, pack_context
+from services.chat_memory import contextualize_question, has_memory, remember_turn, render_memory
+from services import metrics
+from routers.auth import async_session
 import asyncio # 추가
 from langchain.schema import Document  # 추가 
 
 
-# Colab 예제와 동일한 재정렬 모델(빠르고 가벼움)
-_reranker = CrossEncoder("BAAI/bge-reranker-base")
-
 async def _get_vector_index(session: AsyncSession, user_id: uuid.UUID, subject_id: int) -> VectorIndexTable:
     """user+subject 에 해당하는 인덱스 1행을 가져온다(없으면 404)."""
     q = await session.execute(
@@ -34,28 +36,6 @@ async def _get_vector_index(session: AsyncSession, user_id: uuid.UUID, subject_i
         raise HTTPException(404, "No vector index for this subject. Upload materials first.")
     return row
 
-def _load_chroma(index_row: VectorIndexTable) -> Chroma:
-    """
-    RDB에 저장된 컬렉션 식별자(이름/경로)로 Chroma를 로드한다.
-    실제 임베딩/검색은 디스크의 persist_dir에서 일어난다.
-    """
-    vectordb = Chroma(
-        collection_name=index_row.collection_name,
-        persist_directory=index_row.persist_dir,
-        embedding_function=_EMBEDDINGS,
-    )
-        # 🔎 디버깅: 컬렉션 문서 수를 확인
-    try:
-        count = vectordb._collection.count()
-        if not count:
-            # 여기서 바로 예외를 내주면 프론트가 원인 파악 쉬움
-            raise HTTPException(409, "Vector index is empty. Re-run indexing for this subject.")
-    except Exception:
-        # 일부 버전에서 _collection 접근이 달라질 수 있음 → 검색으로도 체크
-        pass
-    return vectordb
-
-
 # ---------- helpers: Colab의 label & citation 추출을 서버용으로 그대로 ----------
 def _format_source(doc: Document) -> str:
     src = doc.metadata.get("source", "Unknown")
@@ -85,62 +65,285 @@ def _filter_used_sources_list(answer_text: str, idx2src: dict[str, str]) -> list
     return [f"[{n}] {idx2src[n]}" for n in nums if n in idx2src]
 
 
-# ---------- 핵심: Colab QA 스텝만 수행 ----------
-async def ask_and_store(
-    db: AsyncSession,
-    *, user_id: uuid.UUID, chat_session_id: int, subject_id: int, question: str
-) -> QATurnTable:
+# ---------- 단계별 헬퍼 (일반 응답 / 스트리밍 응답 공용) ----------
+async def _embed_question(question: str) -> List[float]:
+    """질문 임베딩 1회 계산 (의미 캐시 조회 + 벡터 검색에 같이 사용)"""
+    return await asyncio.to_thread(lambda: get_embeddings().embed_query(question))   # 모델 지연 로드도 스레드에서
+
+async def _retrieve_context(
+    vindex: VectorIndexTable, question: str, query_vec: List[float],
+    *, multi_query: bool = False, user_id: uuid.UUID | None = None,
+) -> tuple[str, dict, list[str]]:
     """
-    1) user+subject 인덱스 로드 → vectordb 검색(k=8)
-    2) reranker로 상위 5개 정렬
-    3) 컨텍스트에 [n] 붙여 question_prompt로 LLM 호출
-    4) 답변 + citations JSON을 qa_turns에 저장 후 반환
+    점수 포함 검색 → 적응형 재정렬 → 중복 제거/토큰 예산 패킹(재정렬 순서 유지) → [n] 라벨 컨텍스트
+    multi_query=True 면 하위 질의로 나눠 동시 검색 후 RRF 로 합친 후보를 재정렬한다.
+    반환: (labeled_ctx, idx2src, sub_queries)
     """
-    # 0) 인덱스/Chroma 로드
-    vindex = await _get_vector_index(db, user_id, subject_id)
-    vectordb = _load_chroma(vindex)
-
-    # 1) retrieval (Colab: retriever.get_relevant_documents)
-    retriever = vectordb.as_retriever(search_kwargs={"k": 8})
-    # retriever.get_relevant_documents 는 sync → 스레드로 돌려 비동기화
-    loop = asyncio.get_running_loop()
-    docs: List[Document] = await loop.run_in_executor(
-        None, retriever.get_relevant_documents, question
+    vectordb = await chroma_pool.get(vindex)   # 컬렉션 오픈(임베딩 모델 로드 포함)은 스레드에서, 핸들은 재사용
+
+    # 1) retrieval – 재정렬 정책이 dense 점수 간격을 보므로 점수와 함께 검색
+    #    (질문 임베딩은 이미 계산했으므로 벡터로 검색, 거리 → relevance 점수 변환)
+    sub_queries: list[str] = []
+    if multi_query:
+        scored, sub_queries = await multi_query_search(
+            vectordb, question, query_vec, choose_fetch_k(), user_id=user_id
+        )
+    else:
+        def _search() -> List[Tuple[Document, float]]:
+            relevance = vectordb._select_relevance_score_fn()
+            hits = vectordb.similarity_search_by_vector_with_relevance_scores(query_vec, k=choose_fetch_k())
+            return [(d, relevance(dist)) for d, dist in hits]
+        scored = await asyncio.to_thread(_search)
+
+    # 2) rerank (Colab : CrossEncoder.predict) – 정책에 따라 생략/부분/전체 재정렬 (배치 큐 경유)
+    reranked = await adaptive_rerank(question, scored, top_n=5)
+
+    # 3) 중복 청크 제거 + 토큰 예산 적용
+    #    (재정렬 순위를 그대로 유지 – dense 유사도로 다시 섞으면 예산에서 잘리는 청크와 [1] 인용이 재정렬과 달라짐)
+    packed = await pack_context(
+        vectordb, reranked, query_vec=None, lambda_mult=1.0, budget=CONTEXT_BUDGET_CHAT, label="chat"
     )
-    
-    # 2) rerank (Colab : CrossEncoder.predict)
-    pairs = [[question, d.page_content] for d in docs]
-    scores = await loop.run_in_executor(None, _reranker.predict, pairs)
-    reranked = [d for d, _ in sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)[:5]]
-
-    # 3) 컨텍스트에 [n] 라벨 부여 (Colab과 동일)
-    labeled_ctx, _all_docs, idx2src = _label_and_map_documents_multi([reranked])
-    
-    # 4) LLM 호출 (Colab 동일 프롬포트)
-    prompt = question_prompt.format(context=labeled_ctx, question=question)
-    resp = llm.invoke(prompt)  # langchain-google-genai ChatGoogleGenerativeAI
-    answer = (getattr(resp, "content", None) or str(resp)).strip()
 
-    answer = (getattr(resp, "content", None) or str(resp)).strip()
-    
-    # 5) 답변 속 [n] → 인용 텍스트 매핑 (Colab 동일)
-    used_citations = _filter_used_sources_list(answer, idx2src)  # ["[1] 소스...", "[2] ..."]
+    # 4) 컨텍스트에 [n] 라벨 부여 (Colab과 동일)
+    labeled_ctx, _all_docs, idx2src = _label_and_map_documents_multi([packed.docs])
+    return labeled_ctx, idx2src, sub_queries
 
+def _finalize_answer(answer: str, idx2src: dict[str, str]) -> tuple[str, list[str]]:
+    """답변 속 [n] → 인용 텍스트 매핑 (Colab 동일). 인용이 없으면 [1]을 붙인다."""
+    used_citations = _filter_used_sources_list(answer, idx2src)  # ["[1] 소스...", "[2] ..."]
     if not used_citations and idx2src:
-        used = [f"[1] {idx2src['1']}"]
+        used_citations = [f"[1] {idx2src['1']}"]
         answer = answer + " [1]"
+    return answer, used_citations
 
-    # 6) 저장
+def _answer_prompt(history: str, labeled_ctx: str, question: str) -> str:
+    """대화 메모리가 있으면 'Conversation so far' 를 포함한 프롬프트, 없으면 기존 프롬프트."""
+    if history:
+        return chat_question_prompt.format(history=history, context=labeled_ctx, question=question)
+    return question_prompt.format(context=labeled_ctx, question=question)
+
+def _has_answer(answer: str) -> bool:
+    return answer.lower() != "no answer"
+
+async def _store_turn(
+    db: AsyncSession, *, user_id: uuid.UUID, chat_session_id: int,
+    question: str, answer: str, citations: list[str], has_answer: bool | None = None,
+) -> QATurnTable:
     turn = QATurnTable(
         chat_session_id=chat_session_id,
         user_id=user_id,
         question=question,
         answer=answer,
-        has_answer=(answer.lower() != "no answer"),
-        citations=used_citations,
+        has_answer=_has_answer(answer) if has_answer is None else has_answer,
+        citations=citations,
     )
     db.add(turn)
     await db.flush()    # qa_turn_id 부여
     await db.commit()
     await db.refresh(turn)
     return turn
+
+
+# ---------- 핵심: Colab QA 스텝만 수행 ----------
+async def ask_and_store(
+    db: AsyncSession,
+    *, user_id: uuid.UUID, chat_session_id: int, subject_id: int, question: str,
+    multi_query: bool = False,
+) -> tuple[QATurnTable, bool]:
+    """
+    0) 세션 대화 메모리가 있으면 후속 질문을 독립 질문(검색 질의)으로 재작성
+    1) 검색 질의 임베딩 → 의미 캐시(같은 인덱스 버전의 비슷한 질문) 조회, 적중 시 바로 저장/반환
+       (대화 메모리가 있는 세션은 캐시 조회/저장을 하지 않음)
+    2) user+subject 인덱스 로드 → vectordb 검색(k=8, 저부하 시 더 넓게)
+       (multi_query=True 면 하위 질의 2~4개 동시 검색 + RRF 병합)
+    3) 적응형 재정렬 정책으로 상위 5개 정렬
+    4) 컨텍스트에 [n] 붙여 question_prompt로 LLM 호출 (메모리가 있으면 대화 요약/최근 턴 포함)
+    5) 답변 + citations JSON을 qa_turns에 저장, 세션 메모리에 턴 추가 후 반환
+    반환: (turn, cached)
+    """
+    vindex = await _get_vector_index(db, user_id, subject_id)
+    sess = await db.get(ChatSessionTable, chat_session_id)
+    history = render_memory(sess) if sess is not None and has_memory(sess) else ""
+    search_q = await contextualize_question(sess, question, user_id=user_id) if history else question
+    query_vec = await _embed_question(search_q)
+
+    # 대화 메모리가 있는 세션의 답변은 그 세션의 대화 맥락에 묶여 있으므로 의미 캐시를 쓰지 않는다
+    # (다른 세션의 답변/인용이 섞이지 않게 – 조회도 저장도 메모리 없는 질문만)
+    use_cache = not history
+    hit = answer_cache.lookup(vindex, query_vec) if use_cache else None
+    if hit is not None:
+        metrics.inc("chat.answer_cache.hit")
+        turn = await _store_turn(
+            db, user_id=user_id, chat_session_id=chat_session_id,
+            question=question, answer=hit.answer, citations=hit.citations,
+        )
+        await remember_turn(
+            chat_session_id, qa_turn_id=turn.qa_turn_id, question=question, answer=hit.answer, user_id=user_id
+        )
+        return turn, True
+    if use_cache:
+        metrics.inc("chat.answer_cache.miss")
+
+    labeled_ctx, idx2src, _subs = await _retrieve_context(
+        vindex, search_q, query_vec, multi_query=multi_query, user_id=user_id
+    )
+
+    # 4) LLM 호출 (Colab 동일 프롬포트)
+    prompt = _answer_prompt(history, labeled_ctx, question)
+    answer = (await llm_gateway.ainvoke(prompt, user_id=user_id)).strip()
+
+    # 5) 답변 속 [n] → 인용 텍스트 매핑
+    answer, used_citations = _finalize_answer(answer, idx2src)
+    if use_cache and _has_answer(answer):
+        # 이 턴의 [n] 라벨(idx2src)로 만든 인용을 답변과 함께 저장 → 적중 시 답변 속 [n] 과 인용이 일치
+        answer_cache.store(vindex, query_vec, search_q, answer, used_citations)
+
+    # 6) 저장
+    turn = await _store_turn(
+        db, user_id=user_id, chat_session_id=chat_session_id,
+        question=question, answer=answer, citations=used_citations,
+    )
+    await remember_turn(
+        chat_session_id, qa_turn_id=turn.qa_turn_id, question=question, answer=answer, user_id=user_id
+    )
+    return turn, False
+
+
+# ---------- 스트리밍(SSE) 버전 ----------
+async def ask_stream(
+    *, user_id: uuid.UUID, chat_session_id: int, subject_id: int, question: str,
+    multi_query: bool = False,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    (event, data) 를 생성하는 async generator. 라우터가 SSE로 변환한다.
+      retrieval : 검색/재정렬 완료 (retrieval_ms, cached, multi_query 모드면 sub_queries)
+      citations : [n] 라벨별 후보 출처 (답변 토큰의 [n]을 바로 표시할 수 있게)
+      token     : 답변 토큰 조각 (의미 캐시 적중 시 전체 답변 1개)
+      done      : 저장된 qa_turn_id, 최종 답변/인용, cached, ttft_ms, total_ms
+    클라이언트가 끊으면(취소) 그때까지 받은 답변으로 qa_turns 행을 저장한다 (대화 메모리에는 넣지 않음).
+    응답 본문이 흐르는 동안 요청 의존성 세션이 정리될 수 있으므로 DB는 자체 세션으로 접근한다.
+    """
+    t0 = time.perf_counter()
+    async with async_session() as db:
+        vindex = await _get_vector_index(db, user_id, subject_id)
+        sess = await db.get(ChatSessionTable, chat_session_id)
+        history = render_memory(sess) if sess is not None and has_memory(sess) else ""
+        search_q = await contextualize_question(sess, question, user_id=user_id) if history else question
+        query_vec = await _embed_question(search_q)
+
+        use_cache = not history   # 메모리가 있는 세션은 캐시 조회/저장 생략 (ask_and_store 참고)
+        hit = answer_cache.lookup(vindex, query_vec) if use_cache else None
+        if hit is not None:
+            metrics.inc("chat.answer_cache.hit")
+            turn = await _store_turn(
+                db, user_id=user_id, chat_session_id=chat_session_id,
+                question=question, answer=hit.answer, citations=hit.citations,
+            )
+            await remember_turn(
+                chat_session_id, qa_turn_id=turn.qa_turn_id, question=question, answer=hit.answer,
+                user_id=user_id,
+            )
+            elapsed = round((time.perf_counter() - t0) * 1000, 1)
+            yield "retrieval", {"retrieval_ms": elapsed, "contexts": 0, "cached": True}
+            yield "citations", {"candidates": hit.citations}
+            yield "token", {"text": hit.answer}
+            yield "done", {
+                "qa_turn_id": turn.qa_turn_id, "answer": hit.answer, "citations": hit.citations,
+                "cached": True, "ttft_ms": elapsed, "total_ms": elapsed,
+            }
+            return
+        if use_cache:
+            metrics.inc("chat.answer_cache.miss")
+
+    labeled_ctx, idx2src, sub_queries = await _retrieve_context(
+        vindex, search_q, query_vec, multi_query=multi_query, user_id=user_id
+    )
+    retrieval_ms = (time.perf_counter() - t0) * 1000
+    yield "retrieval", {
+        "retrieval_ms": round(retrieval_ms, 1), "contexts": len(idx2src), "cached": False,
+        "sub_queries": sub_queries,
+    }
+    yield "citations", {"candidates": [f"[{n}] {src}" for n, src in idx2src.items()]}
+
+    prompt = _answer_prompt(history, labeled_ctx, question)
+    parts: list[str] = []
+    ttft_ms: float | None = None
+    completed = False
+    try:
+        async for text in llm_gateway.astream(prompt, user_id=user_id):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000
+            parts.append(text)
+            yield "token", {"text": text}
+        completed = True
+    finally:
+        answer = "".join(parts).strip()
+        if completed:
+            answer, citations = _finalize_answer(answer, idx2src)
+            has_answer = None
+            if use_cache and _has_answer(answer):
+                answer_cache.store(vindex, query_vec, search_q, answer, citations)
+        else:
+            # 취소: 받은 만큼만 저장 (인용 보정 없이)
+            citations = _filter_used_sources_list(answer, idx2src)
+            has_answer = False
+
+        async def _persist() -> QATurnTable:
+            async with async_session() as s:
+                stored = await _store_turn(
+                    s, user_id=user_id, chat_session_id=chat_session_id,
+                    question=question, answer=answer, citations=citations, has_answer=has_answer,
+                )
+            if completed:
+                await remember_turn(
+                    chat_session_id, qa_turn_id=stored.qa_turn_id, question=question, answer=answer,
+                    user_id=user_id,
+                )
+            return stored
+        # 취소 중이라도 저장은 끝까지 진행되도록 shield
+        persist_task = asyncio.ensure_future(_persist())
+        turn = await asyncio.shield(persist_task)
+
+        total_ms = (time.perf_counter() - t0) * 1000
+        if ttft_ms is not None:
+            metrics.observe("chat.stream.ttft_ms", ttft_ms)
+        metrics.observe("chat.stream.total_ms", total_ms)
+        logging.info(
+            f"[chat-stream] session={chat_session_id} completed={completed} "
+            f"retrieval_ms={retrieval_ms:.1f} ttft_ms={(ttft_ms or -1):.1f} total_ms={total_ms:.1f}"
+        )
+
+    yield "done", {
+        "qa_turn_id": turn.qa_turn_id,
+        "answer": answer,
+        "citations": citations,
+        "cached": False,
+        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "total_ms": round(total_ms, 1),
+    }
+
+
+# ---------- 대화기록 내보내기 (NDJSON) ----------
+EXPORT_YIELD_PER = 200
+
+async def export_turns_ndjson(chat_session_id: int) -> AsyncIterator[bytes]:
+    """
+    세션의 모든 턴을 오래된 순으로 한 줄씩 JSON 으로 내보낸다.
+    db.stream() 서버 측 커서로 EXPORT_YIELD_PER 행씩 가져오므로 전체 목록을 메모리에 올리지 않는다.
+    (응답 본문이 흐르는 동안 쓸 자체 DB 세션 사용)
+    """
+    async with async_session() as db:
+        result = await db.stream(
+            select(
+                QATurnTable.qa_turn_id, QATurnTable.question, QATurnTable.answer,
+                QATurnTable.has_answer, QATurnTable.citations, QATurnTable.created_at,
+            )
+            .where(QATurnTable.chat_session_id == chat_session_id)
+            .order_by(QATurnTable.qa_turn_id.asc())
+            .execution_options(yield_per=EXPORT_YIELD_PER)
+        )
+        async for r in result.mappings():
+            row = dict(r)
+            row["citations"] = row["citations"] or []
+            row["created_at"] = row["created_at"].isoformat() if row["created_at"] else None
+            yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
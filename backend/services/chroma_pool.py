@@ -0,0 +1,73 @@
+# services/chroma_pool.py
+# ------------------------------------------------------------
+# Chroma 컬렉션 핸들 풀 (LRU, 상한 CHROMA_HANDLE_CAP)
+# - 컬렉션은 처음 필요할 때 스레드에서 연다 (콜드 컬렉션 지연 오픈)
+# - 같은 컬렉션을 동시에 여는 요청은 하나의 오픈을 함께 기다린다
+# - 상한을 넘으면 가장 오래 안 쓴 핸들부터 풀에서 뺀다
+# 주의: chromadb 는 persist 경로별 System 을 프로세스 전역으로 캐시한다(다른 서비스도 공유).
+#       그래서 풀에서 빠진 핸들의 System 을 여기서 강제로 stop 하지는 않는다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from langchain_community.vectorstores import Chroma
+
+from services import metrics
+from services.ai_service_global import get_embeddings
+
+CHROMA_HANDLE_CAP = int(os.getenv("CHROMA_HANDLE_CAP", "32"))
+
+Key = Tuple[str, str]
+
+
+class ChromaPool:
+    def __init__(self, cap: int = CHROMA_HANDLE_CAP):
+        self.cap = max(1, cap)
+        self._handles: "OrderedDict[Key, Chroma]" = OrderedDict()
+        self._opening: Dict[Key, asyncio.Future] = {}
+
+    @staticmethod
+    def _key(index_row) -> Key:
+        return index_row.collection_name, index_row.persist_dir
+
+    @staticmethod
+    def _open(collection_name: str, persist_dir: str) -> Chroma:
+        return Chroma(
+            collection_name=collection_name,
+            persist_directory=persist_dir,
+            embedding_function=get_embeddings(),
+        )
+
+    async def get(self, index_row) -> Chroma:
+        key = self._key(index_row)
+        handle = self._handles.get(key)
+        if handle is not None:
+            self._handles.move_to_end(key)
+            metrics.inc("chroma_pool.hit")
+            return handle
+
+        fut = self._opening.get(key)
+        if fut is None:
+            metrics.inc("chroma_pool.open")
+            fut = asyncio.ensure_future(asyncio.to_thread(self._open, *key))
+            self._opening[key] = fut
+            try:
+                handle = await asyncio.shield(fut)
+            finally:
+                self._opening.pop(key, None)
+            self._handles[key] = handle
+            while len(self._handles) > self.cap:
+                self._handles.popitem(last=False)
+                metrics.inc("chroma_pool.evict")
+            return handle
+        return await asyncio.shield(fut)
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+
+chroma_pool = ChromaPool()
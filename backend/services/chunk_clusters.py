@@ -0,0 +1,185 @@
+# services/chunk_clusters.py
+# ------------------------------------------------------------
+# 과목 청크 군집화 (다양성 있는 컨텍스트 선택용)
+# - "전체 시험 대비 요약" 같은 포괄적 주제로 top-k 검색하면 같은 단원의 청크만 반복해서 뽑힌다.
+# - 과목 컬렉션에 저장된 청크 임베딩(Chroma 저장값, 재계산 없음)을 구면 k-means(numpy 행렬 연산)로 묶고
+#   군집마다 중심에 가까운 순서로 대표 청크를 정해 둔다.
+# - 결과는 (vector_index_id, index_version) 별로 프로세스 메모리에 캐시
+#   → 자료가 바뀌기 전까지 요약/퀴즈 요청이 같은 군집을 재사용 (동시에 온 요청은 계산 1회를 함께 기다림)
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from services import metrics
+from services.context_packer import count_tokens
+
+CLUSTER_MAX_K = int(os.getenv("CLUSTER_MAX_K", "12"))              # 군집 수 상한 (기본 k = sqrt(n/2))
+CLUSTER_ITERS = int(os.getenv("CLUSTER_ITERS", "25"))
+CLUSTER_CACHE_CAP = int(os.getenv("CLUSTER_CACHE_CAP", "16"))      # 캐시할 과목(인덱스 버전) 수
+
+Key = Tuple[int, int]
+
+
+@dataclass
+class ChunkClusters:
+    documents: List[str]
+    metadatas: List[dict]
+    labels: np.ndarray                 # 청크별 군집 번호
+    members: List[List[int]]           # 군집별 청크 인덱스 (중심에 가까운 순, 큰 군집부터)
+
+    @property
+    def k(self) -> int:
+        return len(self.members)
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(n > 0, n, 1.0)
+
+
+def default_k(n: int) -> int:
+    return max(1, min(CLUSTER_MAX_K, n, round(math.sqrt(n / 2))))
+
+
+def kmeans(x: np.ndarray, k: int, *, iters: int = CLUSTER_ITERS, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    구면 k-means (코사인 유사도). x 는 (n, d) 단위 벡터.
+    k-means++ 초기화 → 배정(argmax x@c.T) / 중심 갱신(군집 평균 후 정규화)을 행렬 연산으로 반복.
+    빈 군집은 현재 중심과 가장 먼 점으로 다시 시작한다. 반환: (labels, centroids)
+    """
+    n = len(x)
+    rng = np.random.default_rng(seed)
+    centers = [int(rng.integers(n))]
+    closest = 1.0 - x @ x[centers[0]]
+    for _ in range(1, k):
+        p = np.clip(closest, 0, None) ** 2
+        nxt = int(rng.choice(n, p=p / p.sum())) if p.sum() > 0 else int(rng.integers(n))
+        centers.append(nxt)
+        closest = np.minimum(closest, 1.0 - x @ x[nxt])
+    c = x[centers].copy()
+
+    labels = np.full(n, -1)
+    for _ in range(iters):
+        sims = x @ c.T
+        new = sims.argmax(axis=1)
+        if np.array_equal(new, labels):
+            break
+        labels = new
+        one_hot = np.zeros((n, k), dtype=x.dtype)
+        one_hot[np.arange(n), labels] = 1.0
+        sums = one_hot.T @ x
+        counts = one_hot.sum(axis=0)
+        for j in np.flatnonzero(counts == 0):
+            far = int(sims.max(axis=1).argmin())
+            sums[j], counts[j] = x[far], 1.0
+            labels[far] = j
+        c = _unit(sums / counts[:, None])
+    return labels, c
+
+
+def build_clusters(
+    documents: Sequence[str], metadatas: Sequence[dict], embeddings: np.ndarray, k: Optional[int] = None,
+) -> ChunkClusters:
+    """저장된 임베딩으로 군집 + 군집별 대표 순서 계산 (순수 함수)."""
+    x = _unit(np.asarray(embeddings, dtype=np.float32))
+    k = k or default_k(len(x))
+    labels, centroids = kmeans(x, k)
+    closeness = (x * centroids[labels]).sum(axis=1)
+    members = [np.flatnonzero(labels == j) for j in range(k)]
+    members = [m[np.argsort(-closeness[m])].tolist() for m in members if len(m)]
+    members.sort(key=len, reverse=True)
+    return ChunkClusters(list(documents), [md or {} for md in metadatas], labels, members)
+
+
+def diverse_documents(
+    clusters: ChunkClusters, *, budget: int, doc_ids: Optional[Sequence[int]] = None,
+) -> List[Document]:
+    """
+    군집을 돌아가며(큰 군집부터) 대표 청크를 하나씩 뽑아 토큰 예산까지 채운다.
+    → 같은 예산으로 과목 전체 영역을 덮는 컨텍스트. 결과는 (document_id, page) 순으로 정렬.
+    """
+    allowed = set(doc_ids) if doc_ids else None
+    queues = [
+        [i for i in m if allowed is None or clusters.metadatas[i].get("document_id") in allowed]
+        for m in clusters.members
+    ]
+    picked: List[int] = []
+    used = 0
+    depth = 0
+    while any(depth < len(q) for q in queues):
+        for q in queues:
+            if depth >= len(q):
+                continue
+            i = q[depth]
+            t = count_tokens(clusters.documents[i] or "")
+            if used + t <= budget:
+                picked.append(i)
+                used += t
+        depth += 1
+        if used >= budget:
+            break
+    picked.sort(key=lambda i: (clusters.metadatas[i].get("document_id") or 0, clusters.metadatas[i].get("page") or 0))
+    return [Document(page_content=clusters.documents[i], metadata=dict(clusters.metadatas[i])) for i in picked]
+
+
+def _compute(vectordb) -> Optional[ChunkClusters]:
+    data = vectordb._collection.get(include=["documents", "metadatas", "embeddings"])
+    embs = data.get("embeddings")
+    if embs is None or not len(embs):
+        return None
+    return build_clusters(data.get("documents") or [], data.get("metadatas") or [], np.asarray(embs))
+
+
+class ClusterCache:
+    """(vector_index_id, index_version) → ChunkClusters LRU (같은 키 동시 계산은 1회)."""
+
+    def __init__(self, cap: int = CLUSTER_CACHE_CAP):
+        self.cap = max(1, cap)
+        self._items: "OrderedDict[Key, Optional[ChunkClusters]]" = OrderedDict()
+        self._computing: Dict[Key, asyncio.Future] = {}
+
+    async def get(self, vindex, vectordb) -> Optional[ChunkClusters]:
+        key = (vindex.vector_index_id, vindex.index_version or 0)
+        if key in self._items:
+            self._items.move_to_end(key)
+            metrics.inc("clusters.cache.hit")
+            return self._items[key]
+
+        fut = self._computing.get(key)
+        if fut is None:
+            metrics.inc("clusters.cache.miss")
+            t0 = time.perf_counter()
+            fut = asyncio.ensure_future(asyncio.to_thread(_compute, vectordb))
+            self._computing[key] = fut
+            try:
+                clusters = await asyncio.shield(fut)
+            finally:
+                self._computing.pop(key, None)
+            # 같은 인덱스의 이전 버전은 더 이상 쓰이지 않으므로 정리
+            for old in [k for k in self._items if k[0] == key[0]]:
+                self._items.pop(old)
+            self._items[key] = clusters
+            while len(self._items) > self.cap:
+                self._items.popitem(last=False)
+            took_ms = (time.perf_counter() - t0) * 1000
+            metrics.observe("clusters.build_ms", took_ms)
+            logging.info(
+                f"[clusters] index={key[0]} v{key[1]} chunks={len(clusters.documents) if clusters else 0} "
+                f"k={clusters.k if clusters else 0} took_ms={took_ms:.1f}"
+            )
+            return clusters
+        return await asyncio.shield(fut)
+
+
+cluster_cache = ClusterCache()
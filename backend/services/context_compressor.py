@@ -0,0 +1,181 @@
+# services/context_compressor.py
+# ------------------------------------------------------------
+# 요약용 추출식 컨텍스트 압축 (LLM 호출 전)
+# - 검색/패킹된 청크를 문장으로 나누고(kss, 없으면 정규식), 주제(topic) 임베딩과의 코사인 유사도
+#   + 중심성(문장 평균 벡터와의 유사도)으로 점수화
+#   (문장 임베딩은 한 번의 배치 호출, 점수/중복 계산은 numpy 행렬 연산)
+# - 점수 높은 문장부터 토큰 예산까지 고르되 거의 같은 문장은 건너뛰고,
+#   고른 문장은 원래 순서(청크 순서 → 문장 순서)로 다시 이어 붙인다
+# - 효과 측정: scripts/eval_compression.py
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain.schema import Document
+
+from services import metrics
+from services.ai_service_global import get_embeddings
+from services.context_packer import CONTEXT_DEDUP_SIM, count_tokens
+
+SUMMARY_COMPRESS = os.getenv("SUMMARY_COMPRESS", "1") != "0"
+SUMMARY_COMPRESS_TOKENS = int(os.getenv("SUMMARY_COMPRESS_TOKENS", "1800"))    # 압축 후 컨텍스트 토큰 상한
+COMPRESS_MIN_SENT_CHARS = int(os.getenv("COMPRESS_MIN_SENT_CHARS", "6"))       # 이보다 짧은 조각은 버림
+# 문장 점수 = w*주제 유사도 + (1-w)*중심성(전체 문장 평균 벡터와의 유사도)
+# ("전체 시험 대비 요약" 같은 포괄적 주제에서도 잡담/안내 문장은 중심에서 멀어 걸러진다)
+COMPRESS_TOPIC_WEIGHT = float(os.getenv("COMPRESS_TOPIC_WEIGHT", "0.7"))
+
+_REGEX_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n+")
+_kss_split = None
+
+
+def _splitter():
+    """kss.split_sentences (없거나 실패하면 정규식 분리로 대체)."""
+    global _kss_split
+    if _kss_split is None:
+        try:
+            import kss
+            _kss_split = kss.split_sentences
+        except Exception as e:   # 미설치/초기화 실패
+            logging.warning(f"[compress] kss unavailable, using regex sentence split: {e!r}")
+            _kss_split = lambda text: _REGEX_SPLIT.split(text)   # noqa: E731
+    return _kss_split
+
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    for line in (text or "").splitlines():
+        if not line.strip():
+            continue
+        for s in _splitter()(line):
+            s = s.strip()
+            if len(s) >= COMPRESS_MIN_SENT_CHARS:
+                out.append(s)
+    return out
+
+
+@dataclass
+class CompressedContext:
+    docs: List[Document]
+    tokens_before: int
+    tokens_after: int
+    sentences_in: int
+    sentences_kept: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(n > 0, n, 1.0)
+
+
+def select_sentences(
+    sent_vecs: np.ndarray,
+    query_vec: Sequence[float],
+    tokens: Sequence[int],
+    *,
+    budget: int,
+    dedup_sim: float = CONTEXT_DEDUP_SIM,
+    topic_weight: float = COMPRESS_TOPIC_WEIGHT,
+) -> List[int]:
+    """
+    점수(주제 유사도 + 중심성) 내림차순으로 예산까지 문장 선택 (거의 같은 문장은 건너뜀).
+    반환: 선택된 문장 인덱스 (원래 순서로 정렬)
+    """
+    if not len(tokens):
+        return []
+    s = _unit(np.asarray(sent_vecs, dtype=np.float32))
+    q = _unit(np.asarray(query_vec, dtype=np.float32))
+    centroid = _unit(s.mean(axis=0))
+    scores = topic_weight * (s @ q) + (1 - topic_weight) * (s @ centroid)
+    sim = s @ s.T
+
+    chosen: List[int] = []
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if used + tokens[i] > budget:
+            continue
+        if chosen and float(sim[i, chosen].max()) >= dedup_sim:
+            continue
+        chosen.append(int(i))
+        used += tokens[i]
+    return sorted(chosen)
+
+
+def compress_documents(
+    docs: Sequence[Document],
+    sent_vecs: np.ndarray,
+    query_vec: Sequence[float],
+    sentences: Sequence[Sequence[str]],
+    *,
+    budget: int,
+) -> CompressedContext:
+    """문장 임베딩이 준비된 상태에서 선택만 계산 (순수 함수 – 평가 스크립트에서도 사용)."""
+    flat = [(d, s) for d, sents in enumerate(sentences) for s in sents]
+    tokens = [count_tokens(s) for _, s in flat]
+    before = sum(count_tokens(d.page_content) for d in docs)
+    keep = set(select_sentences(sent_vecs, query_vec, tokens, budget=budget))
+
+    kept: List[List[str]] = [[] for _ in docs]
+    for j in sorted(keep):
+        kept[flat[j][0]].append(flat[j][1])
+    out = [
+        Document(page_content=" ".join(k), metadata=dict(doc.metadata or {}))
+        for doc, k in zip(docs, kept) if k
+    ]
+    after = sum(tokens[j] for j in keep)
+    return CompressedContext(out, before, after, len(flat), len(keep))
+
+
+def compress_sync(docs: Sequence[Document], query: str, budget: int) -> Optional[CompressedContext]:
+    sentences = [split_sentences(d.page_content) for d in docs]
+    flat = [s for sents in sentences for s in sents]
+    if not flat:
+        return None
+    # 주제 + 문장을 한 번의 배치로 임베딩
+    vecs = np.asarray(get_embeddings().embed_documents([query] + flat), dtype=np.float32)
+    return compress_documents(docs, vecs[1:], vecs[0], sentences, budget=budget)
+
+
+async def compress_context(
+    docs: Sequence[Document],
+    *,
+    query: str,
+    budget: int = SUMMARY_COMPRESS_TOKENS,
+    label: str = "summary",
+) -> List[Document]:
+    """
+    주제와 관련 높은 문장만 남긴 문서 목록. 이미 예산 안이면 그대로 반환.
+    (임베딩/계산은 스레드에서, 실패하면 원본을 그대로 쓴다)
+    """
+    docs = list(docs)
+    if not docs or sum(count_tokens(d.page_content) for d in docs) <= budget:
+        return docs
+    t0 = time.perf_counter()
+    try:
+        packed = await asyncio.to_thread(compress_sync, docs, query, budget)
+    except Exception as e:
+        logging.warning(f"[compress] failed, using uncompressed context: {e!r}")
+        return docs
+    if packed is None or not packed.docs:
+        return docs
+
+    metrics.inc(f"context.compress.tokens_in.{label}", packed.tokens_before)
+    metrics.inc(f"context.compress.tokens_saved.{label}", packed.tokens_saved)
+    took_ms = (time.perf_counter() - t0) * 1000
+    metrics.observe(f"context.compress.latency_ms.{label}", took_ms)
+    logging.info(
+        f"[compress] label={label} sentences={packed.sentences_kept}/{packed.sentences_in} "
+        f"tokens={packed.tokens_after}/{packed.tokens_before} saved={packed.tokens_saved} took_ms={took_ms:.1f}"
+    )
+    return packed.docs
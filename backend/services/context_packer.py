@@ -0,0 +1,251 @@
+# services/context_packer.py
+# ------------------------------------------------------------
+# RAG 프롬프트 컨텍스트 패킹 (chat / summary / quiz 공용)
+# - MMR(Maximal Marginal Relevance)로 내용이 거의 같은 청크를 걸러내고 다양한 순서로 재배열
+#   (청크 임베딩은 새로 계산하지 않고 Chroma 에 저장된 값을 꺼내 쓴다)
+# - tiktoken 으로 토큰 수를 세어 예산(budget)까지만 담는다. 마지막 청크는 문장 경계에서 자른다
+# - 요청마다 줄인 토큰 수를 [context-pack] 로그와 context.tokens_saved.* 메트릭으로 남긴다
+# 토큰 수는 cl100k_base 기준 근사치다 (Gemini 토크나이저와 정확히 같지는 않음).
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from services import metrics
+from services.ai_service_global import get_embeddings
+
+CONTEXT_BUDGET_CHAT = int(os.getenv("CONTEXT_BUDGET_CHAT", "1500"))        # 토큰
+CONTEXT_BUDGET_SUMMARY = int(os.getenv("CONTEXT_BUDGET_SUMMARY", "3000"))
+CONTEXT_BUDGET_QUIZ = int(os.getenv("CONTEXT_BUDGET_QUIZ", "500"))          # 기존 context[:1000] 대체
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))          # 1=관련도만, 0=다양성만
+CONTEXT_DEDUP_SIM = float(os.getenv("CONTEXT_DEDUP_SIM", "0.95"))           # 이 이상 비슷하면 중복으로 버림
+CONTEXT_MIN_TAIL = int(os.getenv("CONTEXT_MIN_TAIL", "64"))                 # 잘린 마지막 청크 최소 토큰
+
+_SENT_END = re.compile(r"[.!?。](?=\s)|\n")
+
+
+class _ApproxEncoding:
+    """tiktoken 인코딩 파일을 받을 수 없는 환경(오프라인 등)용 근사치: 약 2글자 = 1토큰"""
+    CHARS_PER_TOKEN = 2
+
+    def encode(self, text: str, **_) -> List[str]:
+        n = self.CHARS_PER_TOKEN
+        return [text[i:i + n] for i in range(0, len(text), n)]
+
+    def decode(self, ids: List[str]) -> str:
+        return "".join(ids)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:   # 최초 사용 시 인코딩 파일을 내려받는다 → 실패하면 근사치로 대체
+        logging.warning(f"[context-pack] tiktoken unavailable, using approximate token count: {e!r}")
+        return _ApproxEncoding()
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text or "", disallowed_special=()))
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """max_tokens 이내로 자른다. 가능하면 마지막 문장 경계(없으면 공백)에서 끊는다."""
+    enc = _encoding()
+    ids = enc.encode(text or "", disallowed_special=())
+    if len(ids) <= max_tokens:
+        return text
+    head = enc.decode(ids[:max_tokens]).rstrip("�")
+    ends = [m.end() for m in _SENT_END.finditer(head)]
+    if ends and ends[-1] > len(head) // 2:
+        return head[: ends[-1]].rstrip()
+    cut = head.rfind(" ")
+    return (head[:cut] if cut > len(head) // 2 else head).rstrip()
+
+
+# ---------- 저장된 청크 임베딩 ----------
+def _chunk_filter(doc: Document) -> Optional[dict]:
+    md = doc.metadata or {}
+    if md.get("document_id") is None or md.get("page") is None:
+        return None
+    return {"$and": [{"document_id": md["document_id"]}, {"page": md["page"]}]}
+
+
+def stored_embeddings(vectordb, docs: Sequence[Document]) -> np.ndarray:
+    """
+    (document_id, page) 로 Chroma 에 저장된 임베딩을 한 번에 조회한다.
+    메타데이터가 없거나 조회되지 않은 청크만 임베딩 모델로 새로 계산.
+    """
+    vecs: List[Optional[Sequence[float]]] = [None] * len(docs)
+    wanted, clauses = {}, []
+    for i, d in enumerate(docs):
+        f = _chunk_filter(d)
+        if f is None:
+            continue
+        key = (d.metadata["document_id"], d.metadata["page"])
+        if key not in wanted:
+            clauses.append(f)
+        wanted.setdefault(key, []).append(i)
+    if clauses:
+        where = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+        try:
+            got = vectordb._collection.get(where=where, include=["embeddings", "metadatas"])
+            for emb, md in zip(got.get("embeddings") if got.get("embeddings") is not None else [], got.get("metadatas") or []):
+                for i in wanted.get(((md or {}).get("document_id"), (md or {}).get("page")), []):
+                    vecs[i] = emb
+        except Exception as e:
+            logging.warning(f"[context-pack] stored embedding lookup failed: {e!r}")
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        for i, v in zip(missing, get_embeddings().embed_documents([docs[i].page_content for i in missing])):
+            vecs[i] = v
+    return np.asarray(vecs, dtype=np.float32).reshape(len(docs), -1)
+
+
+# ---------- MMR ----------
+def _unit(m: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(n > 0, n, 1.0)
+
+
+def mmr_order(
+    doc_vecs: np.ndarray,
+    query_vec: Optional[Sequence[float]] = None,
+    *,
+    lambda_mult: float = CONTEXT_MMR_LAMBDA,
+    dedup_sim: float = CONTEXT_DEDUP_SIM,
+) -> Tuple[List[int], List[int]]:
+    """
+    MMR 선택 순서와 중복으로 버린 인덱스를 돌려준다.
+    query_vec 이 없으면 입력 순서(검색/재정렬 순위)를 관련도로 본다.
+    """
+    n = len(doc_vecs)
+    if n == 0:
+        return [], []
+    vecs = _unit(np.asarray(doc_vecs, dtype=np.float32))
+    if query_vec is not None:
+        rel = vecs @ _unit(np.asarray(query_vec, dtype=np.float32))
+    else:
+        rel = 1.0 - np.arange(n, dtype=np.float32) / n
+    sim = vecs @ vecs.T
+
+    order: List[int] = [int(np.argmax(rel))]
+    redundant: List[int] = []
+    remaining = [i for i in range(n) if i != order[0]]
+    while remaining:
+        cand = np.asarray(remaining)
+        max_sim = sim[np.ix_(cand, order)].max(axis=1)
+        dup = max_sim >= dedup_sim
+        redundant.extend(int(i) for i in cand[dup])
+        cand, max_sim = cand[~dup], max_sim[~dup]
+        if not len(cand):
+            break
+        score = lambda_mult * rel[cand] - (1 - lambda_mult) * max_sim
+        best = int(cand[int(np.argmax(score))])
+        order.append(best)
+        remaining = [int(i) for i in cand if i != best]
+    return order, redundant
+
+
+# ---------- 패킹 ----------
+@dataclass
+class PackedContext:
+    docs: List[Document]
+    tokens_before: int
+    tokens_after: int
+    redundant: int = 0
+    dropped: int = 0                  # 예산 때문에 빠진 청크 수
+    truncated: bool = False           # 마지막 청크를 잘랐는지
+    order: List[int] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def pack_documents(
+    docs: Sequence[Document],
+    doc_vecs: Optional[np.ndarray] = None,
+    *,
+    query_vec: Optional[Sequence[float]] = None,
+    budget: int,
+    label: str = "rag",
+    lambda_mult: float = CONTEXT_MMR_LAMBDA,
+) -> PackedContext:
+    """
+    중복 제거 + MMR 순서 + 토큰 예산. doc_vecs 가 없으면 MMR 없이 입력 순서로 예산만 적용.
+    query_vec=None, lambda_mult=1.0 이면 입력 순서(재정렬 순위)를 유지하고 중복 제거만 한다.
+    """
+    docs = list(docs)
+    tokens = [count_tokens(d.page_content) for d in docs]
+    if doc_vecs is not None and len(docs) > 1:
+        order, redundant = mmr_order(doc_vecs, query_vec, lambda_mult=lambda_mult)
+    else:
+        order, redundant = list(range(len(docs))), []
+
+    out: List[Document] = []
+    used, dropped, truncated = 0, 0, False
+    for i in order:
+        left = budget - used
+        if tokens[i] <= left:
+            out.append(docs[i])
+            used += tokens[i]
+        elif left >= CONTEXT_MIN_TAIL and not truncated:
+            text = trim_to_tokens(docs[i].page_content, left)
+            out.append(Document(page_content=text, metadata=dict(docs[i].metadata or {})))
+            used += count_tokens(text)
+            truncated = True
+        else:
+            dropped += 1
+
+    packed = PackedContext(
+        docs=out, tokens_before=sum(tokens), tokens_after=used,
+        redundant=len(redundant), dropped=dropped, truncated=truncated, order=order,
+    )
+    _record(label, packed.tokens_before, packed.tokens_after)
+    logging.info(
+        f"[context-pack] label={label} chunks={len(out)}/{len(docs)} redundant={packed.redundant} "
+        f"dropped={dropped} truncated={truncated} tokens={packed.tokens_after}/{packed.tokens_before} "
+        f"saved={packed.tokens_saved}"
+    )
+    return packed
+
+
+def pack_text(text: str, *, budget: int, label: str = "rag") -> str:
+    """단일 컨텍스트 문자열을 토큰 예산으로 자른다 (퀴즈 문항별 컨텍스트 등)."""
+    out = trim_to_tokens(text, budget)
+    _record(label, count_tokens(text), count_tokens(out))
+    return out
+
+
+def _record(label: str, before: int, after: int) -> None:
+    metrics.inc(f"context.tokens_in.{label}", before)
+    metrics.inc(f"context.tokens_saved.{label}", before - after)
+    metrics.observe(f"context.tokens_out.{label}", after)
+
+
+async def pack_context(
+    vectordb,
+    docs: Sequence[Document],
+    *,
+    query_vec: Optional[Sequence[float]] = None,
+    budget: int,
+    label: str = "rag",
+    lambda_mult: float = CONTEXT_MMR_LAMBDA,
+) -> PackedContext:
+    """Chroma 에 저장된 임베딩으로 MMR 후 예산 적용 (임베딩 조회/계산은 스레드에서)."""
+    docs = list(docs)
+    if len(docs) <= 1:
+        return pack_documents(docs, None, budget=budget, label=label)
+    vecs = await asyncio.to_thread(stored_embeddings, vectordb, docs)
+    return pack_documents(docs, vecs, query_vec=query_vec, budget=budget, label=label, lambda_mult=lambda_mult)
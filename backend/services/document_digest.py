@@ -0,0 +1,289 @@
+# services/document_digest.py
+# ------------------------------------------------------------
+# 문서별 digest(핵심 개념 + 함정) 관리
+# - 업로드가 끝나면 schedule_digest() 로 백그라운드 생성 → document_digests 에 저장
+# - 과목 요약(mode="digest")은 청크 대신 digest 들을 합쳐 만든다
+#   → 새로 올린 문서의 digest 만 LLM 작업이 필요하고, 최종 호출 입력은 토큰 예산으로 고정
+#     (문서 수가 늘어도 과목 요약 지연이 거의 일정)
+# - 긴 문서는 연속 청크를 DIGEST_INPUT_TOKENS 단위로 나눠 병렬 요약 후 digest 로 합친다
+# - 같은 문서의 생성은 한 번만 돈다(백그라운드 작업과 요약 요청이 같은 작업을 함께 기다림)
+# - 실패한 digest 는 attempts/retry_at 으로 재시도 간격을 늘린다 (요약 요청마다 LLM 을 다시 부르지 않게)
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models.document_domain import DocumentDigestTable, DocumentTable
+from models.vector_domain import VectorIndexTable
+from routers.auth import async_session
+from services import metrics
+from services.ai_service_global import llm_gateway
+from services.chroma_pool import chroma_pool
+from services.context_packer import count_tokens, trim_to_tokens
+
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "1") != "0"                    # 업로드 시 자동 생성 여부
+DIGEST_INPUT_TOKENS = int(os.getenv("DIGEST_INPUT_TOKENS", "3500"))         # LLM 호출 1회 입력 상한
+DIGEST_MAX_TOKENS = int(os.getenv("DIGEST_MAX_TOKENS", "600"))              # 저장할 digest 길이 상한
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "2"))              # 동시에 만드는 문서 수
+DIGEST_MIN_SHARE = int(os.getenv("DIGEST_MIN_SHARE", "120"))                # 과목 요약에서 문서당 최소 토큰
+DIGEST_RETRY_BASE_S = int(os.getenv("DIGEST_RETRY_BASE_S", "60"))           # 실패 후 첫 재시도 대기(초), 실패마다 2배
+DIGEST_RETRY_MAX_S = int(os.getenv("DIGEST_RETRY_MAX_S", "3600"))           # 재시도 대기 상한(초)
+DIGEST_PROMPT_VERSION = "v1"    # 프롬프트를 바꾸면 올려서 기존 digest 를 다시 만들게 함
+
+_sem = asyncio.Semaphore(max(1, DIGEST_CONCURRENCY))
+_inflight: Dict[int, asyncio.Task] = {}   # document_id → 생성 작업 (백그라운드/요청이 공유)
+
+
+def _source_hash(doc: DocumentTable) -> str:
+    return hashlib.sha256(f"{DIGEST_PROMPT_VERSION}:{doc.text_hash or doc.document_id}".encode()).hexdigest()
+
+
+def _digest_prompt(title: str, text: str) -> str:
+    return f"""
+    다음은 강의 자료 "{title}" 의 내용입니다. 이 문서만의 시험 대비 digest 를 작성하세요.
+
+    형식:
+    1) 핵심 개념 (불릿, 정의/원리/공식 위주)
+    2) 자주 나오는 함정/오개념 (불릿)
+
+    규칙:
+    - 자료에 없는 내용은 추가하지 마세요.
+    - 다른 문서와 합쳐 과목 요약을 만들 때 쓰이므로 간결하게 작성하세요.
+
+    자료:
+    {text}
+    """
+
+
+def _part_prompt(text: str) -> str:
+    return f"""
+    다음은 강의 자료의 연속된 일부입니다. 핵심 개념과 헷갈리기 쉬운 부분만 불릿으로 요약하세요.
+    - 자료에 없는 내용은 추가하지 마세요.
+
+    자료:
+    {text}
+    """
+
+
+def _split_by_tokens(texts: List[str], budget: int) -> List[str]:
+    """연속 청크를 입력 토큰 상한 단위로 묶는다."""
+    groups: List[str] = []
+    current: List[str] = []
+    used = 0
+    for t in texts:
+        n = count_tokens(t)
+        if current and used + n > budget:
+            groups.append("\n\n".join(current))
+            current, used = [], 0
+        current.append(trim_to_tokens(t, budget))
+        used += n
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+
+async def _generate(vindex: VectorIndexTable, doc: DocumentTable, *, user_id) -> Tuple[str, int]:
+    """문서 청크를 읽어 digest 생성. 반환: (digest, LLM 호출 수)"""
+    handle = await chroma_pool.get(vindex)
+    data = await asyncio.to_thread(
+        handle.get, where={"document_id": doc.document_id}, include=["documents", "metadatas"]
+    )
+    rows = sorted(
+        zip(data.get("documents") or [], data.get("metadatas") or []),
+        key=lambda x: (x[1] or {}).get("page") or 0,
+    )
+    texts = [t for t, _ in rows if t]
+    if not texts:
+        raise ValueError("no chunks indexed for document")
+
+    groups = _split_by_tokens(texts, DIGEST_INPUT_TOKENS)
+    calls = 0
+    if len(groups) > 1:
+        parts = await asyncio.gather(*(
+            llm_gateway.ainvoke(_part_prompt(g), user_id=user_id) for g in groups
+        ))
+        calls += len(parts)
+        source = trim_to_tokens("\n\n".join(p.strip() for p in parts), DIGEST_INPUT_TOKENS)
+    else:
+        source = groups[0]
+    digest = await llm_gateway.ainvoke(_digest_prompt(doc.title, source), user_id=user_id)
+    return trim_to_tokens(digest.strip(), DIGEST_MAX_TOKENS), calls + 1
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """연속 실패 횟수에 따른 재시도 대기 (지수 증가, DIGEST_RETRY_MAX_S 상한)"""
+    return timedelta(seconds=min(DIGEST_RETRY_MAX_S, DIGEST_RETRY_BASE_S * 2 ** max(0, attempts - 1)))
+
+
+def _backing_off(row: Optional[DocumentDigestTable], src: str, now: datetime) -> bool:
+    """같은 원본으로 실패한 digest 가 재시도 시각 전이면 True (새 원본이면 바로 다시 만든다)"""
+    return (
+        row is not None and row.status == "failed" and row.source_hash == src
+        and row.retry_at is not None and row.retry_at > now
+    )
+
+
+async def _build(document_id: int, user_id) -> Optional[str]:
+    async with _sem:
+        t0 = time.perf_counter()
+        # 1) 상태 확인 + pending 표시 → 커밋 후 세션 반납 (LLM 호출 동안 DB 연결/트랜잭션을 잡지 않음)
+        async with async_session() as db:
+            doc = await db.get(DocumentTable, document_id)
+            if doc is None:
+                return None
+            row = (await db.execute(
+                select(DocumentDigestTable).where(DocumentDigestTable.document_id == document_id)
+            )).scalar_one_or_none()
+            src = _source_hash(doc)
+            if row is not None and row.status == "ready" and row.source_hash == src:
+                return row.content_md
+            if _backing_off(row, src, datetime.utcnow()):
+                metrics.inc("digest.backoff")
+                return None
+            if row is None:
+                row = DocumentDigestTable(
+                    document_id=document_id, subject_id=doc.subject_id, user_id=doc.user_id, status="pending",
+                )
+                db.add(row)
+            elif row.source_hash != src:
+                row.attempts = 0    # 원본이 바뀌면 실패 횟수 초기화
+            row.status, row.updated_at = "pending", datetime.utcnow()
+            vindex = (await db.execute(
+                select(VectorIndexTable).where(
+                    VectorIndexTable.user_id == doc.user_id,
+                    VectorIndexTable.subject_id == doc.subject_id,
+                )
+            )).scalar_one_or_none()
+            await db.commit()
+            digest_id, attempts = row.digest_id, row.attempts or 0
+
+        # 2) 생성 (DB 세션 없이)
+        try:
+            if vindex is None:
+                raise ValueError("no vector index for subject")
+            content, calls = await _generate(vindex, doc, user_id=user_id or doc.user_id)
+            error = None
+        except Exception as e:
+            logging.warning(f"[digest] document={document_id} failed: {e!r}")
+            metrics.inc("digest.failed")
+            content, error = None, e
+
+        # 3) 결과 저장 (새 세션)
+        async with async_session() as db:
+            row = await db.get(DocumentDigestTable, digest_id)
+            if row is None:
+                return content
+            now = datetime.utcnow()
+            if error is not None:
+                attempts += 1
+                row.status, row.error, row.source_hash = "failed", repr(error)[:1000], src
+                row.attempts, row.retry_at = attempts, now + _retry_delay(attempts)
+            else:
+                row.status, row.content_md, row.source_hash = "ready", content, src
+                row.error, row.attempts, row.retry_at = None, 0, None
+            row.updated_at = now
+            await db.commit()
+        if error is not None:
+            return None
+
+        took_ms = (time.perf_counter() - t0) * 1000
+        metrics.inc("digest.built")
+        metrics.inc("digest.llm_calls", calls)
+        metrics.observe("digest.build_ms", took_ms)
+        logging.info(f"[digest] document={document_id} llm_calls={calls} took_ms={took_ms:.1f}")
+        return content
+
+
+def _task_for(document_id: int, user_id) -> asyncio.Task:
+    task = _inflight.get(document_id)
+    if task is None or task.done():
+        task = asyncio.create_task(_build(document_id, user_id))
+        _inflight[document_id] = task
+        task.add_done_callback(lambda t: _inflight.pop(document_id, None) if _inflight.get(document_id) is t else None)
+    return task
+
+
+def schedule_digest(document_id: int, *, user_id=None) -> None:
+    """업로드 직후 호출: digest 생성을 백그라운드로 띄운다 (응답을 기다리게 하지 않음)."""
+    if DIGEST_ENABLED:
+        _task_for(document_id, user_id)
+
+
+async def build_digest(document_id: int, *, user_id=None) -> Optional[str]:
+    """digest 를 만들거나(이미 최신이면 그대로) 진행 중인 작업을 기다린다. 실패 시 None."""
+    # shield: 요청이 취소돼도 백그라운드 작업과 공유하는 생성은 끝까지 진행
+    return await asyncio.shield(_task_for(document_id, user_id))
+
+
+async def subject_digests(session, *, user_id: uuid.UUID, subject_id: int) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    과목의 색인된 문서별 digest 목록 [(문서 제목, digest)] (document_id 순).
+    없거나 오래된 digest 만 지금 만든다 (실패 후 재시도 대기 중인 문서는 건너뜀). 반환: (목록, 새로 만든 수)
+    생성(LLM 호출) 전에 조회 트랜잭션을 끝내 요청 세션이 그동안 DB 연결을 잡지 않게 한다.
+    """
+    rows = (await session.execute(
+        select(DocumentTable, DocumentDigestTable)
+        .outerjoin(DocumentDigestTable, DocumentDigestTable.document_id == DocumentTable.document_id)
+        .where(
+            DocumentTable.user_id == user_id,
+            DocumentTable.subject_id == subject_id,
+            DocumentTable.status == "indexed",
+        )
+        .order_by(DocumentTable.document_id)
+    )).all()
+
+    fresh: Dict[int, str] = {}
+    missing: List[DocumentTable] = []
+    skipped = 0
+    now = datetime.utcnow()
+    for doc, dg in rows:
+        src = _source_hash(doc)
+        if dg is not None and dg.status == "ready" and dg.source_hash == src:
+            fresh[doc.document_id] = dg.content_md or ""
+        elif _backing_off(dg, src, now):
+            skipped += 1
+        else:
+            missing.append(doc)
+    await session.commit()   # 조회 트랜잭션 종료 (expire_on_commit=False 라 읽은 행은 그대로 사용)
+    if skipped:
+        metrics.inc("digest.backoff", skipped)
+
+    built = await asyncio.gather(*(build_digest(d.document_id, user_id=user_id) for d in missing))
+    for doc, content in zip(missing, built):
+        if content:
+            fresh[doc.document_id] = content
+    metrics.inc("digest.reused", len(rows) - len(missing) - skipped)
+
+    return [(doc.title, fresh[doc.document_id]) for doc, _ in rows if doc.document_id in fresh], len(missing)
+
+
+def compose_context(digests: List[Tuple[str, str]], budget: int) -> str:
+    """digest 들을 문서 제목과 함께 이어 붙인다. 문서 수가 많으면 문서당 몫을 줄여 예산을 지킨다."""
+    if not digests:
+        return ""
+    share = max(DIGEST_MIN_SHARE, budget // len(digests))
+    parts = [f"[{title}]\n{trim_to_tokens(content, share)}" for title, content in digests]
+    return trim_to_tokens("\n\n".join(parts), budget)
+
+
+async def resume_pending_digests() -> None:
+    """서버 재시작 시 끝나지 못한 digest 작업을 다시 띄운다."""
+    if not DIGEST_ENABLED:
+        return
+    async with async_session() as db:
+        ids = (await db.execute(
+            select(DocumentDigestTable.document_id).where(DocumentDigestTable.status == "pending")
+        )).scalars().all()
+    for document_id in ids:
+        schedule_digest(document_id)
+    if ids:
+        logging.info(f"[digest] resumed {len(ids)} pending digests")
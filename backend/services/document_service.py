@@ -21,16 +21,19 @@ from langchain_community.vectorstores import Chroma
 
 
 # 공용 AI 유틸: 임베딩 인스턴스/텍스트 정제/청크 분할 함수
-from services.ai_service_global import _EMBEDDINGS, clean_text, split_to_chunks
+from services.ai_service_global import get_embeddings, clean_text, split_to_chunks
 
 # RDB 테이블 모델 (SQLAlchemy)
-from models.document_domain import DocumentTable
+from models.document_domain import DocumentTable, DocumentDigestTable
 from models.vector_domain import VectorIndexTable, VectorDocTable
 
 # OCR 업로드용 서비스 로직  추가
 from services.ocr_service import ocr_image_bytes, llm_light_fix, build_preview
 import mimetypes
 
+# 문서별 digest (업로드 후 백그라운드 생성)
+from services.document_digest import schedule_digest
+
 # ============================================================
 # 저장 경로 설정
 # ============================================================
@@ -112,14 +115,14 @@ def _ensure_chroma(index_row: VectorIndexTable) -> Chroma:
         return Chroma(
             collection_name=index_row.collection_name,
             persist_directory=index_row.persist_dir,
-            embedding_function=_EMBEDDINGS,
+            embedding_function=get_embeddings(),
         )
     except Exception:
         os.makedirs(index_row.persist_dir, exist_ok=True)
         return Chroma(
             collection_name=index_row.collection_name,
             persist_directory=index_row.persist_dir,
-            embedding_function=_EMBEDDINGS,
+            embedding_function=get_embeddings(),
         )
 
 # 모드 판정용 헬퍼 함수
@@ -148,7 +151,8 @@ async def handle_upload(
     4) 해당 Chroma 컬렉션에 add_documents() → 이때 임베딩 계산 & 디스크 저장
     5) vector_docs INSERT (문서별 청크 수/상태 기록)
     6) 카운터/documents.status 업데이트, 커밋
-    7) 응답 JSON 반환
+    7) 문서 digest 백그라운드 생성 예약
+    8) 응답 JSON 반환
     """
     # -------- 입력 검증 --------
     if not subject_id:
@@ -205,7 +209,7 @@ async def handle_upload(
 
         # 이미지 → OCR
         raw_txt = ocr_image_bytes(raw, lang="kor+eng")
-        fixed_txt = llm_light_fix(raw_txt) if raw_txt.strip() else raw_txt
+        fixed_txt = await llm_light_fix(raw_txt) if raw_txt.strip() else raw_txt
 
         # (선택) 미리보기
         if debug_preview:
@@ -261,7 +265,7 @@ async def handle_upload(
         # 아주 초기 상태 등에서 add_documents가 실패하면 from_documents가 더 안전한 경우가 있다.
         Chroma.from_documents(
             documents=enriched_chunks,
-            embedding=_EMBEDDINGS,
+            embedding=get_embeddings(),
             collection_name=vindex.collection_name,
             persist_directory=vindex.persist_dir,
         )
@@ -280,9 +284,16 @@ async def handle_upload(
     doc.status = "indexed"
     vindex.doc_count = (vindex.doc_count or 0) + 1
     vindex.chunk_count = (vindex.chunk_count or 0) + chunk_count
+    vindex.index_version = (vindex.index_version or 0) + 1
     vindex.updated_at = datetime.utcnow()
+    session.add(DocumentDigestTable(
+        document_id=doc.document_id, subject_id=subject_id, user_id=user_id, status="pending",
+    ))
     await session.commit()
 
+    # -------- 7) 문서 digest 생성 예약 (응답은 기다리지 않음, 과목 요약 mode="digest" 에서 사용) --------
+    schedule_digest(doc.document_id, user_id=user_id)
+
     # 응답 (미리보기는 요청 시에만)
     resp = {
         "document_id": doc.document_id,
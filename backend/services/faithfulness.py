@@ -0,0 +1,146 @@
+# services/faithfulness.py
+# ------------------------------------------------------------
+# 요약 정합성 로컬 사전 검사 (CRAG 의 LLM 심사 전에 실행)
+# 요약 문장마다
+#   - 임베딩 유사도: 검색된 청크들과의 최대 코사인 유사도 (청크 임베딩은 Chroma 저장값 재사용)
+#   - 용어 겹침    : 문장의 글자 bigram 중 컨텍스트에 등장하는 비율 (조사/어미가 붙는 한국어에도 강건)
+# 을 섞어 문장 점수를 만들고, '근거 있는 문장' 비율로 판정한다.
+#   pass       : 확실히 근거 있음 → LLM 심사 생략
+#   fail       : 확실히 근거 없는 문장이 많음 → 그래도 LLM 심사로 확정 (로컬 판정만으로 떨어뜨리지 않음),
+#                심사와 동시에 그 문장들을 사유로 다음 초안을 미리 생성
+#                (바꿔 말하기(paraphrase)가 억울하게 떨어지지 않도록 pass 보다 훨씬 낮은 점수 기준)
+#   borderline : 애매함 → 기존대로 grade_summary (LLM) 호출
+# 임계값은 scripts/eval_faithfulness.py 의 fixture 로 LLM 심사와의 일치율을 보며 조정한다.
+# 측정 (2026-10-19, scripts/fixtures/faithfulness.jsonl 10건, 기록된 llm_ok 기준, 기본 임계값):
+#   pass 4 / fail 4 / borderline 2 → LLM 심사 회피 4/10 (40%)
+#   로컬 pass 의 LLM 일치 4/4 (100%), 로컬 fail 의 LLM 일치 3/4 (75% – 바꿔 말하기 1건을 오판)
+#   ※ 오프라인 측정이라 실제 임베딩 모델 대신 단어 해시 bag-of-words 가짜 임베딩(PYTHONHASHSEED=0)을 썼다.
+#     fail 오판이 있으므로 fail 은 LLM 심사로 확정한다. 배포 임베딩으로는
+#     `python -m scripts.eval_faithfulness -v` 로 다시 재야 한다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+import numpy as np
+from langchain.schema import Document
+
+from services import metrics
+from services.ai_service_global import get_embeddings
+from services.context_packer import stored_embeddings
+
+FAITH_PRECHECK = os.getenv("FAITH_PRECHECK", "1") != "0"
+FAITH_EMB_WEIGHT = float(os.getenv("FAITH_EMB_WEIGHT", "0.6"))        # 문장 점수 = w*코사인 + (1-w)*겹침
+FAITH_SENT_MIN = float(os.getenv("FAITH_SENT_MIN", "0.55"))            # 이 이상이면 '근거 있는 문장'
+FAITH_SENT_FAIL = float(os.getenv("FAITH_SENT_FAIL", "0.25"))          # 이 미만이면 '확실히 근거 없는 문장'
+FAITH_PASS_FRAC = float(os.getenv("FAITH_PASS_FRAC", "0.9"))           # 근거 문장 비율 ≥ → pass
+FAITH_FAIL_FRAC = float(os.getenv("FAITH_FAIL_FRAC", "0.5"))           # 확실히 근거 없는 문장 비율 ≥ → fail
+FAITH_MIN_SENT_CHARS = 8                                                # 이보다 짧은 줄(제목/번호)은 제외
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n+")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)]|#+)\s*")
+_NON_WORD = re.compile(r"[^\w]+")
+# 제목 줄은 근거를 따질 문장이 아니므로 제외: 마크다운 제목, 굵게만 된 줄, summary_prompt 의 섹션 제목
+_HEADING = re.compile(
+    r"^\s*(?:#+\s.*|\*\*[^*]+\*\*:?|(?:\*\*)?\d[.)]\s*(?:핵심 개념|자주 나오는 함정|주요 개념 영역|3줄 최종 요약)[^.!?]*)\s*$"
+)
+
+
+@dataclass
+class LocalVerdict:
+    decision: str                      # pass | fail | borderline
+    supported_frac: float
+    scores: List[float] = field(default_factory=list)
+    unsupported: List[str] = field(default_factory=list)
+
+    @property
+    def reason(self) -> str:
+        if self.decision == "pass":
+            return f"로컬 검사 통과: 문장 {self.supported_frac:.0%} 가 컨텍스트에 근거함"
+        sample = " / ".join(s[:60] for s in self.unsupported[:3])
+        return f"컨텍스트에서 근거를 찾기 어려운 문장이 있습니다: {sample}"
+
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    lines = [ln for ln in (text or "").splitlines() if not _HEADING.match(ln)]
+    for s in _SENT_SPLIT.split("\n".join(lines)):
+        s = _BULLET.sub("", s).strip(" *_`>")
+        if len(s) >= FAITH_MIN_SENT_CHARS:
+            out.append(s)
+    return out
+
+
+def _bigrams(text: str) -> set:
+    t = _NON_WORD.sub("", text.lower())
+    return {t[i:i + 2] for i in range(len(t) - 1)}
+
+
+def term_overlap(sentence: str, context_bigrams: set) -> float:
+    grams = _bigrams(sentence)
+    if not grams:
+        return 0.0
+    return len(grams & context_bigrams) / len(grams)
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(n > 0, n, 1.0)
+
+
+def score_summary(
+    sentences: Sequence[str],
+    sent_vecs: np.ndarray,
+    chunk_texts: Sequence[str],
+    chunk_vecs: np.ndarray,
+) -> LocalVerdict:
+    """문장/청크 임베딩이 준비된 상태에서 판정만 계산 (순수 함수 – 평가 스크립트에서도 사용)."""
+    if not sentences or not len(chunk_texts):
+        return LocalVerdict("borderline", 0.0)
+    cos = (_unit(np.asarray(sent_vecs, dtype=np.float32)) @ _unit(np.asarray(chunk_vecs, dtype=np.float32)).T).max(axis=1)
+    ctx_grams = _bigrams(" ".join(chunk_texts))
+    overlap = np.array([term_overlap(s, ctx_grams) for s in sentences], dtype=np.float32)
+    scores = FAITH_EMB_WEIGHT * np.clip(cos, 0.0, 1.0) + (1 - FAITH_EMB_WEIGHT) * overlap
+
+    supported = scores >= FAITH_SENT_MIN
+    frac = float(supported.mean())
+    if frac >= FAITH_PASS_FRAC:
+        decision = "pass"
+    elif float((scores < FAITH_SENT_FAIL).mean()) >= FAITH_FAIL_FRAC:
+        decision = "fail"
+    else:
+        decision = "borderline"
+    return LocalVerdict(
+        decision, frac, [round(float(s), 4) for s in scores],
+        [s for s, ok in zip(sentences, supported) if not ok],
+    )
+
+
+def _precheck_sync(vectorstore, docs: Sequence[Document], summary_text: str) -> LocalVerdict:
+    sentences = split_sentences(summary_text)
+    if not sentences or not docs:
+        return LocalVerdict("borderline", 0.0)
+    emb = get_embeddings()
+    sent_vecs = np.asarray(emb.embed_documents(sentences), dtype=np.float32)
+    if vectorstore is not None:
+        chunk_vecs = stored_embeddings(vectorstore, docs)
+    else:
+        chunk_vecs = np.asarray(emb.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+    return score_summary(sentences, sent_vecs, [d.page_content for d in docs], chunk_vecs)
+
+
+async def local_precheck(vectorstore, docs: Sequence[Document], summary_text: str) -> LocalVerdict:
+    """요약문 vs 검색 청크 로컬 판정. 결과별 카운터(crag.precheck.*)를 남긴다."""
+    verdict = await asyncio.to_thread(_precheck_sync, vectorstore, docs, summary_text)
+    metrics.inc(f"crag.precheck.{verdict.decision}")
+    return verdict
+
+
+def record_grader_call(avoided: bool) -> None:
+    """LLM 심사 호출 여부 집계 → crag.grader.avoided / crag.grader.called (회피율 = avoided / 합계)."""
+    metrics.inc("crag.grader.avoided" if avoided else "crag.grader.called")
+
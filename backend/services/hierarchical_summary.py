@@ -0,0 +1,205 @@
+# services/hierarchical_summary.py
+# ------------------------------------------------------------
+# 대용량 과목용 계층(map-reduce) 요약
+# - 기존 RAG 모드는 검색 상위 8개 청크만 보므로, 한 학기 분량 자료의 "전체 요약"에서 대부분이 빠진다.
+# - 여기서는 과목 컬렉션의 모든 청크를 (document_id, page) 순으로 정렬해
+#     map   : 문서별로 연속 청크 HIER_GROUP_CHUNKS 개씩 묶어 병렬 요약 (동시성 상한은 LLM 게이트웨이가 관리)
+#     reduce: 부분 요약을 HIER_REDUCE_FANIN 개씩 묶어 다시 요약, 1개가 남을 때까지 단계별로 반복
+#     final : 남은 요약(들)을 컨텍스트로 summary_prompt(주제 반영) → content_md
+# - map/reduce 결과는 summary_partials 에 입력 해시(group_key)로 저장 → 다음 요청에서 재사용
+#   (한 단계에서 일부 호출이 실패해도 끝난 묶음은 저장하므로, 다시 요청하면 실패한 묶음만 호출)
+#   (주제와 무관한 중간 요약만 저장하고, 주제는 마지막 단계에서만 반영)
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.summary_domain import SummaryPartialTable
+from models.vector_domain import VectorIndexTable
+from services import metrics
+from services.ai_service_global import llm_gateway, summary_prompt
+from services.context_packer import pack_text
+
+HIER_GROUP_CHUNKS = int(os.getenv("HIER_GROUP_CHUNKS", "8"))        # map 단계 묶음 크기(청크 수)
+HIER_REDUCE_FANIN = int(os.getenv("HIER_REDUCE_FANIN", "6"))        # reduce 단계 묶음 크기(요약 수)
+HIER_GROUP_TOKENS = int(os.getenv("HIER_GROUP_TOKENS", "3500"))     # 묶음 하나의 입력 토큰 상한
+HIER_PROMPT_VERSION = "v1"    # map/reduce 프롬프트를 바꾸면 올려서 이전 부분 요약을 무효화
+
+
+@dataclass
+class _Part:
+    text: str
+    chunk_count: int
+
+
+@dataclass
+class HierarchicalResult:
+    content_md: str
+    chunks: int
+    levels: int
+    llm_calls: int
+    reused: int
+
+
+def _map_prompt(text: str) -> str:
+    return f"""
+    다음은 강의 자료의 연속된 일부입니다. 시험 대비용으로 핵심만 요약하세요.
+    - 정의, 원리, 공식, 비교/장단점, 자주 헷갈리는 부분 위주의 불릿
+    - 자료에 없는 내용은 추가하지 마세요.
+
+    자료:
+    {text}
+    """
+
+
+def _reduce_prompt(text: str) -> str:
+    return f"""
+    다음은 같은 과목 자료의 부분 요약들입니다. 중복을 합치고 개념 영역별로 묶어 하나의 요약으로 정리하세요.
+    - 빠지는 개념이 없도록 하되 같은 내용은 한 번만
+    - 부분 요약에 없는 내용은 추가하지 마세요.
+
+    부분 요약:
+    {text}
+    """
+
+
+def _group_key(level: int, texts: Sequence[str]) -> str:
+    h = hashlib.sha256(f"{HIER_PROMPT_VERSION}:{level}".encode())
+    for t in texts:
+        h.update(b"\x00")
+        h.update(t.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _leaf_groups(documents: Sequence[str], metadatas: Sequence[dict]) -> List[List[str]]:
+    """(document_id, page) 순 정렬 후 문서 경계를 넘지 않게 연속 청크를 묶는다."""
+    rows = sorted(
+        zip(documents, metadatas),
+        key=lambda x: ((x[1] or {}).get("document_id") or 0, (x[1] or {}).get("page") or 0),
+    )
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_doc = object()
+    for text, md in rows:
+        doc_id = (md or {}).get("document_id")
+        if current and (doc_id != current_doc or len(current) >= HIER_GROUP_CHUNKS):
+            groups.append(current)
+            current = []
+        current_doc = doc_id
+        if text:
+            current.append(text)
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _run_level(
+    session: AsyncSession,
+    vindex: VectorIndexTable,
+    level: int,
+    groups: List[Tuple[List[str], int]],
+    *,
+    user_id,
+) -> Tuple[List[_Part], int, int]:
+    """
+    한 단계 실행: 저장된 부분 요약은 재사용하고, 없는 묶음만 동시에 LLM 호출 후 저장.
+    groups: [(입력 텍스트 목록, 덮는 청크 수)]
+    반환: (부분 요약 목록(입력 순서 유지), LLM 호출 수, 재사용 수)
+    """
+    keys = [_group_key(level, texts) for texts, _ in groups]
+    stored: Dict[str, str] = {}
+    if keys:
+        rows = (await session.execute(
+            select(SummaryPartialTable.group_key, SummaryPartialTable.content).where(
+                SummaryPartialTable.vector_index_id == vindex.vector_index_id,
+                SummaryPartialTable.level == level,
+                SummaryPartialTable.group_key.in_(set(keys)),
+            )
+        )).all()
+        stored = {k: c for k, c in rows}
+
+    todo = [i for i, k in enumerate(keys) if k not in stored]
+    make_prompt = _map_prompt if level == 0 else _reduce_prompt
+
+    async def _one(i: int) -> str:
+        text = pack_text("\n\n".join(groups[i][0]), budget=HIER_GROUP_TOKENS, label="hierarchical")
+        return (await llm_gateway.ainvoke(make_prompt(text), user_id=user_id)).strip()
+
+    # 일부 묶음이 실패해도 성공한 부분 요약은 저장한 뒤 예외를 다시 올린다
+    # → 큰 과목에서 호출 하나가 시간 초과돼도 다음 요청은 실패한 묶음만 다시 요약
+    outputs = await asyncio.gather(*(_one(i) for i in todo), return_exceptions=True)
+    failed = [o for o in outputs if isinstance(o, BaseException)]
+    done = 0
+    for i, content in zip(todo, outputs):
+        if isinstance(content, BaseException):
+            continue
+        stored[keys[i]] = content
+        session.add(SummaryPartialTable(
+            vector_index_id=vindex.vector_index_id, level=level,
+            group_key=keys[i], chunk_count=groups[i][1], content=content,
+        ))
+        done += 1
+    if done:
+        await session.commit()
+    if failed:
+        metrics.inc("summary.hierarchical.failed_groups", len(failed))
+        logging.warning(
+            f"[summary-hier] index={vindex.vector_index_id} level={level} "
+            f"failed={len(failed)}/{len(todo)} saved={done}: {failed[0]!r}"
+        )
+        raise failed[0]
+
+    parts = [_Part(stored[k], n) for k, (_, n) in zip(keys, groups)]
+    return parts, len(todo), len(keys) - len(todo)
+
+
+async def summarize_hierarchical(
+    session: AsyncSession,
+    vectordb,
+    vindex: VectorIndexTable,
+    *,
+    topic: str,
+    user_id=None,
+) -> HierarchicalResult:
+    t0 = time.perf_counter()
+    data = await asyncio.to_thread(vectordb.get, include=["documents", "metadatas"])
+    documents, metadatas = data.get("documents") or [], data.get("metadatas") or []
+    leaf = _leaf_groups(documents, metadatas)
+    if not leaf:
+        return HierarchicalResult("", 0, 0, 0, 0)
+
+    level = 0
+    calls = reused = 0
+    parts, c, r = await _run_level(session, vindex, level, [(g, len(g)) for g in leaf], user_id=user_id)
+    calls, reused = calls + c, reused + r
+    while len(parts) > HIER_REDUCE_FANIN:
+        level += 1
+        groups = [
+            ([p.text for p in parts[i:i + HIER_REDUCE_FANIN]], sum(p.chunk_count for p in parts[i:i + HIER_REDUCE_FANIN]))
+            for i in range(0, len(parts), HIER_REDUCE_FANIN)
+        ]
+        parts, c, r = await _run_level(session, vindex, level, groups, user_id=user_id)
+        calls, reused = calls + c, reused + r
+
+    # 마지막: 남은 부분 요약들을 컨텍스트로 주제를 반영한 최종 요약 (summary_prompt 형식 그대로)
+    context = pack_text("\n\n".join(p.text for p in parts), budget=HIER_GROUP_TOKENS, label="hierarchical")
+    content_md = await llm_gateway.ainvoke(summary_prompt.format(context=context, question=topic), user_id=user_id)
+    calls += 1
+
+    took_ms = (time.perf_counter() - t0) * 1000
+    metrics.inc("summary.hierarchical.llm_calls", calls)
+    metrics.inc("summary.hierarchical.reused", reused)
+    logging.info(
+        f"[summary-hier] index={vindex.vector_index_id} chunks={len(documents)} groups={len(leaf)} "
+        f"levels={level + 1} llm_calls={calls} reused={reused} took_ms={took_ms:.1f}"
+    )
+    return HierarchicalResult(content_md, len(documents), level + 1, calls, reused)
@@ -0,0 +1,102 @@
+# services/llm_cache.py
+# ------------------------------------------------------------
+# 결정적(deterministic) LLM 호출용 디스크 캐시 (prompt → response)
+# - 키: (모델, temperature, 스키마, 프롬프트) 해시 + 호출자가 정한 scope(예: 과목 인덱스 버전)
+# - 저장소: SQLite 파일 1개 (여러 워커 프로세스가 같이 써도 안전)
+# - 용량 상한(LLM_CACHE_MAX_MB)을 넘으면 가장 오래 안 쓴 항목부터 삭제(LRU)
+#
+# 게이트웨이에서 opt-in 으로 사용:
+#   await llm_gateway.ainvoke(prompt, schema=SummaryGrade, cache=True, cache_scope=index_scope(vindex))
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./.llm_cache/llm_cache.sqlite3")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+
+def index_scope(index_row) -> str:
+    """과목 인덱스 버전 scope – 새 자료가 업로드되면 버전이 올라가 이전 캐시는 자동으로 안 맞게 된다."""
+    return f"vi{index_row.vector_index_id}:v{index_row.index_version or 0}"
+
+
+class LLMCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_access ON llm_cache(last_access)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(request_key: str, scope: Optional[str] = None) -> str:
+        return hashlib.sha256(f"{request_key}\x00{scope or ''}".encode()).hexdigest()
+
+    # ---- 동기 구현 (스레드에서 실행) ----
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            return row[0]
+
+    def _put(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                # 오래 안 쓴 순서대로, 상한의 90%까지 줄인다 (매 put마다 evict 하지 않도록 여유)
+                target = int(self.max_bytes * 0.9)
+                freed = 0
+                victims = []
+                for k, sz in db.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC"):
+                    if total - freed <= target:
+                        break
+                    victims.append((k,))
+                    freed += sz
+                db.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            db.commit()
+
+    def _clear(self) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM llm_cache")
+            db.commit()
+
+    # ---- async API ----
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._put, key, value)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear)
@@ -0,0 +1,93 @@
+# services/llm_fake.py
+# ------------------------------------------------------------
+# 로컬 가짜 LLM (테스트/부하 실험용, 네트워크·API 키 불필요)
+# - LLM_FAKE=1 이면 ai_service_global 이 Gemini 대신 이 모델을 게이트웨이에 꽂는다
+# - 코드에서 직접: llm_gateway.set_model(FakeChatModel(responses=[...]))
+# ChatGoogleGenerativeAI 중 게이트웨이가 쓰는 부분(ainvoke/astream/with_structured_output)만 흉내낸다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from pydantic import BaseModel
+
+Responder = Union[List[str], Callable[[str], str], None]
+
+
+class FakeChatModel:
+    model = "fake"
+    temperature = 0.0
+
+    def __init__(
+        self,
+        responses: Responder = None,
+        *,
+        structured: Optional[Dict[str, Any]] = None,
+        latency: float = 0.0,
+    ):
+        """
+        responses  : 순환하며 돌려줄 답변 목록 또는 prompt → 답변 함수 (기본: 프롬프트 앞부분 에코)
+        structured : {스키마 클래스명: dict 또는 prompt → dict 함수} (structured output 용)
+        latency    : 호출마다 흉내낼 지연(초)
+        """
+        if isinstance(responses, list):
+            cycle = itertools.cycle(responses or [""])
+            self._respond: Callable[[str], str] = lambda _p: next(cycle)
+        elif callable(responses):
+            self._respond = responses
+        else:
+            self._respond = lambda p: f"[fake] {p.strip()[:200]}"
+        self._structured = structured or {}
+        self.latency = latency
+        self.calls: List[str] = []   # 테스트에서 호출 내용 확인용
+
+    def _answer(self, prompt: Any) -> str:
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        self.calls.append(text)
+        return self._respond(text)
+
+    @staticmethod
+    def _usage(prompt: str, answer: str) -> dict:
+        i, o = len(prompt.split()), len(answer.split())
+        return {"input_tokens": i, "output_tokens": o, "total_tokens": i + o}
+
+    async def ainvoke(self, prompt: Any, *_, **__) -> AIMessage:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        answer = self._answer(prompt)
+        return AIMessage(content=answer, usage_metadata=self._usage(str(prompt), answer))
+
+    async def astream(self, prompt: Any, *_, **__):
+        answer = self._answer(prompt)
+        for word in answer.split(" "):
+            if self.latency:
+                await asyncio.sleep(self.latency / 10)
+            yield AIMessageChunk(content=word + " ")
+
+    def with_structured_output(self, schema: Type[BaseModel], include_raw: bool = False):
+        return _FakeStructured(self, schema, include_raw)
+
+
+class _FakeStructured:
+    def __init__(self, model: FakeChatModel, schema: Type[BaseModel], include_raw: bool):
+        self.model, self.schema, self.include_raw = model, schema, include_raw
+
+    async def ainvoke(self, prompt: Any, *_, **__):
+        raw = await self.model.ainvoke(prompt)
+        spec = self.model._structured.get(self.schema.__name__)
+        if callable(spec):
+            spec = spec(str(prompt))
+        try:
+            parsed = self.schema.model_validate(spec if spec is not None else json.loads(raw.content))
+            error = None
+        except Exception as e:
+            parsed, error = None, e
+        if self.include_raw:
+            return {"raw": raw, "parsed": parsed, "parsing_error": error}
+        if error is not None:
+            raise error
+        return parsed
@@ -0,0 +1,328 @@
+# services/llm_gateway.py
+# ------------------------------------------------------------
+# LLM 게이트웨이
+# - 모든 LLM 호출을 async(ainvoke/astream)로 통일 → 느린 Gemini 호출이 이벤트 루프를 막지 않음
+# - 전역 동시 실행 상한 + 사용자별 동시 실행 상한(세마포어)
+# - 호출별 타임아웃 (초과 시 504)
+# - 토큰 버킷 속도 제한 (LLM_RPM) + 429 를 받으면 버킷 전체를 잠시 멈춤(rate-limit awareness)
+# - 일시적 오류(429/5xx/타임아웃)에 지터 포함 지수 백오프 재시도
+# - 동일 요청 single-flight: 같은 프롬프트가 이미 처리 중이면 새로 부르지 않고 그 결과를 공유
+#   (공유 작업은 전역 슬롯으로 실행, 캐시 저장도 그 작업에서 한 번만)
+# - 호출별 지연시간/토큰 수를 services.metrics 에 기록
+# - (opt-in) 디스크 응답 캐시: cache=True, cache_scope=... (services/llm_cache.py)
+# - set_model() 로 가짜 모델(services/llm_fake.py)을 꽂아 테스트 가능
+#
+# 사용:
+#   from services.ai_service_global import llm_gateway
+#   text  = await llm_gateway.ainvoke(prompt, user_id=user.id)
+#   grade = await llm_gateway.ainvoke(prompt, schema=SummaryGrade)
+#   async for tok in llm_gateway.astream(prompt, user_id=user.id): ...
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from services import metrics
+from services.llm_cache import LLMCache
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))       # 프로세스 전체
+LLM_PER_USER_CONCURRENCY = int(os.getenv("LLM_PER_USER_CONCURRENCY", "4"))  # 사용자 1명
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "90"))
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))                   # 분당 요청 수 상한 (0 = 제한 없음)
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))                # 버킷 용량 (순간 허용량)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "16"))
+
+# 재시도 대상 예외 (google.api_core / httpx 등 구현 패키지를 직접 import 하지 않고 이름으로 판별)
+_RETRYABLE_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted", "ConnectError", "ReadTimeout",
+}
+_RATE_LIMIT_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+
+def _content_text(resp: Any) -> str:
+    """AIMessage/AIMessageChunk → 문자열 (content 가 list 인 경우도 처리)"""
+    content = getattr(resp, "content", resp)
+    if isinstance(content, list):
+        return "".join(p if isinstance(p, str) else str(p.get("text", "")) for p in content)
+    return content if isinstance(content, str) else str(content or "")
+
+
+def _status_code(e: BaseException) -> Optional[int]:
+    for attr in ("code", "status_code"):
+        v = getattr(e, attr, None)
+        v = v() if callable(v) else v
+        v = getattr(v, "value", v)  # grpc StatusCode enum 등
+        if isinstance(v, int):
+            return v
+    return None
+
+
+def _is_rate_limited(e: BaseException) -> bool:
+    return type(e).__name__ in _RATE_LIMIT_NAMES or _status_code(e) == 429 or "429" in str(e)[:200]
+
+
+def _is_retryable(e: BaseException) -> bool:
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    code = _status_code(e)
+    return type(e).__name__ in _RETRYABLE_NAMES or code in (429, 500, 502, 503, 504) or _is_rate_limited(e)
+
+
+class TokenBucket:
+    """
+    rate_per_s 로 토큰이 채워지는 버킷. acquire()는 토큰 1개를 얻을 때까지 기다린다.
+    pause(seconds) 로 외부(429 응답)에서 일정 시간 발급을 멈출 수 있다.
+    """
+
+    def __init__(self, rate_per_s: float, capacity: int):
+        self.rate = rate_per_s
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> float:
+        """대기한 시간(초)을 반환"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:   # 순서대로 발급 (FIFO)
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        model,
+        *,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        per_user_concurrency: int = LLM_PER_USER_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_S,
+        rpm: float = LLM_RPM,
+        burst: int = LLM_BURST,
+        max_retries: int = LLM_MAX_RETRIES,
+        cache: Optional[LLMCache] = None,
+    ):
+        self.model = model
+        self.cache = cache if cache is not None else LLMCache()
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.per_user_concurrency = max(1, per_user_concurrency)
+        self._global = asyncio.Semaphore(max(1, max_concurrency))
+        self.bucket = TokenBucket(rpm / 60.0, burst)
+        # user_id → [semaphore, 사용 중인 호출 수]  (0이 되면 삭제해서 dict가 무한히 커지지 않게)
+        self._users: Dict[str, list] = {}
+        # single-flight: 요청 키 → 진행 중인 Task
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def set_model(self, model) -> None:
+        """실제/가짜 모델 교체 (테스트용 FakeChatModel 등)"""
+        self.model = model
+
+    @property
+    def model_name(self) -> str:
+        return str(getattr(self.model, "model", "") or getattr(self.model, "model_name", "")).removeprefix("models/")
+
+    @property
+    def temperature(self) -> float:
+        return float(getattr(self.model, "temperature", 0.0) or 0.0)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(entry[1] for entry in self._users.values())
+
+    def request_key(self, prompt: Any, schema: Optional[Type[BaseModel]] = None) -> str:
+        """(모델, temperature, 스키마, 프롬프트) 해시"""
+        raw = f"{self.model_name}\x00{self.temperature}\x00{schema.__name__ if schema else ''}\x00{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @asynccontextmanager
+    async def _user_slot(self, user_id: Any = None):
+        """사용자 세마포어만 획득"""
+        key = str(user_id) if user_id is not None else "-"
+        entry = self._users.get(key)
+        if entry is None:
+            entry = self._users[key] = [asyncio.Semaphore(self.per_user_concurrency), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._users.get(key) is entry:
+                del self._users[key]
+
+    @asynccontextmanager
+    async def _slot(self, user_id: Any = None):
+        """사용자 세마포어 → 전역 세마포어 순으로 획득 (한 사용자가 전역 슬롯을 독점하지 못하게)"""
+        async with self._user_slot(user_id):
+            async with self._global:
+                yield
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * (2 ** attempt)))
+
+    def _record_usage(self, raw: Any) -> None:
+        usage = getattr(raw, "usage_metadata", None) or {}
+        if usage:
+            metrics.inc("llm.tokens.input", usage.get("input_tokens", 0) or 0)
+            metrics.inc("llm.tokens.output", usage.get("output_tokens", 0) or 0)
+
+    async def _call_once(self, prompt: Any, schema: Optional[Type[BaseModel]], timeout: float):
+        waited = await self.bucket.acquire()
+        if waited:
+            metrics.observe("llm.ratelimit_wait_ms", waited * 1000)
+        if schema is not None:
+            out = await asyncio.wait_for(
+                self.model.with_structured_output(schema, include_raw=True).ainvoke(prompt), timeout
+            )
+            self._record_usage(out.get("raw"))
+            if out.get("parsed") is None:
+                raise out.get("parsing_error") or ValueError("structured output parsing failed")
+            return out["parsed"]
+        resp = await asyncio.wait_for(self.model.ainvoke(prompt), timeout)
+        self._record_usage(resp)
+        return _content_text(resp)
+
+    async def _call_with_retry(self, prompt: Any, schema: Optional[Type[BaseModel]], timeout: float):
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                result = await self._call_once(prompt, schema, timeout)
+                metrics.observe("llm.latency_ms", (time.perf_counter() - t0) * 1000)
+                metrics.inc("llm.calls.ok")
+                return result
+            except Exception as e:
+                metrics.inc("llm.calls.error")
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise HTTPException(504, "LLM call timed out.")
+                    raise
+                delay = self._backoff(attempt)
+                if _is_rate_limited(e):
+                    metrics.inc("llm.calls.rate_limited")
+                    self.bucket.pause(delay)   # 다른 호출들도 같이 잠시 쉬도록
+                metrics.inc("llm.calls.retried")
+                logging.warning(f"[llm] {type(e).__name__} (attempt {attempt + 1}) → retry in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _produce(
+        self, prompt: Any, schema: Optional[Type[BaseModel]], timeout: float, cache_key: Optional[str], slot,
+    ):
+        """slot 안에서 실제 호출(재시도 포함) 후, 결과를 만든 이 호출만 디스크 캐시에 저장한다."""
+        async with slot:
+            result = await self._call_with_retry(prompt, schema, timeout)
+        if cache_key is not None:
+            await self.cache.put(cache_key, result.model_dump_json() if schema is not None else result)
+        return result
+
+    async def ainvoke(
+        self,
+        prompt: Any,
+        *,
+        user_id: Any = None,
+        schema: Optional[Type[BaseModel]] = None,
+        timeout: Optional[float] = None,
+        coalesce: bool = True,
+        cache: bool = False,
+        cache_scope: Optional[str] = None,
+    ):
+        """
+        schema 가 없으면 응답 문자열, 있으면 structured output(pydantic 객체)을 반환.
+        coalesce=True 면 같은 요청이 이미 진행 중일 때 그 결과를 함께 기다린다.
+        cache=True 면 디스크 캐시를 먼저 보고, 없으면 호출 후 저장한다.
+          (입력이 같으면 결과도 같다고 볼 수 있는 호출에만 사용. cache_scope 에 인덱스 버전 등을 넣으면
+           scope 가 바뀐 뒤에는 이전 항목이 절대 쓰이지 않는다)
+        """
+        timeout = timeout or self.timeout
+        cache_key = None
+        if cache:
+            cache_key = LLMCache.make_key(self.request_key(prompt, schema), cache_scope)
+            hit = await self.cache.get(cache_key)
+            if hit is not None:
+                metrics.inc("llm.cache.hit")
+                return schema.model_validate_json(hit) if schema is not None else hit
+            metrics.inc("llm.cache.miss")
+
+        if not coalesce:
+            return await self._produce(prompt, schema, timeout, cache_key, self._slot(user_id))
+
+        # 공유 작업은 특정 사용자에 묶이지 않게 전역 슬롯만 잡는다.
+        # 사용자별 상한은 호출자마다 결과를 기다리는 동안 자기 사용자 슬롯으로 지킨다.
+        # 타임아웃/캐시 키가 다른 요청끼리는 묶지 않는다 (공유 작업의 타임아웃과 캐시 저장 위치 = 모든 대기자의 요청 값).
+        key = f"{self.request_key(prompt, schema)}:{timeout}:{cache_key or ''}"
+        async with self._user_slot(user_id):
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._produce(prompt, schema, timeout, cache_key, self._global))
+                self._inflight[key] = task
+                task.add_done_callback(lambda t, k=key: self._inflight.pop(k, None) if self._inflight.get(k) is t else None)
+            else:
+                metrics.inc("llm.calls.coalesced")
+            # 한 요청자가 취소돼도 다른 대기자를 위해 실제 호출은 계속되도록 shield
+            return await asyncio.shield(task)
+
+    async def astream(
+        self,
+        prompt: Any,
+        *,
+        user_id: Any = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """토큰 조각(문자열)을 순서대로 yield. timeout 은 스트림 전체 기준 (스트림은 재시도/병합하지 않음)."""
+        loop = asyncio.get_running_loop()
+        async with self._slot(user_id):
+            await self.bucket.acquire()
+            t0 = time.perf_counter()
+            deadline = loop.time() + (timeout or self.timeout)
+            it = self.model.astream(prompt).__aiter__()
+            first = True
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise HTTPException(504, "LLM stream timed out.")
+                try:
+                    chunk = await asyncio.wait_for(it.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise HTTPException(504, "LLM stream timed out.")
+                if first:
+                    metrics.observe("llm.stream.ttft_ms", (time.perf_counter() - t0) * 1000)
+                    first = False
+                self._record_usage(chunk)
+                text = _content_text(chunk)
+                if text:
+                    yield text
+            metrics.observe("llm.stream.total_ms", (time.perf_counter() - t0) * 1000)
+            metrics.inc("llm.calls.ok")
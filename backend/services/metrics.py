@@ -0,0 +1,53 @@
+# services/metrics.py
+# ------------------------------------------------------------
+# 프로세스 내 경량 메트릭 (카운터 + 최근 N개 관측값 분위수)
+# - 외부 모니터링 의존성 없이 /api/metrics 에서 JSON으로 확인
+# - 워커별(프로세스별) 값이다
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+_WINDOW = 1024  # 관측값은 최근 N개만 보관
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_observations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=_WINDOW))
+
+
+def inc(name: str, value: float = 1.0) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        _observations[name].append(float(value))
+
+
+def _quantile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        obs = {k: sorted(v) for k, v in _observations.items()}
+    return {
+        "counters": counters,
+        "observations": {
+            k: {
+                "count": len(v),
+                "p50": round(_quantile(v, 0.50), 3),
+                "p95": round(_quantile(v, 0.95), 3),
+                "p99": round(_quantile(v, 0.99), 3),
+                "max": round(v[-1], 3) if v else 0.0,
+            }
+            for k, v in obs.items()
+        },
+    }
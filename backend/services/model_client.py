@@ -0,0 +1,102 @@
+# services/model_client.py
+# ------------------------------------------------------------
+# 로컬 모델 서버(services/model_server.py) 클라이언트 shim
+# - RemoteEmbeddings : HuggingFaceEmbeddings 대신 쓰는 LangChain Embeddings 구현
+# - RemoteReranker   : CrossEncoder 대신 쓰는 predict(pairs) 구현
+# MODEL_SERVER_SOCKET 이 설정되면 ai_service_global.get_embeddings()/get_reranker()가
+# 이 객체들을 돌려주므로, 호출하는 쪽 코드는 바뀌지 않는다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import json
+import socket
+import threading
+from typing import Any, List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class ModelServerError(RuntimeError):
+    """모델 서버가 에러 응답을 돌려줬을 때"""
+
+
+class ModelServerClient:
+    """
+    Unix 소켓 + 줄 단위 JSON 프로토콜 클라이언트.
+    - 스레드마다 연결 1개를 재사용한다(요청은 run_in_executor 스레드에서 동기 호출됨).
+    - 연결이 끊겼으면 1회 재연결 후 재시도.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 120.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        self._local.file = sock.makefile("rb")
+        return sock
+
+    def _reset(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+        self._local.file = None
+
+    def call(self, op: str, **payload: Any) -> Any:
+        line = (json.dumps({"op": op, **payload}, ensure_ascii=False) + "\n").encode()
+        for attempt in (0, 1):
+            try:
+                sock = getattr(self._local, "sock", None) or self._connect()
+                sock.sendall(line)
+                raw = self._local.file.readline()
+                if not raw:
+                    raise ConnectionError("model server closed the connection")
+                break
+            except OSError:
+                self._reset()
+                if attempt:
+                    raise
+        resp = json.loads(raw)
+        if not resp.get("ok"):
+            raise ModelServerError(resp.get("error", "unknown error"))
+        return resp.get("result")
+
+    def ping(self) -> dict:
+        return self.call("ping")
+
+
+class RemoteEmbeddings(Embeddings):
+    """HuggingFaceEmbeddings 와 같은 인터페이스(embed_documents / embed_query)"""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.client.call("embed", texts=list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class RemoteReranker:
+    """CrossEncoder.predict(pairs) 와 같은 인터페이스 (numpy 배열 반환)"""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def predict(self, pairs: Sequence[Sequence[str]], **_: Any) -> np.ndarray:
+        if not len(pairs):
+            return np.zeros(0, dtype=np.float32)
+        scores = self.client.call("rerank", pairs=[[q, d] for q, d in pairs])
+        return np.asarray(scores, dtype=np.float32)
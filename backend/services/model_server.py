@@ -0,0 +1,107 @@
+# services/model_server.py
+# ------------------------------------------------------------
+# 로컬 추론 사이드카 (임베딩 + CrossEncoder 재정렬)
+#
+# uvicorn --workers N 으로 띄우면 워커마다 임베딩/재정렬 모델을 따로 올려 RAM이 N배가 된다.
+# 이 프로세스 하나가 두 모델을 들고, 모든 워커의 요청을 Unix 소켓으로 받아
+# MicroBatcher로 묶어서(동적 마이크로 배칭) 처리한다.
+#
+# 실행 (backend 폴더에서):
+#   python -m services.model_server --socket /tmp/studyai-models.sock
+# API 서버 쪽:
+#   MODEL_SERVER_SOCKET=/tmp/studyai-models.sock uvicorn main:app --workers 4
+#
+# 프로토콜: 한 줄에 JSON 하나 (요청/응답 모두 '\n' 구분)
+#   {"op": "embed",  "texts": [...]}        → {"ok": true, "result": [[...], ...]}
+#   {"op": "rerank", "pairs": [[q, d], ...]} → {"ok": true, "result": [score, ...]}
+#   {"op": "ping"}                           → {"ok": true, "result": {models, stats}}
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+# 서버 프로세스 자신은 반드시 로컬 모델을 써야 하므로 클라이언트 설정을 제거한 뒤 import
+# (워커와 같은 .env를 쓰는 경우 그 경로를 그대로 listen 주소 기본값으로 사용)
+_CONFIGURED_SOCKET = os.environ.pop("MODEL_SERVER_SOCKET", None)
+
+from services.ai_service_global import get_embeddings, get_reranker, model_status, warmup_models  # noqa: E402
+from services.batching import MicroBatcher  # noqa: E402
+
+DEFAULT_SOCKET = "/tmp/studyai-models.sock"
+_READ_LIMIT = 64 * 1024 * 1024  # 긴 청크 목록도 한 줄로 받을 수 있게
+
+
+def _embed_batch(texts):
+    return get_embeddings().embed_documents(texts)
+
+def _rerank_batch(pairs):
+    return [float(s) for s in get_reranker().predict(pairs)]
+
+
+class ModelServer:
+    def __init__(self, *, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.embed = MicroBatcher(_embed_batch, max_batch=max_batch, max_wait_ms=max_wait_ms, name="embed")
+        self.rerank = MicroBatcher(_rerank_batch, max_batch=max_batch, max_wait_ms=max_wait_ms, name="rerank")
+
+    async def dispatch(self, req: dict):
+        op = req.get("op")
+        if op == "embed":
+            return await self.embed.submit(req.get("texts") or [])
+        if op == "rerank":
+            return await self.rerank.submit([tuple(p) for p in req.get("pairs") or []])
+        if op == "ping":
+            return {
+                "models": model_status(),
+                "stats": {"embed": self.embed.stats(), "rerank": self.rerank.stats()},
+            }
+        raise ValueError(f"unknown op: {op!r}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    result = await self.dispatch(json.loads(line))
+                    resp = {"ok": True, "result": result}
+                except Exception as e:
+                    resp = {"ok": False, "error": repr(e)}
+                writer.write((json.dumps(resp, ensure_ascii=False) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(socket_path: str, *, max_batch: int, max_wait_ms: float) -> None:
+    # 모델을 먼저 올린 뒤 소켓을 열어야 클라이언트의 ping(readiness)이 의미가 있다
+    await asyncio.to_thread(warmup_models, ["embeddings", "reranker"])
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # 이전 실행이 남긴 소켓 파일
+    server_obj = ModelServer(max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server = await asyncio.start_unix_server(server_obj.handle, path=socket_path, limit=_READ_LIMIT)
+    logging.info(f"[model_server] listening on {socket_path}")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="StudyAI local embedding/rerank server")
+    ap.add_argument("--socket", default=_CONFIGURED_SOCKET or DEFAULT_SOCKET)
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms))
+
+
+if __name__ == "__main__":
+    main()
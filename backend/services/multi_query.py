@@ -0,0 +1,128 @@
+# services/multi_query.py
+# ------------------------------------------------------------
+# 스마트 Q&A 멀티 쿼리 검색 (선택 모드)
+# - 복합 질문을 LLM으로 2~4개 하위 질의로 쪼갠다 (짧은 structured 호출 + 디스크 캐시 = 저비용 경로)
+# - 하위 질의 임베딩은 한 번의 배치 호출로 계산하고, 각 질의 검색은 동시에 실행
+#   → 추가 지연은 하위 질의 검색 합이 아니라 가장 느린 1개에 묶인다
+# - 청크 키(document_id, page)로 중복 제거 후 RRF(Reciprocal Rank Fusion)로 합쳐 재정렬 후보를 고른다
+# 재작성 실패/시간 초과 시에는 원래 질문 1개로만 검색한다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+from langchain.schema import Document
+from pydantic import BaseModel, Field
+
+from services.ai_service_global import get_embeddings, llm_gateway
+
+MULTI_QUERY_MAX = int(os.getenv("MULTI_QUERY_MAX", "4"))                 # 하위 질의 최대 개수
+MULTI_QUERY_MIN_WORDS = int(os.getenv("MULTI_QUERY_MIN_WORDS", "4"))     # 이보다 짧은 질문은 재작성 생략
+MULTI_QUERY_TIMEOUT_S = float(os.getenv("MULTI_QUERY_TIMEOUT_S", "8"))   # 재작성 LLM 호출 제한 시간
+RRF_K = int(os.getenv("RRF_K", "60"))                                     # RRF 상수 (관례값 60)
+
+Scored = Tuple[Document, float]
+
+
+class SubQueries(BaseModel):
+    queries: List[str] = Field(description="원래 질문을 나눈 독립적인 검색 질의 목록 (2~4개)")
+
+
+def _rewrite_prompt(question: str) -> str:
+    return f"""
+    다음 질문에 답하려면 강의 자료에서 무엇을 찾아야 하는지, 서로 겹치지 않는 검색 질의로 나누세요.
+    - 질의는 2~{MULTI_QUERY_MAX}개, 각각 한 문장으로 독립적으로 이해되게 작성
+    - 질문이 단순하면 원래 질문 1개만 반환
+
+    질문: {question}
+
+    JSON 형식으로만 답변하세요: {{ "queries": ["...", "..."] }}
+    """
+
+
+async def rewrite_question(question: str, *, user_id=None) -> List[str]:
+    """질문 → 하위 질의 목록 (원래 질문은 포함하지 않음). 실패하면 빈 목록."""
+    if len(question.split()) < MULTI_QUERY_MIN_WORDS:
+        return []
+    try:
+        out: SubQueries = await llm_gateway.ainvoke(
+            _rewrite_prompt(question), schema=SubQueries, user_id=user_id,
+            timeout=MULTI_QUERY_TIMEOUT_S, cache=True,
+        )
+    except Exception as e:
+        logging.warning(f"[multi-query] rewrite failed, single query fallback: {e!r}")
+        return []
+    seen = {question.strip().lower()}
+    subs: List[str] = []
+    for q in out.queries:
+        q = (q or "").strip()
+        if q and q.lower() not in seen:
+            seen.add(q.lower())
+            subs.append(q)
+    return subs[:MULTI_QUERY_MAX]
+
+
+def chunk_key(doc: Document) -> Hashable:
+    """청크 식별자: 업로드 시 붙인 (document_id, page). 메타데이터가 없으면 본문으로 대신한다."""
+    md = doc.metadata or {}
+    if md.get("document_id") is not None and md.get("page") is not None:
+        return (md["document_id"], md["page"])
+    return doc.page_content
+
+
+def rrf_merge(result_lists: Sequence[Sequence[Scored]], k: int = RRF_K) -> List[Scored]:
+    """
+    검색 결과 목록들을 RRF 로 합친다 (중복 청크는 1개로).
+    반환: RRF 순으로 정렬된 (Document, 해당 청크의 최고 dense 점수)
+    """
+    fused: Dict[Hashable, float] = {}
+    best: Dict[Hashable, Scored] = {}
+    for results in result_lists:
+        for rank, (doc, score) in enumerate(results):
+            key = chunk_key(doc)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+    return [best[key] for key in sorted(fused, key=fused.get, reverse=True)]
+
+
+async def multi_query_search(
+    vectordb, question: str, query_vec: List[float], fetch_k: int, *, user_id=None
+) -> Tuple[List[Scored], List[str]]:
+    """
+    원래 질문 검색을 먼저 띄워 두고(재작성과 겹침), 하위 질의를 배치 임베딩 → 동시 검색 → RRF.
+    반환: (RRF 상위 fetch_k 개 (Document, dense 점수), 사용한 하위 질의 목록)
+    """
+    relevance = vectordb._select_relevance_score_fn()
+
+    def _search(vec: List[float]) -> List[Scored]:
+        hits = vectordb.similarity_search_by_vector_with_relevance_scores(vec, k=fetch_k)
+        return [(d, relevance(dist)) for d, dist in hits]
+
+    t0 = time.perf_counter()
+    base_task = asyncio.create_task(asyncio.to_thread(_search, query_vec))
+    try:
+        subs = await rewrite_question(question, user_id=user_id)
+    except BaseException:
+        base_task.cancel()
+        raise
+    rewrite_ms = (time.perf_counter() - t0) * 1000
+    if not subs:
+        return await base_task, []
+
+    sub_vecs = await asyncio.to_thread(lambda: get_embeddings().embed_documents(subs))
+    t1 = time.perf_counter()
+    sub_results = await asyncio.gather(*(asyncio.to_thread(_search, v) for v in sub_vecs))
+    search_ms = (time.perf_counter() - t1) * 1000
+    base = await base_task
+
+    merged = rrf_merge([base, *sub_results])
+    logging.info(
+        f"[multi-query] subs={len(subs)} candidates={sum(map(len, sub_results)) + len(base)} "
+        f"unique={len(merged)} rewrite_ms={rewrite_ms:.1f} search_ms={search_ms:.1f}"
+    )
+    return merged[:fetch_k], subs
@@ -3,7 +3,7 @@
 from PIL import Image, ImageOps, ImageFilter
 from io import BytesIO
 import pytesseract, re, textwrap
-from services.ai_service_global import clean_text, llm
+from services.ai_service_global import clean_text, llm_gateway
 from difflib import SequenceMatcher
 from typing import Dict
 
@@ -32,7 +32,7 @@ def ocr_image_bytes(b: bytes, lang: str = "kor+eng") -> str:
     return clean_text(txt or "")
 
 # LLM 기반 '가벼운' OCR 텍스트 정정기
-def llm_light_fix(text: str) -> str:
+async def llm_light_fix(text: str) -> str:
     """
     한 덩어리 텍스트에 대해 철자/띄어쓰기/문장부호 위주의 경미한 정정만 수행.
     - 의미/사실 추가 금지
@@ -49,8 +49,9 @@ DO NOT add or translate. Preserve formulas. Return ONLY the corrected text.
 [OCR text]
 {text}
 """.strip()
-    resp = llm.invoke(prompt)
-    return clean_text(resp.content or "")
+    # 같은 OCR 조각이면 정정 결과도 같으므로 디스크 캐시 사용
+    resp = await llm_gateway.ainvoke(prompt, cache=True)
+    return clean_text(resp or "")
 
 # 짧은 미리보기(발표·디버그용)
 def _short(s: str, width: int = 88, lines: int = 3) -> str:
@@ -0,0 +1,173 @@
+# services/onnx_backend.py
+# ------------------------------------------------------------
+# CPU 최적화 추론 백엔드 (ONNX Runtime + 동적 int8 양자화)
+# - MODEL_BACKEND=onnx 이면 ai_service_global 이 이 모듈의 객체를 임베딩/재정렬 모델로 사용
+# - 최초 1회 HuggingFace 모델을 ONNX로 export → 동적 int8 양자화 → ONNX_CACHE_DIR 에 저장
+#   이후 기동부터는 디스크의 양자화 모델을 바로 로드
+# - 인터페이스는 기존과 동일
+#     OnnxEmbeddings.embed_documents / embed_query   (HuggingFaceEmbeddings 대체)
+#     OnnxCrossEncoder.predict(pairs)                 (CrossEncoder 대체)
+#
+# 선택 의존성: pip install "optimum[onnxruntime]"
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import logging
+import os
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./.onnx_cache")
+# 양자화 프리셋: avx2(기본, 대부분의 x86) | avx512 | avx512_vnni | arm64 | none(fp32 그대로)
+ONNX_QUANT = os.getenv("ONNX_QUANT", "avx2").strip().lower()
+
+_QUANTIZED_FILE = "model_quantized.onnx"
+_FP32_FILE = "model.onnx"
+
+
+def _require_optimum():
+    try:
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError(
+            "MODEL_BACKEND=onnx requires optimum[onnxruntime]. "
+            'Install it with: pip install "optimum[onnxruntime]"'
+        ) from e
+
+
+def _cache_dir(model_name: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"), ONNX_QUANT)
+
+
+def _export(model_name: str, ort_cls) -> tuple[str, str]:
+    """
+    (model_dir, file_name) 반환. 캐시에 없으면 export + 양자화 후 저장한다.
+    """
+    from transformers import AutoTokenizer
+
+    out_dir = _cache_dir(model_name)
+    file_name = _FP32_FILE if ONNX_QUANT == "none" else _QUANTIZED_FILE
+    if os.path.exists(os.path.join(out_dir, file_name)):
+        return out_dir, file_name
+
+    logging.info(f"[onnx] exporting {model_name} → {out_dir} (quant={ONNX_QUANT})")
+    os.makedirs(out_dir, exist_ok=True)
+    model = ort_cls.from_pretrained(model_name, export=True)
+    model.save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+
+    if ONNX_QUANT != "none":
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        presets = {
+            "avx2": AutoQuantizationConfig.avx2,
+            "avx512": AutoQuantizationConfig.avx512,
+            "avx512_vnni": AutoQuantizationConfig.avx512_vnni,
+            "arm64": AutoQuantizationConfig.arm64,
+        }
+        if ONNX_QUANT not in presets:
+            raise ValueError(f"Unknown ONNX_QUANT preset: {ONNX_QUANT}")
+        qconfig = presets[ONNX_QUANT](is_static=False, per_channel=False)
+        quantizer = ORTQuantizer.from_pretrained(out_dir, file_name=_FP32_FILE)
+        quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+    return out_dir, file_name
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    sentence-transformers 임베딩 모델의 ONNX 버전.
+    all-mpnet-base-v2 파이프라인(Transformer → mean pooling → L2 정규화)을 그대로 재현한다.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, max_length: int = 384):
+        _require_optimum()
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        model_dir, file_name = _export(model_name, ORTModelForFeatureExtraction)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=file_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), self.batch_size):
+            enc = self.tokenizer(
+                list(texts[i:i + self.batch_size]),
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            hidden = self.model(**enc).last_hidden_state            # (B, T, H)
+            mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled)
+        return np.vstack(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+class OnnxCrossEncoder:
+    """
+    CrossEncoder(num_labels=1)의 ONNX 버전.
+    CrossEncoder.predict 와 같게 logit 에 sigmoid 를 적용한 점수를 돌려준다.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, max_length: int = 512):
+        _require_optimum()
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        model_dir, file_name = _export(model_name, ORTModelForSequenceClassification)
+        self.model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def predict(self, pairs: Sequence[Sequence[str]], **_) -> np.ndarray:
+        scores = []
+        for i in range(0, len(pairs), self.batch_size):
+            chunk = pairs[i:i + self.batch_size]
+            enc = self.tokenizer(
+                [p[0] for p in chunk], [p[1] for p in chunk],
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            logits = self.model(**enc).logits[:, 0]
+            scores.append(1.0 / (1.0 + np.exp(-logits)))
+        return np.concatenate(scores).astype(np.float32) if scores else np.zeros(0, dtype=np.float32)
+
+
+# ==============================
+#  정확도 드리프트 점검 (PyTorch 경로 대비)
+# ==============================
+def embedding_drift(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """행별 코사인 유사도 (1.0 이면 동일)"""
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cand = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cos = (ref * cand).sum(axis=1)
+    return {"cos_mean": float(cos.mean()), "cos_min": float(cos.min())}
+
+
+def rerank_drift(reference: np.ndarray, candidate: np.ndarray, group: int, top_n: int = 5) -> dict:
+    """
+    group 개씩(= 질문 1개의 후보 수) 끊어서, 상위 top_n 집합이 얼마나 일치하는지와
+    점수 최대 절대오차를 계산한다.
+    """
+    overlaps = []
+    for i in range(0, len(reference), group):
+        r = set(np.argsort(-reference[i:i + group])[:top_n])
+        c = set(np.argsort(-candidate[i:i + group])[:top_n])
+        overlaps.append(len(r & c) / max(1, len(r)))
+    return {
+        "topn_overlap_mean": float(np.mean(overlaps)) if overlaps else 1.0,
+        "max_abs_diff": float(np.abs(reference - candidate).max()) if len(reference) else 0.0,
+    }
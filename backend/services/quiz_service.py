@@ -1,7 +1,9 @@
 # services/quiz_service.py
 from __future__ import annotations
 from typing import List, Optional, Dict, Union
+import asyncio
 import io
+import logging
 import os
 import random
 import re
@@ -17,16 +19,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from langchain_community.vectorstores import Chroma
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from models.vector_domain import VectorIndexTable 
 from models.document_domain import DocumentTable    # 문서 테이블
 from models.quiz_domain import QuizTable, QuestionBankTable  # 퀴즈 및 문항 테이블
 from models.quiz_domain import AttemptItemTable, QuizAttemptTable  # 문항별 풀이 로그 테이블
-from services.ai_service_global import (
-    _EMBEDDINGS,
-    llm,
-)
+from services.ai_service_global import llm_gateway
+from services.llm_gateway import LLMGateway
+from services.llm_cache import index_scope
+from services.context_packer import CONTEXT_BUDGET_QUIZ, pack_text
+from services.chroma_pool import chroma_pool
+from services.chunk_clusters import ChunkClusters, cluster_cache
 
 class NextRequest(BaseModel):
     quiz_attempt_id: int        # 세트 단위 시도 id
@@ -55,17 +58,6 @@ async def _get_vector_index(session: AsyncSession, user_id: uuid.UUID, subject_i
         raise HTTPException(404, "No vector index for this subject. Upload materials first.")
     return row
 
-def _load_chroma(index_row: VectorIndexTable) -> Chroma:
-    """
-    RDB에 저장된 컬렉션 식별자(이름/경로)로 Chroma를 로드한다.
-    실제 임베딩/검색은 디스크의 persist_dir에서 일어난다.
-    """
-    return Chroma(
-        collection_name=index_row.collection_name,
-        persist_directory=index_row.persist_dir,
-        embedding_function=_EMBEDDINGS,
-    )
-
 def _calc_grade(accuracy: float) -> str:
     # accuracy: 0~100
     if accuracy >= 90:
@@ -118,18 +110,24 @@ class QuizGenerator:
     현재 세션에서 생성한 '임베딩 벡터DB + 청크'를 기반으로 문제를 생성.
     - temp_vectordb 를 사용
     - CONTEXT는 retriever를 통해 유사 청크를 모아서 구성
-    - LLM 구조화 출력으로 JSON 스키마 보장
+    - LLM 구조화 출력으로 JSON 스키마 보장 (게이트웨이 경유 async 호출, 문항들은 동시에 생성)
     """
     def __init__(
         self,
-        llm: ChatGoogleGenerativeAI,
+        llm: LLMGateway,
         vectordb: Chroma,
         source_name: str,
         bm25_threshold: float = 2.0,
         retriever_k: int = 6,
         sample_span: int = 2,
+        user_id=None,
+        cache_scope: Optional[str] = None,
     ):
         self.llm = llm
+        self.user_id = user_id
+        self.cache_scope = cache_scope   # 과목 인덱스 버전 (seed 지정 시 응답 캐시 scope)
+        self._seed: Optional[int] = None
+        self._sampling = "flat"          # 청크 추출 경로 (flat | clusters:k) – seed 캐시 scope 에 포함
         self.vdb = vectordb
         self.source = source_name
         self.retriever = self.vdb.as_retriever(search_kwargs={"k": max(retriever_k, sample_span)})
@@ -162,11 +160,10 @@ class QuizGenerator:
         return m.get((d or "").strip().lower(), d)
 
     # --- LLM 한 문제 생성 ---
-    def _gen_one(self, qid: int, qtype: str, difficulty: str, context: str, source: str) -> QuizQuestion:
+    async def _gen_one(self, qid: int, qtype: str, difficulty: str, context: str, source: str) -> QuizQuestion:
         """
         LLM을 호출해 단일 문항 생성
         """
-        structured = self.llm.with_structured_output(QuizQuestion)
         prompt = f"""
 당신은 학습용 퀴즈 출제자입니다. 아래 CONTEXT의 내용에서만 근거를 찾아 정확히 1개의 문제를 만드세요.    
 
@@ -191,19 +188,27 @@ class QuizGenerator:
 {context}
 [CONTEXT 끝]
 """
-        return structured.invoke(prompt)
+        # seed를 지정한 생성은 (청크, 유형, 난이도, seed, 추출 경로)가 같으면 같은 문항을 돌려주도록 디스크 캐시 사용
+        if self._seed is not None:
+            return await self.llm.ainvoke(
+                prompt, schema=QuizQuestion, user_id=self.user_id,
+                cache=True, cache_scope=f"{self.cache_scope}:seed{self._seed}:{self._sampling}",
+            )
+        return await self.llm.ainvoke(prompt, schema=QuizQuestion, user_id=self.user_id)
 
     # --- 문제 세트 생성 ---
-    def generate(
+    async def generate(
     self,
     user_type: Union[str, List[str]],
     user_difficulty: str,
     docs: List["DocumentTable"],
     n_questions: int = 5,
     random_seed: Optional[int] = None,
+    clusters: Optional[ChunkClusters] = None,
 ) -> QuizSet:
-        if random_seed is not None:
-            random.seed(random_seed)
+        # 요청 전용 난수 생성기 (전역 random 을 seed 하면 await 중 다른 요청이 상태를 바꿔 같은 seed 여도 결과가 달라짐)
+        rng = random.Random(random_seed)
+        self._seed = random_seed
 
         # ✅ 여러 유형 허용
         if isinstance(user_type, str):
@@ -212,10 +217,17 @@ class QuizGenerator:
             qtypes = [self._normalize_type(t) for t in user_type or []]
         diff = self._normalize_diff(user_difficulty)
         
-        # ✅ VectorDB에서 전체 chunk 로드
-        all_data = self.vdb.get(include=["documents", "metadatas"])
-        documents = all_data.get("documents", [])
-        metadatas = all_data.get("metadatas", [])
+        # ✅ VectorDB에서 전체 chunk 로드 (군집 결과가 있으면 거기에 이미 있는 청크를 그대로 사용)
+        # 같은 seed 라도 군집 사용 여부(군집 계산 실패 시 전체 한 묶음)에 따라 추출 순서가 달라지므로
+        # 경로를 캐시 scope 에 넣어 서로 다른 경로의 결과가 섞이지 않게 한다
+        self._sampling = f"clusters{clusters.k}" if clusters is not None else "flat"
+        if clusters is not None:
+            documents, metadatas, labels = clusters.documents, clusters.metadatas, clusters.labels.tolist()
+        else:
+            all_data = await asyncio.to_thread(self.vdb.get, include=["documents", "metadatas"])
+            documents = all_data.get("documents", [])
+            metadatas = all_data.get("metadatas", [])
+            labels = [0] * len(documents)
 
         if not documents:
             raise HTTPException(500, "VectorDB에 저장된 context가 없습니다. 자료를 업로드해주세요.")
@@ -223,43 +235,71 @@ class QuizGenerator:
         # ✅ 사용자가 선택한 document_id만 필터링
         allowed_doc_ids = [d.document_id for d in docs]
         filtered = [
-            (doc, meta) for doc, meta in zip(documents, metadatas)
+            (doc, meta, label) for doc, meta, label in zip(documents, metadatas, labels)
             if meta and meta.get("document_id") in allowed_doc_ids
         ]
         
         if not filtered:
             raise HTTPException(500, "선택된 자료에서 context를 찾을 수 없습니다.")
 
+        # ✅ 군집별로 나눠 돌아가며 뽑기 → 문항이 한 단원에 몰리지 않게 (군집 결과가 없으면 전체가 한 묶음)
+        pools: Dict[int, list] = {}
+        for doc, meta, label in filtered:
+            pools.setdefault(label, []).append((doc, meta))
+        pool_order = list(pools)
+        rng.shuffle(pool_order)
+        picks = 0
+
         items: List[QuizQuestion] = []
         max_trials = n_questions * 5  # 안전장치 (예: 5배 시도 후 중단)
         trials = 0
+        last_error: Exception | None = None
 
+        # 부족한 문항 수만큼 한 라운드에 동시에 생성 (동시성 상한은 게이트웨이가 관리)
         while len(items) < n_questions and trials < max_trials:
-            trials += 1
-            qtype = random.choice(qtypes)   # ✅ 여러 유형 중 랜덤 선택
-            
-            # ✅ 선택된 문서 chunk 중 랜덤 선택
-            doc, meta = random.choice(filtered)
-            context = (doc or "").strip()
-            if len(context) < 50:   # 너무 짧으면 무시
-                continue
-
-            context = context[:1000]  # 잘라내기
-
-            item = self._gen_one(
-                qid=len(items) + 1,   # ⚠️ 현재까지 추가된 개수 기준
-                qtype=qtype,
-                difficulty=diff,
-                context=context,
-                source=self.source,
+            jobs = []
+            while len(jobs) < n_questions - len(items) and trials < max_trials:
+                trials += 1
+                qtype = rng.choice(qtypes)   # ✅ 여러 유형 중 랜덤 선택
+
+                # ✅ 선택된 문서 chunk 중 랜덤 선택 (군집 순서대로 하나씩)
+                doc, meta = rng.choice(pools[pool_order[picks % len(pool_order)]])
+                picks += 1
+                context = (doc or "").strip()
+                if len(context) < 50:   # 너무 짧으면 무시
+                    continue
+
+                context = pack_text(context, budget=CONTEXT_BUDGET_QUIZ, label="quiz")  # 토큰 예산으로 자르기
+                jobs.append((qtype, context))
+
+            results = await asyncio.gather(
+                *(
+                    self._gen_one(
+                        qid=len(items) + i + 1,
+                        qtype=qtype,
+                        difficulty=diff,
+                        context=context,
+                        source=self.source,
+                    )
+                    for i, (qtype, context) in enumerate(jobs)
+                ),
+                return_exceptions=True,
             )
 
-            # 객관식 옵션 검증
-            if qtype == "객관식" and (not item.options or len(item.options) != 4):
-                continue
-
-            items.append(item)
-            
+            for (qtype, _), item in zip(jobs, results):
+                if isinstance(item, Exception):
+                    last_error = item
+                    continue
+                if len(items) >= n_questions:
+                    continue
+                # 객관식 옵션 검증
+                if qtype == "객관식" and (not item.options or len(item.options) != 4):
+                    continue
+                item.id = len(items) + 1   # ⚠️ 현재까지 추가된 개수 기준
+                items.append(item)
+
+        if not items and last_error is not None:
+            raise last_error
         if len(items) < n_questions:
             raise HTTPException(
                 500, f"요청한 {n_questions}문제 중 {len(items)}문제만 생성되었습니다."
@@ -279,6 +319,7 @@ async def generate_quiz_for_subject(
     difficulty: str,
     num_questions: int,
     model_name: str | None = None,
+    random_seed: Optional[int] = None,
 ) -> Dict[str, any]:
     """
     주어진 과목(subject_id)에 대해 퀴즈를 생성하고 DB에 저장
@@ -287,7 +328,7 @@ async def generate_quiz_for_subject(
     """
     # 1. 인덱스 로드
     vindex = await _get_vector_index(session, user_id, subject_id)
-    temp_vectordb = _load_chroma(vindex)
+    temp_vectordb = await chroma_pool.get(vindex)
             
     # ✅ 선택된 문서 메타 조회 (VectorDB 필터용)
     q = select(DocumentTable).where(DocumentTable.subject_id == subject_id)
@@ -302,14 +343,26 @@ async def generate_quiz_for_subject(
 
     # 3) LLM 초기화 & 문제 생성
     gen = QuizGenerator(
-                llm=llm,
+                llm=llm_gateway,
                 vectordb=temp_vectordb,
                 source_name=source_name,
                 bm25_threshold=2.0,    # BM25 설치 시 가벼운 신뢰도 점검
                 retriever_k=6,
                 sample_span=2,
+                user_id=user_id,
+                cache_scope=index_scope(vindex),
             )
-    quiz_set = gen.generate(user_type=qtype, user_difficulty=difficulty, docs=docs, n_questions=num_questions)
+    # 과목 청크 군집 (요약 diverse 모드와 같은 캐시를 공유, 실패하면 군집 없이 진행)
+    try:
+        clusters = await cluster_cache.get(vindex, temp_vectordb)
+    except Exception as e:
+        logging.warning(f"[quiz] chunk clustering failed, sampling without clusters: {e!r}")
+        clusters = None
+
+    quiz_set = await gen.generate(
+        user_type=qtype, user_difficulty=difficulty, docs=docs,
+        n_questions=num_questions, random_seed=random_seed, clusters=clusters,
+    )
 
     # 4) QuizTable 저장
     new_quiz = QuizTable(
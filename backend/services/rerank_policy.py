@@ -0,0 +1,110 @@
+# services/rerank_policy.py
+# ------------------------------------------------------------
+# 적응형 재정렬 정책 (chat 용)
+# dense 검색 점수 간격(margin)과 재정렬 배치 큐 깊이를 보고 CrossEncoder 사용량을 조절한다.
+#
+#   skip : 1등이 2등보다 확실히 앞서면 재정렬 생략 → dense 순서 그대로 사용
+#   band : 부하가 높으면 top_n 경계 근처(애매한 구간)만 재정렬
+#   full : 기본. 후보 전체 재정렬
+#   wide : 부하가 낮으면 후보를 더 많이(RERANK_WIDE_K) 가져와 전체 재정렬
+#
+# 결정마다 [rerank-policy] 로그에 재정렬한 쌍 수와 절약된 지연시간 추정치를 남긴다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+from langchain.schema import Document
+
+from services.rerank_service import rerank_queue_depth, rerank_scores
+
+RERANK_POLICY = os.getenv("RERANK_POLICY", "adaptive").strip().lower()   # adaptive | always
+RERANK_K = int(os.getenv("RERANK_K", "8"))                 # 기본 후보 수 (기존 k=8)
+RERANK_WIDE_K = int(os.getenv("RERANK_WIDE_K", "16"))      # 저부하 시 후보 수
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.15"))  # 1·2등 relevance 차이
+RERANK_SKIP_MIN_TOP = float(os.getenv("RERANK_SKIP_MIN_TOP", "0.5"))  # skip 하려면 1등 점수 하한
+RERANK_BAND = float(os.getenv("RERANK_BAND", "0.05"))      # 경계 점수 ± band 를 '애매한 구간'으로 봄
+RERANK_LOW_DEPTH = int(os.getenv("RERANK_LOW_DEPTH", "0"))     # 큐 깊이 ≤ 이 값이면 저부하
+RERANK_HIGH_DEPTH = int(os.getenv("RERANK_HIGH_DEPTH", "64"))  # 큐 깊이 ≥ 이 값이면 고부하
+
+# 쌍(pair) 1개당 재정렬 비용(ms)의 지수이동평균 – 절약 시간 추정용
+_cost_per_pair_ms = 10.0
+_EMA_ALPHA = 0.2
+
+
+@dataclass
+class RerankDecision:
+    action: str                 # skip | band | full | wide
+    rerank_idx: List[int]       # 재정렬할 후보 인덱스 (dense 순)
+    keep_idx: List[int]         # 재정렬 없이 상위로 확정된 후보 인덱스
+    depth: int
+    reason: str
+
+
+def choose_fetch_k() -> int:
+    """검색 전에 호출: 저부하면 후보를 넓게 가져온다."""
+    if RERANK_POLICY == "adaptive" and rerank_queue_depth() <= RERANK_LOW_DEPTH:
+        return max(RERANK_K, RERANK_WIDE_K)
+    return RERANK_K
+
+
+def decide(scores: Sequence[float], top_n: int, depth: int) -> RerankDecision:
+    """scores 는 dense relevance 점수(내림차순 정렬된 후보 기준)."""
+    n = len(scores)
+    all_idx = list(range(n))
+    if RERANK_POLICY != "adaptive" or n <= 1:
+        return RerankDecision("full", all_idx, [], depth, "policy=always")
+
+    margin = scores[0] - scores[1]
+    if margin >= RERANK_SKIP_MARGIN and scores[0] >= RERANK_SKIP_MIN_TOP:
+        return RerankDecision("skip", [], all_idx[:top_n], depth, f"margin={margin:.3f}")
+
+    if depth >= RERANK_HIGH_DEPTH and n > top_n:
+        cutoff = scores[top_n - 1]
+        keep = [i for i in all_idx if scores[i] > cutoff + RERANK_BAND]
+        band = [i for i in all_idx if cutoff - RERANK_BAND <= scores[i] <= cutoff + RERANK_BAND]
+        if len(keep) < top_n and len(band) > 1:
+            return RerankDecision("band", band, keep, depth, f"cutoff={cutoff:.3f}")
+
+    action = "wide" if n > RERANK_K else "full"
+    return RerankDecision(action, all_idx, [], depth, f"margin={margin:.3f}")
+
+
+async def adaptive_rerank(
+    question: str, scored_docs: Sequence[Tuple[Document, float]], top_n: int = 5
+) -> List[Document]:
+    """
+    (Document, dense 점수) 목록을 받아 정책에 따라 재정렬한 상위 top_n 문서를 돌려준다.
+    """
+    global _cost_per_pair_ms
+    ranked = sorted(scored_docs, key=lambda x: x[1], reverse=True)
+    docs = [d for d, _ in ranked]
+    dec = decide([s for _, s in ranked], top_n, rerank_queue_depth())
+
+    rerank_ms = 0.0
+    if dec.rerank_idx:
+        t0 = time.perf_counter()
+        scores = await rerank_scores(question, [docs[i] for i in dec.rerank_idx])
+        rerank_ms = (time.perf_counter() - t0) * 1000
+        _cost_per_pair_ms += _EMA_ALPHA * (rerank_ms / len(dec.rerank_idx) - _cost_per_pair_ms)
+        by_score = [i for i, _ in sorted(zip(dec.rerank_idx, scores), key=lambda x: x[1], reverse=True)]
+    else:
+        by_score = []
+
+    out_idx = dec.keep_idx + by_score
+    # band 결정에서 후보가 모자라면 남은 후보를 dense 순으로 채운다
+    out_idx += [i for i in range(len(docs)) if i not in out_idx]
+    out_idx = out_idx[:top_n]
+
+    # 기준선: 기존 방식대로 RERANK_K 개를 전부 재정렬했을 때의 비용
+    baseline_pairs = min(len(docs), RERANK_K)
+    saved_ms = (baseline_pairs - len(dec.rerank_idx)) * _cost_per_pair_ms
+    logging.info(
+        f"[rerank-policy] action={dec.action} pairs={len(dec.rerank_idx)}/{len(docs)} "
+        f"depth={dec.depth} {dec.reason} rerank_ms={rerank_ms:.1f} saved_ms={saved_ms:.1f}"
+    )
+    return [docs[i] for i in out_idx]
@@ -0,0 +1,141 @@
+# services/search_service.py
+# ------------------------------------------------------------
+# 과목 통합 검색 (사용자의 모든 과목 컬렉션을 한 번에)
+# 1) 질의 임베딩은 1회만 계산
+# 2) 사용자의 모든 vector_indexes 컬렉션을 동시에 검색 (최대 CROSS_SEARCH_FANOUT 개씩, 컬렉션별 제한 시간, 늦은 과목은 결과에서 제외)
+# 3) 컬렉션마다 거리 공간/점수 분포가 달라도 비교되도록, 저장된 청크 임베딩과의 코사인 유사도로 다시 점수화
+# 4) 점수순 병합 → 과목명/문서 제목을 붙여 반환
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.document_domain import DocumentTable
+from models.subject_domain import SubjectTable
+from models.vector_domain import VectorIndexTable
+from services import metrics
+from services.ai_service_global import get_embeddings
+from services.chroma_pool import CHROMA_HANDLE_CAP, chroma_pool
+
+CROSS_SEARCH_K = int(os.getenv("CROSS_SEARCH_K", "5"))                      # 컬렉션당 후보 수
+CROSS_SEARCH_TIMEOUT_S = float(os.getenv("CROSS_SEARCH_TIMEOUT_S", "3"))    # 컬렉션당 제한 시간
+# 한 요청에서 동시에 열고/검색하는 컬렉션 수 (과목이 많아도 콜드 오픈이 스레드 풀을 한꺼번에 차지하지 않게, 핸들 풀 상한 이하)
+CROSS_SEARCH_FANOUT = max(1, min(int(os.getenv("CROSS_SEARCH_FANOUT", "8")), CHROMA_HANDLE_CAP))
+CROSS_SEARCH_SNIPPET = 240
+
+
+def _query_collection(handle, query_vec: np.ndarray, k: int) -> List[dict]:
+    """컬렉션 1개 검색 (스레드에서 실행). 코사인 점수를 직접 계산하려고 임베딩도 같이 받는다."""
+    res = handle._collection.query(
+        query_embeddings=[query_vec.tolist()],
+        n_results=k,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    docs = (res.get("documents") or [[]])[0]
+    metas = (res.get("metadatas") or [[]])[0]
+    embs = res.get("embeddings")
+    embs = embs[0] if embs is not None and len(embs) else []
+    if not len(docs):
+        return []
+    m = np.asarray(embs, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1)
+    scores = (m @ query_vec) / np.where(norms > 0, norms, 1.0)
+    return [
+        {"text": t, "metadata": md or {}, "score": float(s)}
+        for t, md, s in zip(docs, metas, scores)
+    ]
+
+
+async def search_all_subjects(
+    db: AsyncSession, *, user_id: uuid.UUID, query: str, top_n: int = 10,
+    timeout_s: Optional[float] = None,
+) -> dict:
+    t0 = time.perf_counter()
+    timeout_s = timeout_s or CROSS_SEARCH_TIMEOUT_S
+
+    indexes = (await db.execute(
+        select(VectorIndexTable).where(VectorIndexTable.user_id == user_id)
+    )).scalars().all()
+    if not indexes:
+        return {"query": query, "results": [], "searched": 0, "timed_out": [], "failed": [], "took_ms": 0.0}
+
+    q = np.asarray(await asyncio.to_thread(lambda: get_embeddings().embed_query(query)), dtype=np.float32)
+    n = np.linalg.norm(q)
+    q = q / n if n > 0 else q
+
+    fanout = asyncio.Semaphore(CROSS_SEARCH_FANOUT)
+
+    async def _one(vindex: VectorIndexTable) -> List[dict]:
+        async def _run() -> List[dict]:
+            handle = await chroma_pool.get(vindex)
+            return await asyncio.to_thread(_query_collection, handle, q, CROSS_SEARCH_K)
+        # 제한 시간은 차례가 온 뒤부터 (대기 중인 과목이 순서 때문에 시간 초과되지 않게)
+        async with fanout:
+            hits = await asyncio.wait_for(_run(), timeout=timeout_s)
+        for h in hits:
+            h["subject_id"] = vindex.subject_id
+        return hits
+
+    results = await asyncio.gather(*(_one(v) for v in indexes), return_exceptions=True)
+
+    hits: List[dict] = []
+    timed_out: List[int] = []
+    failed: List[int] = []
+    for vindex, res in zip(indexes, results):
+        if isinstance(res, asyncio.TimeoutError):
+            timed_out.append(vindex.subject_id)
+        elif isinstance(res, Exception):
+            logging.warning(f"[cross-search] subject={vindex.subject_id} failed: {res!r}")
+            failed.append(vindex.subject_id)
+        else:
+            hits.extend(res)
+    metrics.inc("search.collections", len(indexes))
+    metrics.inc("search.timeouts", len(timed_out))
+
+    hits.sort(key=lambda h: h["score"], reverse=True)
+    hits = hits[:top_n]
+
+    # 과목명 / 문서 제목 붙이기
+    subject_ids = {h["subject_id"] for h in hits}
+    doc_ids = {h["metadata"].get("document_id") for h in hits} - {None}
+    subject_names = dict((await db.execute(
+        select(SubjectTable.subject_id, SubjectTable.name).where(SubjectTable.subject_id.in_(subject_ids))
+    )).all()) if subject_ids else {}
+    doc_titles = dict((await db.execute(
+        select(DocumentTable.document_id, DocumentTable.title).where(DocumentTable.document_id.in_(doc_ids))
+    )).all()) if doc_ids else {}
+
+    took_ms = (time.perf_counter() - t0) * 1000
+    metrics.observe("search.latency_ms", took_ms)
+    logging.info(
+        f"[cross-search] collections={len(indexes)} hits={len(hits)} "
+        f"timed_out={len(timed_out)} failed={len(failed)} took_ms={took_ms:.1f}"
+    )
+    return {
+        "query": query,
+        "results": [
+            {
+                "subject_id": h["subject_id"],
+                "subject_name": subject_names.get(h["subject_id"]),
+                "document_id": h["metadata"].get("document_id"),
+                "document_title": doc_titles.get(h["metadata"].get("document_id"), h["metadata"].get("source")),
+                "page": h["metadata"].get("page"),
+                "score": round(h["score"], 4),
+                "snippet": h["text"][:CROSS_SEARCH_SNIPPET],
+            }
+            for h in hits
+        ],
+        "searched": len(indexes),
+        "timed_out": timed_out,
+        "failed": failed,
+        "took_ms": round(took_ms, 1),
+    }
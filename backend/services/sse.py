@@ -0,0 +1,22 @@
+# services/sse.py
+# Server-Sent Events 포맷 헬퍼 (스트리밍 엔드포인트 공용)
+import json
+from typing import AsyncIterator, Tuple
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",   # nginx 등 프록시 버퍼링 방지
+}
+
+def format_sse(event: str, data: dict) -> str:
+    """event: <name>\\ndata: <json>\\n\\n"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+async def sse_stream(events: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[str]:
+    """(event, data) 제너레이터를 SSE 문자열 스트림으로 변환. 예외는 error 이벤트로 전달."""
+    try:
+        async for event, data in events:
+            yield format_sse(event, data)
+    except Exception as e:
+        detail = getattr(e, "detail", None) or repr(e)
+        yield format_sse("error", {"detail": detail})
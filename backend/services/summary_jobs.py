@@ -0,0 +1,310 @@
+# services/summary_jobs.py
+# ------------------------------------------------------------
+# 백그라운드 요약 작업 (큰 과목에서 프록시 타임아웃으로 요청이 통째로 사라지는 문제 대응)
+# - submit_job(): summary_jobs 에 queued 로 기록하고 job_id 를 바로 반환, 생성은 워커 태스크가 진행
+# - 워커 동시 실행 수는 SUMMARY_JOB_CONCURRENCY 로 제한 (나머지는 queued 로 대기)
+# - rag/digest 모드는 stream_subject_summary 를 그대로 돌려 진행 이벤트(token/grade/...)를 구독자에게 전달,
+#   hierarchical 은 create_subject_summary 로 실행
+# - 결과는 summaries 행(summary_id)으로 저장 → 폴링(GET) 또는 SSE 구독으로 언제든 다시 받을 수 있다
+# - 실행은 조건부 UPDATE(queued 이거나 생존 신호가 끊긴 running 일 때만)로 선점 → 여러 워커여도 작업당 1번만 실행
+#   실행 중에는 heartbeat_at 을 주기적으로 갱신하고, 재시작/주기 점검 때는 queued 와 생존 신호가 끊긴 running 만 다시 실행
+# 구독 이벤트는 이 프로세스에서 도는 작업만 실시간으로 받고, 다른 워커의 작업은 DB 상태를 주기적으로 읽어 전달한다.
+# ------------------------------------------------------------
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, update
+
+from models.summary_domain import SummaryJobTable, SummaryTable, SummaryType
+from routers.auth import async_session
+from services import metrics
+from services.summary_service import _get_vector_index, create_subject_summary, stream_subject_summary
+
+SUMMARY_JOB_CONCURRENCY = int(os.getenv("SUMMARY_JOB_CONCURRENCY", "2"))
+SUMMARY_JOB_POLL_S = float(os.getenv("SUMMARY_JOB_POLL_S", "2"))     # 구독 시 DB 상태 재확인 주기(초)
+SUMMARY_JOB_HEARTBEAT_S = float(os.getenv("SUMMARY_JOB_HEARTBEAT_S", "15"))   # 실행 중 생존 신호 갱신 주기(초)
+SUMMARY_JOB_STALE_S = float(os.getenv("SUMMARY_JOB_STALE_S", "90"))           # 이보다 오래 신호 없는 running 은 다른 워커가 가져감
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[:64]
+
+_TERMINAL = ("done", "failed")
+_sem = asyncio.Semaphore(max(1, SUMMARY_JOB_CONCURRENCY))
+_tasks: Dict[int, asyncio.Task] = {}                  # job_id → 워커 태스크 (참조 유지 + 중복 실행 방지)
+_subscribers: Dict[int, Set[asyncio.Queue]] = {}      # job_id → 구독 큐
+
+
+def _publish(job_id: int, event: str, data: dict) -> None:
+    for q in list(_subscribers.get(job_id, ())):
+        q.put_nowait((event, data))
+
+
+async def _update(job_id: int, **fields) -> Optional[SummaryJobTable]:
+    async with async_session() as db:
+        job = await db.get(SummaryJobTable, job_id)
+        if job is None:
+            return None
+        for k, v in fields.items():
+            setattr(job, k, v)
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+
+async def job_payload(db, job: SummaryJobTable) -> dict:
+    """상태 응답/SSE 이벤트 공용 형태. 완료된 작업은 요약 본문도 포함."""
+    out = {
+        "job_id": job.job_id,
+        "status": job.status,
+        "stage": job.stage,
+        "subject_id": job.subject_id,
+        "topic": job.topic,
+        "type": job.type,
+        "mode": job.mode,
+        "summary_id": job.summary_id,
+        "ok": None,
+        "reason": None,
+        "summary": None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.summary_id is not None:
+        row = await db.get(SummaryTable, job.summary_id)
+        if row is not None:
+            out.update(ok=row.ok, reason=row.reason, summary=row.content_md)
+    return out
+
+
+# ---------- 워커 ----------
+_STAGES = {"retrieval": "generating", "grade": "grading", "resummarize": "resummarizing"}
+
+
+def _claimable(now: datetime):
+    """queued 이거나, running 인데 생존 신호가 SUMMARY_JOB_STALE_S 넘게 끊긴 작업"""
+    stale_before = now - timedelta(seconds=SUMMARY_JOB_STALE_S)
+    return or_(
+        SummaryJobTable.status == "queued",
+        and_(
+            SummaryJobTable.status == "running",
+            or_(SummaryJobTable.heartbeat_at.is_(None), SummaryJobTable.heartbeat_at < stale_before),
+        ),
+    )
+
+
+async def _claim(job_id: int) -> Optional[SummaryJobTable]:
+    """조건부 UPDATE 로 작업을 이 워커 것으로 선점. 다른 워커가 이미 가져갔으면 None."""
+    now = datetime.utcnow()
+    async with async_session() as db:
+        res = await db.execute(
+            update(SummaryJobTable)
+            .where(SummaryJobTable.job_id == job_id, _claimable(now))
+            .values(status="running", stage="retrieving", owner=WORKER_ID, heartbeat_at=now,
+                    started_at=now, error=None)
+        )
+        await db.commit()
+        if res.rowcount != 1:
+            return None
+        return await db.get(SummaryJobTable, job_id)
+
+
+async def _finish(job_id: int, **fields) -> Optional[SummaryJobTable]:
+    """이 워커가 아직 소유한 작업만 종료 상태로 기록 (그 사이 다른 워커가 가져갔으면 덮어쓰지 않음)."""
+    async with async_session() as db:
+        await db.execute(
+            update(SummaryJobTable)
+            .where(SummaryJobTable.job_id == job_id, SummaryJobTable.owner == WORKER_ID)
+            .values(finished_at=datetime.utcnow(), stage=None, **fields)
+        )
+        await db.commit()
+        return await db.get(SummaryJobTable, job_id)
+
+
+async def _heartbeat(job_id: int) -> None:
+    while True:
+        await asyncio.sleep(SUMMARY_JOB_HEARTBEAT_S)
+        try:
+            async with async_session() as db:
+                await db.execute(
+                    update(SummaryJobTable)
+                    .where(SummaryJobTable.job_id == job_id, SummaryJobTable.owner == WORKER_ID,
+                           SummaryJobTable.status == "running")
+                    .values(heartbeat_at=datetime.utcnow())
+                )
+                await db.commit()
+        except Exception as e:
+            logging.warning(f"[summary-job] job={job_id} heartbeat failed: {e!r}")
+
+
+async def _run(job_id: int) -> None:
+    async with _sem:
+        job = await _claim(job_id)
+        if job is None:
+            return   # 다른 워커가 실행 중이거나 이미 끝남
+        beat = asyncio.create_task(_heartbeat(job_id))
+        _publish(job_id, "status", {"job_id": job_id, "status": "running", "stage": "retrieving"})
+        metrics.inc("summary.jobs.started")
+        try:
+            if job.mode == "hierarchical":
+                async with async_session() as db:
+                    result = await create_subject_summary(
+                        db, user_id=job.user_id, subject_id=job.subject_id, topic=job.topic,
+                        type_=SummaryType(job.type), mode=job.mode, force=job.force, diverse=job.diverse,
+                    )
+            else:
+                result = None
+                events = stream_subject_summary(
+                    user_id=job.user_id, subject_id=job.subject_id, topic=job.topic,
+                    type_=SummaryType(job.type), mode=job.mode, force=job.force, diverse=job.diverse,
+                )
+                async for event, data in events:
+                    if event == "done":
+                        result = data
+                        continue
+                    _publish(job_id, event, data)
+                    stage = _STAGES.get(event)
+                    if stage is not None:
+                        round_ = data.get("round")
+                        await _update(job_id, stage=stage if round_ is None else f"{stage}:{round_}")
+                if result is None:
+                    raise RuntimeError("summary stream ended without a result")
+            job = await _finish(job_id, status="done", summary_id=result["summary_id"])
+            metrics.inc("summary.jobs.done")
+        except Exception as e:
+            detail = getattr(e, "detail", None) or repr(e)
+            logging.warning(f"[summary-job] job={job_id} failed: {detail}")
+            job = await _finish(job_id, status="failed", error=str(detail)[:2000])
+            metrics.inc("summary.jobs.failed")
+        finally:
+            beat.cancel()
+
+        async with async_session() as db:
+            payload = await job_payload(db, job)
+        # 그 사이 다른 워커가 가져간 경우(생존 신호 지연) 종료 이벤트 대신 현재 상태만 알린다
+        _publish(job_id, job.status if job.status in _TERMINAL else "status", payload)
+
+
+def _start(job_id: int) -> None:
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    task = asyncio.create_task(_run(job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _t: _tasks.pop(job_id, None))
+
+
+# ---------- 공개 API ----------
+async def submit_job(
+    db, *, user_id: uuid.UUID, subject_id: int, topic: str, type_: str,
+    mode: str = "rag", force: bool = False, diverse: bool = False,
+) -> SummaryJobTable:
+    """작업 등록 후 바로 반환 (인덱스가 없는 과목은 대기열에 넣지 않고 바로 404)."""
+    await _get_vector_index(db, user_id, subject_id)
+    job = SummaryJobTable(
+        user_id=user_id, subject_id=subject_id, topic=topic, type=type_,
+        mode=mode, force=force, diverse=diverse, status="queued",
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    metrics.inc("summary.jobs.submitted")
+    _start(job.job_id)
+    return job
+
+
+async def get_job(db, job_id: int, user_id: uuid.UUID) -> SummaryJobTable:
+    job = await db.get(SummaryJobTable, job_id)
+    if job is None or str(job.user_id) != str(user_id):
+        raise HTTPException(404, "Summary job not found.")
+    return job
+
+
+async def subscribe_job(job_id: int, user_id: uuid.UUID) -> AsyncIterator[tuple[str, dict]]:
+    """
+    (event, data) async generator – 라우터가 SSE로 변환한다.
+      status : 현재 상태 (구독 직후 1회 + 다른 워커 작업은 상태가 바뀔 때마다)
+      retrieval / token / grade / resummarize / draft : 진행 중 이벤트 (이 프로세스에서 도는 작업만)
+      done | failed : 최종 상태 (done 이면 summary_id 와 요약 본문 포함) → 스트림 종료
+    이미 끝난 작업이면 최종 이벤트만 보내고 끝난다 (연결이 끊긴 뒤 결과 회수용).
+    """
+    q: asyncio.Queue = asyncio.Queue()
+    _subscribers.setdefault(job_id, set()).add(q)   # 상태를 읽기 전에 등록 → 그 사이 이벤트도 놓치지 않음
+    try:
+        async with async_session() as db:
+            job = await get_job(db, job_id, user_id)
+            payload = await job_payload(db, job)
+        if job.status in _TERMINAL:
+            yield job.status, payload
+            return
+        yield "status", payload
+        last = (job.status, job.stage)
+
+        while True:
+            try:
+                event, data = await asyncio.wait_for(q.get(), SUMMARY_JOB_POLL_S)
+            except asyncio.TimeoutError:
+                # 다른 워커에서 도는 작업(또는 놓친 종료)을 위해 DB 상태 재확인
+                async with async_session() as db:
+                    job = await get_job(db, job_id, user_id)
+                    payload = await job_payload(db, job)
+                if job.status in _TERMINAL:
+                    yield job.status, payload
+                    return
+                if (job.status, job.stage) != last:
+                    last = (job.status, job.stage)
+                    yield "status", payload
+                continue
+            yield event, data
+            if event in _TERMINAL:
+                return
+    finally:
+        subs = _subscribers.get(job_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                _subscribers.pop(job_id, None)
+
+
+async def _resume_orphans() -> int:
+    """queued 작업과 생존 신호가 끊긴 running 작업을 이 워커에서 실행 (실제 실행 여부는 _claim 이 결정)."""
+    async with async_session() as db:
+        ids = (await db.execute(
+            select(SummaryJobTable.job_id).where(_claimable(datetime.utcnow())).order_by(SummaryJobTable.job_id)
+        )).scalars().all()
+    ids = [i for i in ids if i not in _tasks]
+    for job_id in ids:
+        _start(job_id)
+    return len(ids)
+
+
+async def _sweep_loop() -> None:
+    # 재시작 직후에는 죽은 워커의 생존 신호가 아직 최신일 수 있으므로 주기적으로 다시 확인
+    while True:
+        await asyncio.sleep(SUMMARY_JOB_STALE_S)
+        try:
+            n = await _resume_orphans()
+            if n:
+                logging.info(f"[summary-job] picked up {n} orphaned jobs")
+        except Exception as e:
+            logging.warning(f"[summary-job] sweep failed: {e!r}")
+
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+async def resume_summary_jobs() -> None:
+    """서버 시작 시: 끝나지 못한 작업 중 다른 워커가 실행 중이지 않은 것만 다시 실행하고, 주기 점검 시작."""
+    global _sweeper
+    n = await _resume_orphans()
+    if n:
+        logging.info(f"[summary-job] resumed {n} unfinished jobs")
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_loop())
@@ -1,22 +1,36 @@
 # services/summary_service.py
-from typing import Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
 import uuid
 
 from fastapi import HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_community.vectorstores import Chroma
-from langchain.chains import RetrievalQA
 
 from models.summary_domain import SummaryTable, SummaryType
 from models.vector_domain import VectorIndexTable  # (이미 만들었던 vector_indexes 테이블)
 from services.ai_service_global import (
-    _EMBEDDINGS,
-    llm,
+    llm_gateway,
     summary_prompt,
     refine_with_crag,
 )
+from routers.auth import async_session
+from services.llm_cache import index_scope
+from services import metrics
+from services.context_packer import CONTEXT_BUDGET_SUMMARY, pack_context
+from services.context_compressor import SUMMARY_COMPRESS, compress_context
+from services.chroma_pool import chroma_pool
+from services.chunk_clusters import cluster_cache, diverse_documents
+from services.hierarchical_summary import summarize_hierarchical
+from services.document_digest import compose_context, subject_digests
+from langchain.schema import Document
 
 async def _get_vector_index(session: AsyncSession, user_id: uuid.UUID, subject_id: int) -> VectorIndexTable:
     """user+subject 에 해당하는 인덱스 1행을 가져온다(없으면 404)."""
@@ -32,16 +46,38 @@ async def _get_vector_index(session: AsyncSession, user_id: uuid.UUID, subject_i
         raise HTTPException(404, "No vector index for this subject. Upload materials first.")
     return row
 
-def _load_chroma(index_row: VectorIndexTable) -> Chroma:
-    """
-    RDB에 저장된 컬렉션 식별자(이름/경로)로 Chroma를 로드한다.
-    실제 임베딩/검색은 디스크의 persist_dir에서 일어난다.
-    """
-    return Chroma(
-        collection_name=index_row.collection_name,
-        persist_directory=index_row.persist_dir,
-        embedding_function=_EMBEDDINGS,
-    )
+_TOPIC_SPACES = re.compile(r"\s+")
+_TOPIC_TRAILING = re.compile(r"[\s.!?~。]+$")
+
+
+def _normalize_topic(topic: str) -> str:
+    """대소문자/공백/끝 문장부호 차이는 같은 주제로 본다."""
+    t = unicodedata.normalize("NFKC", topic or "").lower()
+    return _TOPIC_TRAILING.sub("", _TOPIC_SPACES.sub(" ", t).strip())
+
+
+def _summary_cache_key(topic: str, type_: str, mode: str) -> str:
+    return hashlib.sha256(f"{mode}\x00{type_}\x00{_normalize_topic(topic)}".encode("utf-8")).hexdigest()
+
+
+def _type_value(type_: SummaryType) -> str:
+    return type_.value if hasattr(type_, "value") else str(type_)
+
+
+async def _cached_summary(
+    session: AsyncSession, *, user_id: uuid.UUID, subject_id: int, cache_key: str, index_version: int,
+) -> Optional[SummaryTable]:
+    """과목 인덱스가 그대로인 동안 만든 같은 요청의 검증 통과(ok) 요약 중 최신 1건."""
+    return (await session.execute(
+        select(SummaryTable).where(
+            SummaryTable.user_id == user_id,
+            SummaryTable.subject_id == subject_id,
+            SummaryTable.cache_key == cache_key,
+            SummaryTable.index_version == index_version,
+            SummaryTable.ok.is_(True),
+        ).order_by(SummaryTable.summary_id.desc()).limit(1)
+    )).scalar_one_or_none()
+
 
 async def create_subject_summary(
     session: AsyncSession,
@@ -50,51 +86,422 @@ async def create_subject_summary(
     subject_id: int,
     topic: str,
     type_: SummaryType,
+    mode: str = "rag",
+    force: bool = False,
+    diverse: bool = False,
 ) -> dict:
     """
-    1) (user, subject) 인덱스 조회 → Chroma 로드
-    2) retriever = vectordb.as_retriever(k=8)
-    3) RetrievalQA 체인 구성(prompt=summary_prompt)
-    4) refine_with_crag로 검증/재시도
+    먼저 결과 캐시를 본다: (정규화 주제, 유형, 모드)가 같고 과목 인덱스 버전이 그대로면
+    저장된 요약을 바로 반환(cached=True). force=True 면 캐시를 건너뛰고 새로 만든다.
+    diverse=True(rag 모드)면 주제 검색 대신 청크 군집별 대표 청크로 컨텍스트를 채운다 (services/chunk_clusters.py).
+    mode="hierarchical" 이면 검색 대신 과목의 모든 청크를 계층 map-reduce 로 요약한다
+    (services/hierarchical_summary.py, 부분 요약 재사용).
+    mode="digest" 이면 업로드 때 만들어 둔 문서별 digest 를 합쳐 요약한다
+    (services/document_digest.py, 없는 digest 만 새로 생성). 아래는 기본 rag 모드.
+    1) (user, subject) 인덱스 조회 → Chroma 핸들 (풀에서, 임베딩 모델 로드는 스레드에서)
+    2) 요청당 1회 검색(k=8) → 컨텍스트 패킹(중복 제거 + 토큰 예산)
+    3) 요약 함수 구성(같은 컨텍스트 → summary_prompt → 게이트웨이 LLM 호출)
+    4) refine_with_crag로 검증/재시도 (생성·검증 모두 2)의 컨텍스트 사용, 재검색 없음)
     5) summaries INSERT
     """
     # 1. 인덱스 로드
     vindex = await _get_vector_index(session, user_id, subject_id)
-    vectordb = _load_chroma(vindex)
+    cache_mode = _effective_mode(mode, diverse)
+    cache_key = _summary_cache_key(topic, _type_value(type_), cache_mode)
+    if not force:
+        hit = await _cached_summary(session, user_id=user_id, subject_id=subject_id,
+                                    cache_key=cache_key, index_version=vindex.index_version or 0)
+        if hit is not None:
+            metrics.inc("summary.cache.hit")
+            return {
+                "summary_id": hit.summary_id,
+                "ok": True,
+                "reason": hit.reason or "",
+                "summary": hit.content_md,
+                "cached": True,
+            }
+        metrics.inc("summary.cache.miss")
+    else:
+        metrics.inc("summary.cache.bypass")
+    store = dict(user_id=user_id, subject_id=subject_id, type_=type_, topic=topic,
+                 mode=cache_mode, cache_key=cache_key, index_version=vindex.index_version or 0)
+    vectordb = await chroma_pool.get(vindex)
 
-    # 2. 리트리버
-    retriever = vectordb.as_retriever(search_kwargs={"k": 8})
+    if mode == "hierarchical":
+        result = await summarize_hierarchical(session, vectordb, vindex, topic=topic, user_id=user_id)
+        if not result.chunks:
+            raise HTTPException(409, "Vector index is empty. Re-run indexing for this subject.")
+        summary_text, ok = result.content_md, True
+        reason = (
+            f"계층 요약: 청크 {result.chunks}개, {result.levels}단계, "
+            f"LLM 호출 {result.llm_calls}회 (부분 요약 재사용 {result.reused}개)"
+        )
+        return await _store_summary(session, summary_text=summary_text, ok=ok, reason=reason, **store)
+
+    if mode == "digest":
+        digest_docs, digest_ctx, built = await _digest_context(session, user_id=user_id, subject_id=subject_id)
+
+        async def generate_from_digests(instruction: str, speculative: bool = False) -> str:
+            prompt = summary_prompt.format(context=digest_ctx, question=instruction)
+            return await llm_gateway.ainvoke(prompt, user_id=user_id, coalesce=not speculative)
+
+        summary_text, ok, reason = await refine_with_crag(
+            generate_from_digests, llm_gateway, digest_docs, topic, max_iters=2, verbose=False,
+            user_id=user_id, cache_scope=index_scope(vindex),
+        )
+        reason = f"{reason} (문서 digest {len(digest_docs)}개 사용, 새로 생성 {built}개)"
+        return await _store_summary(session, summary_text=summary_text, ok=ok, reason=reason, **store)
+
+    # 2~4. 검색 1회 + 생성 + CRAG
+    summary_text, ok, reason = await _rag_summary(vindex, vectordb, topic, user_id=user_id, diverse=diverse)
+
+    # 5. DB 기록
+    return await _store_summary(session, summary_text=summary_text, ok=ok, reason=reason, **store)
 
-    # 3. 체인 구성
-    summary_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=retriever,
-        chain_type="stuff",
-        chain_type_kwargs={"prompt": summary_prompt},
-    )
+
+def _effective_mode(mode: str, diverse: bool) -> str:
+    """결과 캐시/저장용 모드 이름 (diverse 는 rag 모드에서만 의미가 있음)"""
+    return "rag:diverse" if diverse and mode == "rag" else mode
+
+
+async def _rag_context(
+    vectordb: Chroma, topic: str, *, vindex: Optional[VectorIndexTable] = None, diverse: bool = False,
+) -> Tuple[List[Document], str]:
+    """
+    검색 1회 + 패킹 (기존 RetrievalQA "stuff" 체인과 동일: 검색 결과를 \n\n 으로 이어 붙여 프롬프트에 넣음)
+    diverse=True 면 검색 대신 군집별 대표 청크를 같은 예산으로 고른다 (군집 결과는 인덱스 버전별 캐시).
+    + 주제 관련 문장만 남기는 추출식 압축 (SUMMARY_COMPRESS).
+    반환: (정합성 검사용 패킹 청크 원문, 생성 프롬프트 컨텍스트)
+    """
+    docs: List[Document] = []
+    if diverse and vindex is not None:
+        clusters = await cluster_cache.get(vindex, vectordb)
+        if clusters is not None:
+            docs = diverse_documents(clusters, budget=CONTEXT_BUDGET_SUMMARY)
+            metrics.inc("summary.diverse.used")
+    if not docs:
+        retriever = vectordb.as_retriever(search_kwargs={"k": 8})
+        docs = await retriever.ainvoke(topic)
+        docs = (await pack_context(vectordb, docs, budget=CONTEXT_BUDGET_SUMMARY, label="summary")).docs
+    ctx_docs = await compress_context(docs, query=topic) if SUMMARY_COMPRESS else docs
+    return docs, "\n\n".join(d.page_content for d in ctx_docs)
+
+
+async def _digest_context(
+    session: AsyncSession, *, user_id: uuid.UUID, subject_id: int,
+) -> Tuple[List[Document], str, int]:
+    """문서별 digest → (정합성 검사 근거 문서, 프롬프트 컨텍스트, 새로 만든 digest 수). 청크 검색 없음."""
+    digests, built = await subject_digests(session, user_id=user_id, subject_id=subject_id)
+    if not digests:
+        raise HTTPException(409, "No document digests available. Upload or re-index materials first.")
+    docs = [Document(page_content=f"[{title}]\n{content}") for title, content in digests]
+    return docs, compose_context(digests, CONTEXT_BUDGET_SUMMARY), built
+
+
+async def _rag_summary(
+    vindex: VectorIndexTable, vectordb: Chroma, topic: str, *, user_id: uuid.UUID, diverse: bool = False,
+) -> Tuple[str, bool, str]:
+    """rag 모드 본체: 검색 1회 → 패킹 → summary_prompt 생성 → CRAG. 반환: (요약, ok, reason)"""
+    # 2. 검색 1회 + 패킹
+    docs, context = await _rag_context(vectordb, topic, vindex=vindex, diverse=diverse)
+
+    # 3. 요약 함수 – 재요약 지시문이 바뀌어도 컨텍스트는 그대로
+    #    (투기적 초안은 취소될 수 있으므로 single-flight 합류 없이 호출 → 취소 시 실제 호출도 중단)
+    async def generate(instruction: str, speculative: bool = False) -> str:
+        prompt = summary_prompt.format(context=context, question=instruction)
+        return await llm_gateway.ainvoke(prompt, user_id=user_id, coalesce=not speculative)
 
     # 4. CRAG
-    summary_text, ok, reason = refine_with_crag(
-        summary_chain, llm, retriever, topic, max_iters=2, verbose=False
+    return await refine_with_crag(
+        generate, llm_gateway, docs, topic, max_iters=2, verbose=False,
+        user_id=user_id, cache_scope=index_scope(vindex), vectorstore=vectordb,
     )
 
-    # 5. DB 기록
-    row = SummaryTable(
+
+def _summary_row(
+    *, user_id: uuid.UUID, subject_id: int, type_: SummaryType,
+    topic: str, summary_text: str, ok: bool, reason: str,
+    mode: str, cache_key: str, index_version: int,
+) -> SummaryTable:
+    return SummaryTable(
         user_id=user_id,
         subject_id=subject_id,
       #   document_id=None,          # 과목 전체 요약이므로 None
-        type=type_.value if hasattr(type_, "value") else str(type_),
+        type=_type_value(type_),
         topic=topic,
         content_md=summary_text,
         model="gemini-2.5-flash",
+        mode=mode,
+        cache_key=cache_key,
+        index_version=index_version,
+        ok=ok,
+        reason=reason,
     )
+
+
+async def _store_summary(session: AsyncSession, **fields) -> dict:
+    row = _summary_row(**fields)
     session.add(row)
     await session.flush()   # summary_id 확보
     await session.commit()
 
     return {
         "summary_id": row.summary_id,
+        "ok": row.ok,
+        "reason": row.reason,
+        "summary": row.content_md,
+        "cached": False,
+    }
+
+
+# ============================================================
+# 4개 유형 한 번에: summary_prompt 출력(1~4 섹션)을 유형별로 나눠 저장
+# ============================================================
+# summary_prompt 형식 순서 = 섹션 번호
+_SECTION_TYPES = [SummaryType.overall, SummaryType.traps, SummaryType.concept_areas, SummaryType.three_lines]
+# 번호 없는 제목으로 나올 때를 위한 키워드 (같은 순서)
+_SECTION_KEYWORDS = ["핵심 개념", "함정", "개념 영역", "3줄"]
+# "1) 핵심 개념", "## 2. 자주 나오는 함정", "**3) 주요 개념 영역별 요약**" 같은 제목 줄 (group 1 = 제목 표시 '#'/'**')
+_SECTION_HEADING = re.compile(r"^\s*((?:#{1,6}\s*)?(?:\*\*)?)\s*([1-4])\s*[).:]\s*(.*)$")
+_KEYWORD_HEADING = re.compile(r"^\s*(?:#{1,6}\s*|\*\*)")
+
+
+def _numbered_starts(lines: list, accept) -> dict:
+    """accept(n, marked, line) 를 통과한 번호 제목 줄을 1 → 2 → 3 → 4 순서로만 받는다."""
+    starts: dict = {}
+    for i, line in enumerate(lines):
+        m = _SECTION_HEADING.match(line)
+        if not m:
+            continue
+        n = int(m.group(2)) - 1
+        if n == len(starts) and accept(n, bool(m.group(1)), line):
+            starts[n] = i
+    return starts
+
+
+def split_summary_sections(text: str) -> dict:
+    """
+    summary_prompt 출력 → {SummaryType: 섹션 본문}.
+    번호 제목(1)~4), 순서대로)을 찾되, 섹션 안의 "1. 정의 / 2. 원리" 같은 번호 목록을 제목으로 오인하지 않게
+      1) 출력에 '#'/'**' 표시가 붙은 번호 제목이 있으면 표시된 줄만
+      2) 없으면 섹션 키워드가 들어간 번호 줄만
+      3) 그래도 못 찾으면 표시 없는 번호 줄
+    순서로 시도하고, 모두 실패하면 '#'/'**' 로 시작하는 제목 줄의 키워드로 찾는다. 찾지 못한 섹션은 결과에 없다.
+    """
+    lines = (text or "").splitlines()
+    has_marked = any((m := _SECTION_HEADING.match(line)) and m.group(1) for line in lines)
+    if has_marked:
+        starts = _numbered_starts(lines, lambda n, marked, line: marked)
+    else:
+        starts = _numbered_starts(lines, lambda n, marked, line: _SECTION_KEYWORDS[n] in line)
+        if len(starts) < 2:
+            starts = _numbered_starts(lines, lambda n, marked, line: True)
+    if len(starts) < 2:
+        starts = {}
+        for i, line in enumerate(lines):
+            if not _KEYWORD_HEADING.match(line):
+                continue
+            for n, kw in enumerate(_SECTION_KEYWORDS):
+                if kw in line and n not in starts:
+                    starts[n] = i
+                    break
+
+    ordered = sorted(starts.items(), key=lambda x: x[1])
+    sections = {}
+    for j, (n, start) in enumerate(ordered):
+        end = ordered[j + 1][1] if j + 1 < len(ordered) else len(lines)
+        body = "\n".join(lines[start + 1:end]).strip()
+        if body:
+            sections[_SECTION_TYPES[n]] = body
+    return sections
+
+
+async def create_subject_summary_batch(
+    session: AsyncSession,
+    *,
+    user_id: uuid.UUID,
+    subject_id: int,
+    topic: str,
+    force: bool = False,
+    diverse: bool = False,
+) -> dict:
+    """
+    overall / traps / concept_areas / three_lines 를 한 번에 만든다.
+    검색 1회 + 생성 1회 + CRAG 1회 (summary_prompt 는 원래 4개 섹션을 한 출력에 만든다)
+    → 섹션별로 나눠 summaries 4행을 한 트랜잭션으로 저장.
+    결과 캐시는 유형별 키(mode="batch")로 보고, 4개 모두 있을 때만 재사용한다.
+    """
+    vindex = await _get_vector_index(session, user_id, subject_id)
+    index_version = vindex.index_version or 0
+    batch_mode = "batch:diverse" if diverse else "batch"
+    keys = {t: _summary_cache_key(topic, t.value, batch_mode) for t in _SECTION_TYPES}
+
+    if not force:
+        hits = {
+            t: await _cached_summary(session, user_id=user_id, subject_id=subject_id,
+                                     cache_key=k, index_version=index_version)
+            for t, k in keys.items()
+        }
+        if all(hits.values()):
+            metrics.inc("summary.cache.hit")
+            return {
+                "ok": True,
+                "reason": hits[SummaryType.overall].reason or "",
+                "cached": True,
+                "sections": [
+                    {"type": t.value, "summary_id": h.summary_id, "summary": h.content_md}
+                    for t, h in hits.items()
+                ],
+            }
+        metrics.inc("summary.cache.miss")
+    else:
+        metrics.inc("summary.cache.bypass")
+
+    vectordb = await chroma_pool.get(vindex)
+    summary_text, ok, reason = await _rag_summary(vindex, vectordb, topic, user_id=user_id, diverse=diverse)
+
+    sections = split_summary_sections(summary_text)
+    missing = [t.value for t in _SECTION_TYPES if t not in sections]
+    if missing:
+        # 형식이 깨진 출력: 빠진 유형에는 전체 본문을 저장하고 사유에 남긴다 (캐시 재사용 대상에서 제외)
+        metrics.inc("summary.batch.unsplit")
+        ok = False
+        reason = f"{reason} (섹션 구분 실패: {', '.join(missing)})"
+
+    rows = [
+        _summary_row(
+            user_id=user_id, subject_id=subject_id, type_=t, topic=topic,
+            summary_text=sections.get(t, summary_text), ok=ok, reason=reason,
+            mode=batch_mode, cache_key=keys[t], index_version=index_version,
+        )
+        for t in _SECTION_TYPES
+    ]
+    session.add_all(rows)
+    await session.flush()
+    await session.commit()
+
+    return {
         "ok": ok,
         "reason": reason,
-        "summary": summary_text,
+        "cached": False,
+        "sections": [
+            {"type": r.type, "summary_id": r.summary_id, "summary": r.content_md} for r in rows
+        ],
+    }
+
+
+# ============================================================
+# 스트리밍(SSE) 버전: 초안 토큰 → 검증 결과 → 재요약 라운드 → 저장
+# ============================================================
+async def stream_subject_summary(
+    *,
+    user_id: uuid.UUID,
+    subject_id: int,
+    topic: str,
+    type_: SummaryType,
+    mode: str = "rag",
+    force: bool = False,
+    diverse: bool = False,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    (event, data) 를 생성하는 async generator. 라우터가 SSE로 변환한다.
+      retrieval   : 컨텍스트 준비 완료 (contexts, retrieval_ms)
+      token       : 초안 토큰 조각 {"round", "text"} (round 0 = 첫 초안, 1.. = 재요약)
+      grade       : 라운드별 검증 결과 {"round", "ok", "reason", "by": local|llm}
+      resummarize : 재요약 시작 {"round", "reason", "speculative"}
+      draft       : 미리 만들어 둔 재요약 초안을 채택한 경우 전체 본문 {"round", "text"}
+      done        : 저장된 summary_id, 최종 summary/ok/reason, cached, ttft_ms, total_ms
+    결과 캐시 적중 시 done 만 보낸다. 저장은 최종 채택본 1건만 (클라이언트가 끊으면 생성을 중단하고 저장하지 않음).
+    응답 본문이 흐르는 동안 요청 의존성 세션이 정리될 수 있으므로 DB는 자체 세션으로 접근한다.
+    """
+    if mode not in ("rag", "digest"):
+        raise HTTPException(422, "Streaming supports mode 'rag' or 'digest'.")
+    t0 = time.perf_counter()
+
+    async with async_session() as db:
+        vindex = await _get_vector_index(db, user_id, subject_id)
+        cache_key = _summary_cache_key(topic, _type_value(type_), _effective_mode(mode, diverse))
+        if not force:
+            hit = await _cached_summary(db, user_id=user_id, subject_id=subject_id,
+                                        cache_key=cache_key, index_version=vindex.index_version or 0)
+            if hit is not None:
+                metrics.inc("summary.cache.hit")
+                elapsed = round((time.perf_counter() - t0) * 1000, 1)
+                yield "done", {
+                    "summary_id": hit.summary_id, "ok": True, "reason": hit.reason or "",
+                    "summary": hit.content_md, "cached": True, "ttft_ms": elapsed, "total_ms": elapsed,
+                }
+                return
+            metrics.inc("summary.cache.miss")
+        else:
+            metrics.inc("summary.cache.bypass")
+        store = dict(user_id=user_id, subject_id=subject_id, type_=type_, topic=topic,
+                     mode=_effective_mode(mode, diverse), cache_key=cache_key,
+                     index_version=vindex.index_version or 0)
+
+        vectordb = None
+        built = 0
+        if mode == "digest":
+            docs, context, built = await _digest_context(db, user_id=user_id, subject_id=subject_id)
+        else:
+            vectordb = await chroma_pool.get(vindex)
+            docs, context = await _rag_context(vectordb, topic, vindex=vindex, diverse=diverse)
+    retrieval_ms = (time.perf_counter() - t0) * 1000
+    yield "retrieval", {"contexts": len(docs), "retrieval_ms": round(retrieval_ms, 1)}
+
+    # 생성/검증은 태스크에서 돌리고, 토큰과 진행 이벤트는 큐로 받아 순서대로 내보낸다
+    queue: asyncio.Queue = asyncio.Queue()
+    state = {"round": 0, "ttft_ms": None}
+
+    async def on_event(event: str, data: dict) -> None:
+        if event == "resummarize":
+            state["round"] = data["round"]
+        await queue.put((event, data))
+
+    async def generate(instruction: str, speculative: bool = False) -> str:
+        prompt = summary_prompt.format(context=context, question=instruction)
+        if speculative:
+            # 투기적 초안은 채택될 때만 draft 이벤트로 보낸다 (취소될 수 있으므로 스트리밍하지 않음)
+            return await llm_gateway.ainvoke(prompt, user_id=user_id, coalesce=False)
+        parts: list[str] = []
+        async for text in llm_gateway.astream(prompt, user_id=user_id):
+            if state["ttft_ms"] is None:
+                state["ttft_ms"] = (time.perf_counter() - t0) * 1000
+            parts.append(text)
+            await queue.put(("token", {"round": state["round"], "text": text}))
+        return "".join(parts)
+
+    task = asyncio.create_task(refine_with_crag(
+        generate, llm_gateway, docs, topic, max_iters=2, verbose=False,
+        user_id=user_id, cache_scope=index_scope(vindex), vectorstore=vectordb, on_event=on_event,
+    ))
+    task.add_done_callback(lambda _t: queue.put_nowait(None))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+        summary_text, ok, reason = task.result()
+    finally:
+        if not task.done():
+            task.cancel()   # 클라이언트 연결 끊김 → 남은 생성/검증 중단
+
+    if mode == "digest":
+        reason = f"{reason} (문서 digest {len(docs)}개 사용, 새로 생성 {built}개)"
+    async with async_session() as db:
+        result = await _store_summary(db, summary_text=summary_text, ok=ok, reason=reason, **store)
+
+    total_ms = (time.perf_counter() - t0) * 1000
+    if state["ttft_ms"] is not None:
+        metrics.observe("summary.stream.ttft_ms", state["ttft_ms"])
+    metrics.observe("summary.stream.total_ms", total_ms)
+    logging.info(
+        f"[summary-stream] subject={subject_id} rounds={state['round'] + 1} ok={ok} "
+        f"retrieval_ms={retrieval_ms:.1f} ttft_ms={(state['ttft_ms'] or -1):.1f} total_ms={total_ms:.1f}"
+    )
+    yield "done", {
+        **result,
+        "ttft_ms": round(state["ttft_ms"], 1) if state["ttft_ms"] is not None else None,
+        "total_ms": round(total_ms, 1),
     }
@@ -7,11 +7,15 @@ import { MessageCircle, Send, User, Bot } from "lucide-react";
 type Props = { subjectId: number | null; auto?: boolean; };
 type Turn = { qa_turn_id: number; question: string; answer: string; citations: string[] };
 
+const HISTORY_PAGE = 50;   // 대화기록 한 번에 받을 턴 수
+
 export default function SmartQA({ subjectId, auto=false }: Props){
   const [sessionId, setSessionId] = useState<number | null>(null);
   const [question, setQuestion]   = useState("");
   const [loading, setLoading]     = useState(false);
   const [turns, setTurns]         = useState<Turn[]>([]);
+  const [olderCursor, setOlderCursor]   = useState<string | null>(null);   // 더 오래된 대화 페이지 커서
+  const [loadingOlder, setLoadingOlder] = useState(false);
 
   // 번역 관련 상태 hook 추가
   const [langs, setLangs] = useState<Record<string,string>>({});          // {코드:이름}
@@ -71,7 +75,7 @@ export default function SmartQA({ subjectId, auto=false }: Props){
       if (last?.answer) {
         translateTurn(last);  // 선택된 lang으로 즉시 번역
       }
-    }, [lang, turns.length]); // turns 길이도 의존에 넣으면 새 답변에도 자동 반응
+    }, [lang, turns[turns.length - 1]?.qa_turn_id]); // 마지막 턴이 바뀌면(새 답변) 자동 반응, 이전 대화를 앞에 붙일 때는 그대로
 
   // ✅ 자동 세션 생성
   useEffect(() => {
@@ -102,17 +106,34 @@ export default function SmartQA({ subjectId, auto=false }: Props){
   useEffect(()=>{
     (async()=>{
       if(!sessionId) return;
-      const { data } = await api.get<Turn[]>(`/chat/sessions/${sessionId}/turns`);
-      setTurns(data);
+      // 대화기록은 페이지 단위(qa_turn_id 커서)로 내려온다 → 최근 페이지만 먼저 받고, 이전 대화는 "더 보기"로
+      const res = await api.get<Turn[]>(`/chat/sessions/${sessionId}/turns`, {
+        params: { direction: "backward", limit: HISTORY_PAGE },
+      });
+      setTurns(res.data);
+      setOlderCursor(res.headers["x-next-cursor"] ?? null);
     })();
   },[sessionId]);
 
+  async function loadOlder(){
+    if(!sessionId || !olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try{
+      const res = await api.get<Turn[]>(`/chat/sessions/${sessionId}/turns`, {
+        params: { direction: "backward", cursor: olderCursor, limit: HISTORY_PAGE },
+      });
+      setTurns(prev => [...res.data, ...prev]);
+      setOlderCursor(res.headers["x-next-cursor"] ?? null);
+    } finally { setLoadingOlder(false); }
+  }
+
 
   async function createSession(){
     if(!subjectId){ alert("과목을 먼저 선택/업로드하세요."); return; }
     const { data } = await api.post("/chat/sessions", { subject_id: subjectId, title: "스마트 Q&A" });
     setSessionId(data.chat_session_id);
     setTurns([]);
+    setOlderCursor(null);
 
     // 추가
     setTranslations({}); setShowOriginal({}); setTLoadingIds({});
@@ -223,6 +244,13 @@ export default function SmartQA({ subjectId, auto=false }: Props){
 
           {/* 대화 기록 (아바타 + 버블) */}
           <div className="sa-chat sa-chat--spacious">
+            {olderCursor && (
+              <div style={{ display:'flex', justifyContent:'center' }}>
+                <button className="sa-btn ghost" onClick={loadOlder} disabled={loadingOlder}>
+                  {loadingOlder ? "불러오는 중…" : "이전 대화 더 보기"}
+                </button>
+              </div>
+            )}
             {turns.map(t => {
               const id = t.qa_turn_id;
               const hasTrans = !!translations[id];